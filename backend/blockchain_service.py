@@ -8,6 +8,8 @@ import os
 from web3 import Web3
 from dotenv import load_dotenv
 
+from metrics_service import timed_call
+
 load_dotenv(override=True)
 
 # ── Konfigurasi dari .env ──
@@ -84,6 +86,7 @@ def get_contract(w3: Web3):
     return w3.eth.contract(address=checksum_address, abi=CONTRACT_ABI)
 
 
+@timed_call("blockchain", "approve_user")
 def approve_wallet_on_chain(wallet_address: str) -> dict:
     """
     Memanggil approveUser(wallet_address) di smart contract sebagai Admin.
@@ -139,6 +142,7 @@ def approve_wallet_on_chain(wallet_address: str) -> dict:
         return {"success": False, "error": str(e)}
 
 
+@timed_call("blockchain", "is_approved_user")
 def is_wallet_approved(wallet_address: str) -> bool:
     """
     Cek apakah wallet sudah di-approve di smart contract.
@@ -156,6 +160,7 @@ def is_wallet_approved(wallet_address: str) -> bool:
         return False
 
 
+@timed_call("blockchain", "add_medical_record")
 def add_medical_record_on_chain(patient_wallet: str, encrypted_data: str) -> dict:
     """
     Menyimpan rekam medis terenkripsi ke blockchain menggunakan admin private key.
@@ -0,0 +1,113 @@
+"""
+csv_ingest.py
+Pembacaan CSV dataset (datasets/*.csv) secara streaming untuk pipeline
+dataset (scripts/update_dataset.py, scripts/benchmark_models.py):
+- encoding + separator dideteksi SEKALI dari sampel byte awal file
+  (bukan mencoba setiap pasangan encoding/separator dengan membaca ulang file).
+  Sampel bisa lolos padahal byte tak valid baru muncul di tengah file:
+  read_with_fallback() lalu mengulang SELURUH file dengan encoding kandidat
+  berikutnya (utf-8 → cp1252 → latin1), tidak pernah mengganti byte diam-diam.
+- baris dibaca per potongan (CSV_CHUNK_ROWS) sehingga memori tetap datar
+  berapa pun ukuran file; setiap potongan bisa langsung ditransformasi dan
+  dikirim ke loader (COPY) sebelum potongan berikutnya dibaca.
+
+Semua kolom dibaca sebagai string agar skema tiap potongan identik.
+"""
+
+import codecs
+import csv
+import os
+
+import pandas as pd
+
+# ── Konfigurasi dari .env ──
+CSV_CHUNK_ROWS  = int(os.getenv("CSV_CHUNK_ROWS", "5000"))
+CSV_SNIFF_BYTES = int(os.getenv("CSV_SNIFF_BYTES", str(64 * 1024)))
+
+# latin1 selalu berhasil didekode → kandidat terakhir
+ENCODINGS  = ("utf-8", "cp1252", "latin1")
+DELIMITERS = ",;\t"
+
+
+def _detect_encoding(sample: bytes) -> str:
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    for enc in ENCODINGS:
+        try:
+            # Decoder inkremental: sampel boleh terpotong di tengah karakter multibyte
+            codecs.getincrementaldecoder(enc)().decode(sample, final=False)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return "latin1"
+
+
+def next_encoding(encoding: str):
+    """Kandidat berikutnya setelah `encoding` (None jika sudah yang terakhir)."""
+    encoding = "utf-8" if encoding == "utf-8-sig" else encoding
+    if encoding not in ENCODINGS:
+        return None
+    i = ENCODINGS.index(encoding)
+    return ENCODINGS[i + 1] if i + 1 < len(ENCODINGS) else None
+
+
+def _detect_delimiter(text: str) -> str:
+    try:
+        return csv.Sniffer().sniff(text, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        # Sampel terlalu tidak beraturan untuk Sniffer: pilih pemisah terbanyak di baris header
+        header = text.splitlines()[0] if text else ""
+        return max(DELIMITERS, key=header.count)
+
+
+def sniff_csv(filepath: str, sample_bytes: int = CSV_SNIFF_BYTES) -> dict:
+    """Deteksi encoding + separator dari sampel byte awal. Returns {"encoding", "sep"}."""
+    with open(filepath, "rb") as f:
+        sample = f.read(sample_bytes)
+    encoding = _detect_encoding(sample)
+    text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(sample, final=False)
+    sep = _detect_delimiter(text)
+    header = text.splitlines()[0] if text else ""
+    if header.count(sep) < 1:
+        raise ValueError(f"Gagal mendeteksi separator {filepath} (header: {header[:80]!r})")
+    return {"encoding": encoding, "sep": sep}
+
+
+def iter_csv(filepath: str, chunksize: int = CSV_CHUNK_ROWS, fmt: dict = None):
+    """
+    Generator DataFrame per potongan `chunksize` baris. Index baris berlanjut
+    antar potongan (0..N-1 untuk seluruh file). Nama kolom di-strip.
+    """
+    fmt = fmt or sniff_csv(filepath)
+    reader = pd.read_csv(filepath, sep=fmt["sep"], encoding=fmt["encoding"], dtype=str, chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            chunk.columns = chunk.columns.astype(str).str.strip()
+            yield chunk
+
+
+def read_with_fallback(filepath: str, consume, fmt: dict = None, on_retry=None):
+    """
+    consume(iter_csv(...), fmt) dengan encoding hasil sniff; jika dekode gagal
+    di tengah file, consume dipanggil ulang dari awal dengan encoding
+    kandidat berikutnya. consume wajib membuang hasil parsial sebelum error
+    (mis. tabel staging) karena akan dimulai lagi dari baris pertama.
+    on_retry(fmt_baru, error) dipanggil sebelum setiap percobaan ulang.
+    """
+    fmt = fmt or sniff_csv(filepath)
+    while True:
+        try:
+            return consume(iter_csv(filepath, fmt=fmt), fmt)
+        except UnicodeDecodeError as e:
+            fallback = next_encoding(fmt["encoding"])
+            if fallback is None:
+                raise
+            fmt = {**fmt, "encoding": fallback}
+            if on_retry is not None:
+                on_retry(fmt, e)
+
+
+def read_csv(filepath: str) -> pd.DataFrame:
+    """Seluruh file sekaligus; hanya untuk file kecil (kamus, label) di script evaluasi."""
+    chunks = read_with_fallback(filepath, lambda chunks, fmt: list(chunks))
+    return pd.concat(chunks) if chunks else pd.DataFrame()
@@ -0,0 +1,72 @@
+"""
+dataset_transform.py
+Transformasi potongan CSV dataset → baris tabel, dipakai bersama oleh
+scripts/update_dataset.py (seed Postgres) dan scripts/benchmark_models.py /
+scripts/distill_model.py (label kamus untuk evaluasi). Modul ini sengaja
+bebas efek samping saat di-import: tanpa .env, koneksi DB, atau model.
+"""
+
+from text_utils import normalize_text_key
+
+# Kolom kunci ternormalisasi (normalize_text_key) per tabel: kolom_key → kolom sumber.
+# Dipakai main.py/knowledge_base.py sebagai kunci lookup tanpa TRIM/ILIKE/LOWER di SQL.
+MATCH_KEY_COLUMNS = {
+    "herbal_symptoms":           {"symptom_key": "symptom"},
+    "herbal_diagnoses":          {"diagnosis_key": "diagnosis"},
+    "herbal_special_conditions": {"special_condition_key": "special_condition",
+                                  "herbal_name_key": "herbal_name",
+                                  "latin_name_key": "latin_name"},
+}
+
+# Kolom Kamus_Medis.csv → kolom tabel kamus_medis
+KAMUS_MEDIS_MAPPING = {
+    'Nama Diagnosis/Gejala': 'istilah_baku',
+    'Sinonim': 'sinonim_awam'
+}
+
+
+def add_match_keys(df, table):
+    for key_col, src_col in MATCH_KEY_COLUMNS.get(table, {}).items():
+        if src_col in df.columns:
+            df[key_col] = df[src_col].map(normalize_text_key)
+    return df
+
+
+def transform_chunk(df, label, mapping, table):
+    """Rename + cleanup + explode sinonim untuk satu potongan CSV (baris saling independen)."""
+    df.columns = ['Nama Herbal' if col == 'Nama Hebal' else col for col in df.columns]
+
+    # Khusus untuk Kamus Medis: Kita perlu memecah sinonim yang dipisahkan newline (\n)
+    if label == "Kamus medis":
+        # Lakukan rename dulu sesuai mapping
+        df = df.rename(columns=mapping)
+
+        if 'sinonim_awam' in df.columns:
+            # 1. BERSIHKAN ISTILAH BAKU (PENTING!)
+            # Ini agar 'Mual ' menjadi 'Mual'
+            df['istilah_baku'] = df['istilah_baku'].astype(str).str.strip()
+
+            # 2. BERSIHKAN SINONIM
+            df['sinonim_awam'] = df['sinonim_awam'].astype(str)
+
+            # Pecah kolom sinonim_awam berdasarkan newline menjadi list
+            df['sinonim_awam'] = df['sinonim_awam'].str.split('\n')
+
+            # Gunakan fungsi explode
+            df = df.explode('sinonim_awam')
+
+            # Bersihkan spasi di tiap sinonim hasil pecahan
+            df['sinonim_awam'] = df['sinonim_awam'].str.strip()
+
+            # Hapus baris yang kosong atau "nan" (pandas >= 3: astype(str) mempertahankan NaN)
+            df = df[df['sinonim_awam'].notna() & ~df['sinonim_awam'].isin(["", "nan", "None", "NaN"])]
+    else:
+        # Untuk tabel Herbal Gejala & Diagnosis, bersihkan juga kolom kuncinya
+        df = df.rename(columns=mapping)
+        if 'symptom' in df.columns: df['symptom'] = df['symptom'].astype(str).str.strip().str.title()
+        if 'diagnosis' in df.columns: df['diagnosis'] = df['diagnosis'].astype(str).str.strip().str.title()
+
+    # Filter hanya kolom yang ada di mapping values
+    valid_cols = [c for c in df.columns if c in mapping.values()]
+    df = df[valid_cols].fillna("")
+    return add_match_keys(df, table)
@@ -0,0 +1,166 @@
+"""
+embedding_cache.py
+Cache LRU berbatas untuk hasil Lapis 2: chunk keluhan → embedding + label baku
++ similarity. Key = (teks chunk ternormalisasi, versi model/index), sehingga
+entri otomatis tidak terpakai lagi saat model atau med_labels dibangun ulang.
+Isi cache di-snapshot ke disk agar restart worker langsung "hangat": oleh
+thread latar setiap LABEL_CACHE_SNAPSHOT_INTERVAL detik (hanya jika ada entri
+baru) dan sekali lagi saat shutdown, tidak pernah di thread inferensi.
+Worker lain menulis ke file yang sama; snapshot digabung di bawah lock file,
+bukan ditimpa.
+"""
+
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from file_lock import lock_blocking, unlock
+from logging_service import get_logger
+
+log = get_logger("cache")
+
+# ── Konfigurasi dari .env ──
+LABEL_CACHE_PATH       = os.getenv("LABEL_CACHE_PATH", "./cache/label_cache.pkl")
+LABEL_CACHE_MAX_SIZE   = int(os.getenv("LABEL_CACHE_MAX_SIZE", "20000"))
+LABEL_CACHE_SNAPSHOT_INTERVAL = float(os.getenv("LABEL_CACHE_SNAPSHOT_INTERVAL", "300"))   # detik; 0 = hanya saat shutdown
+
+SNAPSHOT_FORMAT = 1
+
+
+def normalize_chunk(text: str) -> str:
+    """Lowercase + rapikan spasi, agar 'Badan  Panas' dan 'badan panas' berbagi entri."""
+    return " ".join(str(text or "").lower().split())
+
+
+class LabelResolutionCache:
+    def __init__(self, max_size: int = LABEL_CACHE_MAX_SIZE, path: str = LABEL_CACHE_PATH,
+                 snapshot_interval: float = LABEL_CACHE_SNAPSHOT_INTERVAL):
+        self.max_size          = max_size
+        self.path              = path
+        self.snapshot_interval = snapshot_interval
+
+        self._lock    = threading.Lock()
+        self._entries = OrderedDict()
+        self._dirty   = 0
+        self._stop    = threading.Event()
+        self._thread  = None
+
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+    def get(self, chunk: str, version: str):
+        key = (normalize_chunk(chunk), version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, chunk: str, version: str, embedding, baku: str, similarity: float):
+        key = (normalize_chunk(chunk), version)
+        with self._lock:
+            self._entries[key] = {"embedding": embedding, "baku": baku, "similarity": similarity}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._dirty += 1
+
+    def start(self):
+        """Jalankan thread snapshot berkala (idempotent)."""
+        if self.snapshot_interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="herbalyze-label-cache-snapshot", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.snapshot_interval):
+            if self._dirty:
+                self.save()
+
+    def close(self):
+        """Hentikan thread snapshot lalu simpan snapshot terakhir."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._dirty:
+            self.save()
+
+    def save(self) -> bool:
+        """
+        Tulis snapshot secara atomik (file sementara lalu os.replace). Beberapa
+        worker uvicorn berbagi satu file snapshot: di bawah lock file
+        <path>.lock, entri yang sudah ada di disk digabung lebih dulu (entri
+        worker ini menang untuk key yang sama, tetap dibatasi max_size) agar
+        snapshot worker terakhir tidak menimpa entri worker lain.
+        """
+        with self._lock:
+            items = list(self._entries.items())
+            self._dirty = 0
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.lock", "a+b") as lock:
+                lock_blocking(lock)
+                try:
+                    try:
+                        merged = OrderedDict(self._read_snapshot())
+                    except Exception as e:
+                        log.warning("Snapshot '%s' tidak bisa dibaca, ditimpa: %s", self.path, e)
+                        merged = OrderedDict()
+                    for key, entry in items:
+                        merged.pop(key, None)
+                        merged[key] = entry
+                    entries = list(merged.items())[-self.max_size:]
+                    tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "wb") as f:
+                        pickle.dump({"format": SNAPSHOT_FORMAT, "entries": entries}, f,
+                                    protocol=pickle.HIGHEST_PROTOCOL)
+                    os.replace(tmp_path, self.path)
+                finally:
+                    unlock(lock)
+            return True
+        except Exception as e:
+            log.warning("Gagal menyimpan snapshot '%s': %s", self.path, e)
+            return False
+
+    def _read_snapshot(self) -> list:
+        """Entri snapshot di disk (urutan LRU lama → baru); [] jika tidak ada/format lain."""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("format") != SNAPSHOT_FORMAT:
+            return []
+        return data.get("entries", [])
+
+    def load(self, version: str) -> int:
+        """Muat snapshot dari disk; entri dengan versi model/index lain dibuang."""
+        try:
+            entries = [(k, v) for k, v in self._read_snapshot() if k[1] == version]
+        except Exception as e:
+            log.warning("Snapshot '%s' tidak bisa dibaca: %s", self.path, e)
+            return 0
+        with self._lock:
+            for key, entry in entries[-self.max_size:]:
+                self._entries[key] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size":      len(self._entries),
+                "max_size":  self.max_size,
+                "hits":      self.hits,
+                "misses":    self.misses,
+                "evictions": self.evictions,
+                "hit_rate":  round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,127 @@
+"""
+embedding_store.py
+Penyimpanan embedding persisten untuk pipeline dataset (scripts/update_dataset.py).
+Key = (model id, prefix e5, sha1 teks): teks yang sudah pernah di-embed oleh
+model + backend encoder yang sama tidak di-encode ulang, sehingga rebuild
+koleksi setelah perubahan kecil di CSV hanya meng-encode baris yang baru/berubah.
+
+Disimpan di SQLite (satu file, tanpa dependensi tambahan); vektor float32
+sebagai BLOB. Entri yang lama tidak terpakai bisa dibuang dengan prune().
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# ── Konfigurasi dari .env ──
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "./cache/embedding_store.sqlite3")
+
+# Batas variabel per statement SQLite (default kompilasi lama = 999)
+_SQL_CHUNK = 500
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(str(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+
+    def __init__(self, path: str = EMBEDDING_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Dipakai dari thread insert index_pipeline.py juga → koneksi dibagi dengan lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model     TEXT NOT NULL,
+                prefix    TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim       INTEGER NOT NULL,
+                vector    BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, prefix, text_hash)
+            )
+        """)
+        self._conn.commit()
+        self.hits   = 0
+        self.misses = 0
+
+    def _lookup(self, model_id: str, prefix: str, hashes: list) -> dict:
+        found = {}
+        for start in range(0, len(hashes), _SQL_CHUNK):
+            chunk = hashes[start:start + _SQL_CHUNK]
+            rows = self._conn.execute(
+                f"SELECT text_hash, dim, vector FROM embeddings WHERE model = ? AND prefix = ? "
+                f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                [model_id, prefix, *chunk]
+            ).fetchall()
+            for h, dim, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=np.float32, count=dim)
+        return found
+
+    def lookup(self, texts: list, prefix: str, model_id: str) -> dict:
+        """Embedding yang sudah tersimpan untuk `texts`: {text_hash: vektor}. Menandai entri sebagai terpakai."""
+        hashes = list(dict.fromkeys(text_hash(t) for t in texts))
+        with self._lock:
+            found = self._lookup(model_id, prefix, hashes)
+            hit_hashes = list(found)
+            now = time.time()
+            for start in range(0, len(hit_hashes), _SQL_CHUNK):
+                chunk = hit_hashes[start:start + _SQL_CHUNK]
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE model = ? AND prefix = ? "
+                    f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [now, model_id, prefix, *chunk]
+                )
+            self._conn.commit()
+            self.hits   += len(found)
+            self.misses += len(hashes) - len(found)
+        return found
+
+    def put(self, texts: list, vectors, prefix: str, model_id: str):
+        """Simpan embedding hasil encode f"{prefix}{text}" untuk `texts`."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, prefix, text_hash, dim, vector, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                [(model_id, prefix, text_hash(t), int(v.shape[0]), np.asarray(v, dtype=np.float32).tobytes(), now)
+                 for t, v in zip(texts, vectors)]
+            )
+            self._conn.commit()
+
+    def embed(self, texts: list, prefix: str, model_id: str, get_model, batch_size: int = 64,
+              show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Embedding untuk `texts` (urutan dipertahankan), di-encode sebagai
+        f"{prefix}{text}". Hanya teks yang belum ada di store yang di-encode;
+        `get_model()` baru dipanggil jika memang ada yang perlu di-encode.
+        """
+        found   = self.lookup(texts, prefix, model_id)
+        missing = list(dict.fromkeys(t for t in texts if text_hash(t) not in found))
+        if missing:
+            vectors = np.asarray(get_model().encode([f"{prefix}{t}" for t in missing], batch_size=batch_size,
+                                                    show_progress_bar=show_progress_bar), dtype=np.float32)
+            self.put(missing, vectors, prefix, model_id)
+            found.update(zip(map(text_hash, missing), vectors))
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[text_hash(t)] for t in texts])
+
+    def prune(self, max_age_days: float) -> int:
+        """Hapus entri yang tidak dipakai selama `max_age_days` hari."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM embeddings WHERE last_used < ?", (time.time() - max_age_days * 86400,))
+            self._conn.commit()
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        total = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"entries": total, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self._conn.close()
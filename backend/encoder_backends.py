@@ -0,0 +1,81 @@
+"""
+encoder_backends.py
+Backend encoder embedding yang bisa dipilih lewat EMBEDDING_BACKEND:
+- torch : SentenceTransformer (PyTorch), perilaku lama
+- onnx  : graph ONNX hasil scripts/export_onnx.py (default int8 dynamic-quantized),
+          dijalankan dengan onnxruntime di CPU
+
+Keduanya punya method encode(texts, ...) → np.ndarray float32 seperti
+SentenceTransformer.encode, jadi pemanggil (inference_service.py,
+scripts/update_dataset.py) tidak perlu tahu backend mana yang aktif.
+"""
+
+import os
+
+import numpy as np
+
+# ── Konfigurasi dari .env ──
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")    # torch | onnx
+ONNX_MODEL_PATH   = os.getenv("ONNX_MODEL_PATH", "./onnx_model")
+ONNX_MODEL_FILE   = os.getenv("ONNX_MODEL_FILE", "model_quantized.onnx")
+ONNX_THREADS      = int(os.getenv("ONNX_THREADS", "0"))          # 0 = biarkan onnxruntime memilih
+
+
+class OnnxEncoder:
+    """
+    Mean pooling + normalisasi L2, sama dengan pipeline SentenceTransformer
+    e5 (Transformer → Pooling(mean) → Normalize).
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_PATH, model_file: str = ONNX_MODEL_FILE,
+                 max_seq_length: int = 512, threads: int = ONNX_THREADS):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+
+        self.model_dir      = model_dir
+        self.model_file     = model_file
+        self.max_seq_length = max_seq_length
+        self.tokenizer      = AutoTokenizer.from_pretrained(model_dir)
+        self.session        = ort.InferenceSession(os.path.join(model_dir, model_file), options,
+                                                   providers=["CPUExecutionProvider"])
+        self._input_names   = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = True,
+               show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            tokens = self.tokenizer(batch, padding=True, truncation=True,
+                                    max_length=self.max_seq_length, return_tensors="np")
+            feed = {k: v.astype(np.int64) for k, v in tokens.items() if k in self._input_names}
+            if "token_type_ids" in self._input_names and "token_type_ids" not in feed:
+                feed["token_type_ids"] = np.zeros_like(feed["input_ids"])
+            last_hidden = self.session.run(None, feed)[0]
+
+            mask   = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (last_hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(pooled.astype(np.float32))
+            if show_progress_bar:
+                print(f"   Encode ONNX: {min(start + batch_size, len(texts))}/{len(texts)}")
+
+        embeddings = np.concatenate(outputs) if outputs else np.zeros((0, 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def load_encoder(backend: str = EMBEDDING_BACKEND, model_name: str = "intfloat/multilingual-e5-small",
+                 onnx_path: str = ONNX_MODEL_PATH):
+    if backend == "onnx":
+        return OnnxEncoder(onnx_path)
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    raise ValueError(f"EMBEDDING_BACKEND tidak dikenal: {backend}")
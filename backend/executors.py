@@ -0,0 +1,131 @@
+"""
+executors.py
+Executor terbatas untuk pekerjaan blocking di endpoint async:
+- io        : thread pool untuk akses DB (SQLAlchemy sinkron) & I/O lain
+- inference : pool terpisah untuk encode model + query index label, ukurannya
+              mengikuti jumlah core CPU agar inference tidak berebut core
+              dengan dirinya sendiri
+
+Jumlah pekerjaan yang boleh menunggu dibatasi (worker + antrean); request
+berikutnya menunggu slot secara async sehingga event loop tetap bebas.
+Kedalaman antrean & waktu tunggu tiap executor tercatat dan ditampilkan
+di /api/health.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _default_inference_workers() -> int:
+    # Forward pass dijalankan thread micro-batching (inference_scheduler.py); worker di sini
+    # sebagian besar menunggu hasil batch, jadi satu per core cukup untuk mengisi batch
+    return os.cpu_count() or 1
+
+
+# ── Konfigurasi dari .env ──
+IO_EXECUTOR_WORKERS        = int(os.getenv("IO_EXECUTOR_WORKERS", "16"))
+IO_EXECUTOR_QUEUE          = int(os.getenv("IO_EXECUTOR_QUEUE", "64"))
+INFERENCE_EXECUTOR_WORKERS = int(os.getenv("INFERENCE_EXECUTOR_WORKERS", str(_default_inference_workers())))
+INFERENCE_EXECUTOR_QUEUE   = int(os.getenv("INFERENCE_EXECUTOR_QUEUE", "32"))
+
+_WAIT_WINDOW = 1024   # jumlah sampel waktu tunggu terakhir untuk p50/p95
+
+
+class BoundedExecutor:
+    """ThreadPoolExecutor dengan batas pekerjaan tertunda + statistik antrean."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name        = name
+        self.max_workers = max_workers
+        self.max_queue   = max_queue
+        self._pool       = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"herbalyze-{name}")
+        self._slots      = asyncio.Semaphore(max_workers + max_queue)
+        self._lock       = threading.Lock()
+        self._queued     = 0
+        self._running    = 0
+        self._completed  = 0
+        self._failed     = 0
+        self._slot_waits = 0
+        self._waits_ms   = deque(maxlen=_WAIT_WINDOW)
+        self._max_wait_ms = 0.0
+
+    def _execute(self, submitted_at: float, fn, args, kwargs):
+        wait_ms = (time.perf_counter() - submitted_at) * 1000
+        with self._lock:
+            self._queued  -= 1
+            self._running += 1
+            self._waits_ms.append(wait_ms)
+            self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                if not ok:
+                    self._failed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Jalankan fn(*args, **kwargs) di pool ini dan tunggu hasilnya tanpa memblokir event loop."""
+        if self._slots.locked():
+            with self._lock:
+                self._slot_waits += 1
+        submitted_at = time.perf_counter()
+        async with self._slots:
+            with self._lock:
+                self._queued += 1
+            loop = asyncio.get_running_loop()
+            # Salin contextvars (request id, sampling trace log) ke thread worker
+            ctx  = contextvars.copy_context()
+            call = functools.partial(ctx.run, self._execute, submitted_at, fn, args, kwargs)
+            return await loop.run_in_executor(self._pool, call)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits_ms)
+            stats = {
+                "workers":     self.max_workers,
+                "queue_limit": self.max_queue,
+                "queued":      self._queued,
+                "running":     self._running,
+                "completed":   self._completed,
+                "failed":      self._failed,
+                "slot_waits":  self._slot_waits,
+                "max_wait_ms": round(self._max_wait_ms, 2),
+            }
+        stats["wait_ms_p50"] = round(waits[len(waits) // 2], 2) if waits else None
+        stats["wait_ms_p95"] = round(waits[int(len(waits) * 0.95)], 2) if waits else None
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+io_executor        = BoundedExecutor("io", IO_EXECUTOR_WORKERS, IO_EXECUTOR_QUEUE)
+inference_executor = BoundedExecutor("inference", INFERENCE_EXECUTOR_WORKERS, INFERENCE_EXECUTOR_QUEUE)
+
+
+async def run_io(fn, *args, **kwargs):
+    return await io_executor.run(fn, *args, **kwargs)
+
+
+async def run_inference(fn, *args, **kwargs):
+    return await inference_executor.run(fn, *args, **kwargs)
+
+
+def executors_status() -> dict:
+    return {"io": io_executor.stats(), "inference": inference_executor.stats()}
+
+
+def shutdown_executors():
+    io_executor.shutdown()
+    inference_executor.shutdown()
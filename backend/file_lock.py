@@ -0,0 +1,42 @@
+"""
+file_lock.py
+Lock eksklusif antar proses berbasis file (fcntl di POSIX, msvcrt di Windows),
+dipakai bersama oleh history_writer.py (journal per proses) dan
+embedding_cache.py (snapshot cache label yang ditulis beberapa worker).
+"""
+
+import time
+
+try:
+    import fcntl
+
+    def try_lock(f) -> bool:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def lock_blocking(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:   # Windows
+    import msvcrt
+
+    def try_lock(f) -> bool:
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def lock_blocking(f):
+        while not try_lock(f):
+            time.sleep(0.05)
+
+    def unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,151 @@
+"""
+fuzzy_matcher.py
+Tier pencocokan leksikal toleran typo antara Lapis 1 (exact + istilah) dan
+Lapis 2 (SBERT) di /api/recommend_hybrid. Kosakata = label diagnosis/gejala
++ sinonim_awam kamus_medis, dibangun sekali per snapshot knowledge
+(knowledge_base.py).
+
+    chunk → kunci ternormalisasi (normalize_text_key)
+      → kandidat dari index trigram karakter per panjang kunci (±batas edit),
+        disaring batas q-gram (1 edit merusak <= 3 trigram) + Dice >= FUZZY_MIN_TRIGRAM
+      → jarak Levenshtein terbatas (berhenti begitu melewati batas edit)
+      → diterima hanya jika jarak <= batas DAN tidak ambigu (dua label baku
+        berbeda dengan jarak terbaik yang sama → serahkan ke SBERT)
+
+Contoh: "berat badan berlebohan" → sinonim "berat badan berlebihan" (1 edit)
+→ Obesitas, tanpa menghitung embedding.
+"""
+
+import os
+from collections import Counter, namedtuple
+from itertools import chain
+
+from text_utils import normalize_text_key
+
+# ── Konfigurasi dari .env ──
+FUZZY_MATCH_ENABLED  = os.getenv("FUZZY_MATCH_ENABLED", "1") == "1"
+FUZZY_MIN_LENGTH     = int(os.getenv("FUZZY_MIN_LENGTH", "5"))          # kunci lebih pendek terlalu ambigu
+FUZZY_MAX_EDITS      = int(os.getenv("FUZZY_MAX_EDITS", "2"))
+FUZZY_MAX_EDIT_RATIO = float(os.getenv("FUZZY_MAX_EDIT_RATIO", "0.15"))  # batas edit = panjang kunci x rasio
+FUZZY_MIN_TRIGRAM    = float(os.getenv("FUZZY_MIN_TRIGRAM", "0.3"))     # Dice trigram minimum kandidat
+FUZZY_CANDIDATES     = int(os.getenv("FUZZY_CANDIDATES", "8"))           # kandidat yang dihitung Levenshtein-nya
+
+FuzzyMatch = namedtuple("FuzzyMatch", "text term label source distance")
+
+
+def trigrams(key: str) -> set:
+    padded = f"^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_levenshtein(a: str, b: str, limit: int) -> int:
+    """
+    Jarak edit a↔b, atau limit + 1 begitu dipastikan melewati `limit`.
+    Hanya diagonal ±limit yang dihitung (O(panjang x limit)).
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) > len(b):
+        a, b = b, a
+    over = limit + 1
+    previous = [i if i <= limit else over for i in range(len(a) + 1)]
+    for j in range(1, len(b) + 1):
+        cb = b[j - 1]
+        lo, hi = max(1, j - limit), min(len(a), j + limit)
+        current = [over] * (len(a) + 1)
+        current[0] = j if j <= limit else over
+        row_min = current[0]
+        for i in range(lo, hi + 1):
+            cost = previous[i - 1] + (a[i - 1] != cb)
+            if previous[i] + 1 < cost:
+                cost = previous[i] + 1
+            if current[i - 1] + 1 < cost:
+                cost = current[i - 1] + 1
+            current[i] = cost if cost < over else over
+            if cost < row_min:
+                row_min = cost
+        if row_min > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+
+def max_edits(key: str) -> int:
+    return min(FUZZY_MAX_EDITS, int(len(key) * FUZZY_MAX_EDIT_RATIO))
+
+
+class FuzzyMatcher:
+    """Index read-only setelah dibangun; aman dipakai bersama antar request."""
+
+    def __init__(self):
+        self._terms   = []   # (key, teks istilah, label baku, source)
+        self._grams   = []   # jumlah trigram per istilah
+        self._index   = {}   # panjang kunci → {trigram → list id istilah}; hanya panjang ±batas edit yang discan
+        self._by_key  = {}
+
+    def add(self, text: str, label: str, source: str) -> bool:
+        key = normalize_text_key(text)
+        if len(key) < FUZZY_MIN_LENGTH or key in self._by_key:
+            return False
+        term_id = len(self._terms)
+        self._by_key[key] = term_id
+        self._terms.append((key, text, label, source))
+        grams = trigrams(key)
+        self._grams.append(len(grams))
+        by_gram = self._index.setdefault(len(key), {})
+        for g in grams:
+            by_gram.setdefault(g, []).append(term_id)
+        return True
+
+    @classmethod
+    def build(cls, labels, synonyms) -> "FuzzyMatcher":
+        """Label didaftarkan lebih dulu; sinonim dengan kunci yang sama dilewati."""
+        matcher = cls()
+        for label in labels:
+            matcher.add(label, label, "label")
+        for sinonim, baku in synonyms:
+            matcher.add(sinonim, baku, "sinonim")
+        return matcher
+
+    @property
+    def size(self) -> int:
+        return len(self._terms)
+
+    def match(self, text: str):
+        """FuzzyMatch terbaik untuk `text`, atau None (tidak ada / ambigu / dimatikan)."""
+        key = normalize_text_key(text)
+        if not FUZZY_MATCH_ENABLED or len(key) < FUZZY_MIN_LENGTH:
+            return None
+        limit = max_edits(key)
+        if limit < 1:
+            return None
+
+        exact = self._by_key.get(key)
+        if exact is not None:
+            _, term_text, label, source = self._terms[exact]
+            return FuzzyMatch(text, term_text, label, source, 0)
+
+        grams  = trigrams(key)
+        buckets = [self._index[n] for n in range(len(key) - limit, len(key) + limit + 1) if n in self._index]
+        shared  = Counter(chain.from_iterable(by_gram.get(g, ()) for by_gram in buckets for g in grams))
+        scored = []
+        for term_id, n in shared.items():
+            # Satu edit merusak paling banyak 3 trigram
+            if n < max(len(grams), self._grams[term_id]) - 3 * limit:
+                continue
+            dice = 2 * n / (len(grams) + self._grams[term_id])
+            if dice >= FUZZY_MIN_TRIGRAM:
+                scored.append((dice, term_id))
+        scored.sort(reverse=True)
+
+        best, best_distance, labels = None, limit + 1, set()
+        for _, term_id in scored[:FUZZY_CANDIDATES]:
+            term_key, term_text, label, source = self._terms[term_id]
+            distance = bounded_levenshtein(key, term_key, min(limit, best_distance))
+            if distance < best_distance:
+                best, best_distance, labels = (term_text, label, source), distance, {normalize_text_key(label)}
+            elif distance == best_distance and distance <= limit:
+                labels.add(normalize_text_key(label))
+        if best is None or len(labels) > 1:
+            return None
+        return FuzzyMatch(text, best[0], best[1], best[2], best_distance)
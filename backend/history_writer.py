@@ -0,0 +1,427 @@
+"""
+history_writer.py
+Write-behind untuk riwayat pencarian (tabel search_history).
+
+Endpoint rekomendasi cukup memasukkan record ke antrean in-memory lalu
+langsung merespons; thread latar menulis antrean ke DB dalam INSERT
+multi-baris setiap HISTORY_FLUSH_INTERVAL detik atau begitu antrean
+mencapai HISTORY_FLUSH_BATCH record.
+
+- Request path    : enqueue hanya menambah ke antrean in-memory (tanpa I/O
+                    file maupun DB). Jika antrean penuh (HISTORY_QUEUE_MAX,
+                    mis. DB mati lama), record baru ditolak dan dihitung
+                    sebagai `dropped`; request tidak pernah menunggu flush.
+- Crash-safe      : thread latar meng-append record baru ke journal JSONL
+                    milik proses ini (HISTORY_JOURNAL_DIR/history_<pid>.jsonl)
+                    dengan satu fsync per kelompok (group commit) sebelum
+                    INSERT. Record yang masuk setelah group commit terakhir
+                    (<= HISTORY_FLUSH_INTERVAL detik) bisa hilang jika proses
+                    mati mendadak. Journal tidak ditulis ulang per flush:
+                    offset awalan yang sudah ter-commit dicatat; journal
+                    dikosongkan (truncate) begitu semua isinya ter-commit,
+                    atau dipadatkan saat awalan itu melewati
+                    HISTORY_JOURNAL_COMPACT_BYTES.
+- Multi-worker    : tiap worker uvicorn memegang lock file untuk journal-nya
+                    selama hidup. Saat startup, di bawah lock eksklusif
+                    .replay.lock, worker mengambil alih journal yang lock-nya
+                    bebas (pemiliknya sudah mati). Record diputar ulang dengan
+                    kunci dedup (wallet_address, created_at): duplikat antar
+                    journal dibuang dan record yang ternyata sudah ter-commit
+                    (crash di antara commit dan penulisan ulang journal) dilewati.
+- Shutdown        : flush terakhir; sisa yang gagal tetap di journal.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from file_lock import lock_blocking, try_lock, unlock
+from logging_service import get_logger
+from metrics_service import observe_stage
+
+log = get_logger("history")
+
+# ── Konfigurasi dari .env ──
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))   # detik
+HISTORY_FLUSH_BATCH    = int(os.getenv("HISTORY_FLUSH_BATCH", "100"))
+HISTORY_QUEUE_MAX      = int(os.getenv("HISTORY_QUEUE_MAX", "5000"))
+HISTORY_JOURNAL_DIR    = os.getenv("HISTORY_JOURNAL_DIR", "./cache/history_journal")
+HISTORY_JOURNAL_COMPACT_BYTES = int(os.getenv("HISTORY_JOURNAL_COMPACT_BYTES", str(4 * 1024 * 1024)))
+
+# Journal tunggal versi lama (sebelum journal per proses); diambil alih jika masih ada
+LEGACY_JOURNAL_PATH = "./cache/history_journal.jsonl"
+
+
+def _record_key(record: dict) -> tuple:
+    return record["wallet_address"], record["created_at"]
+
+
+class HistoryWriter:
+
+    def __init__(self, flush_interval: float = HISTORY_FLUSH_INTERVAL, flush_batch: int = HISTORY_FLUSH_BATCH,
+                 max_pending: int = HISTORY_QUEUE_MAX, journal_dir: str = HISTORY_JOURNAL_DIR):
+        self.flush_interval = flush_interval
+        self.flush_batch    = max(1, flush_batch)
+        self.max_pending    = max(1, max_pending)
+        self.journal_dir    = journal_dir
+        self.journal_path   = os.path.join(journal_dir, f"history_{os.getpid()}.jsonl")
+        self._owner_lock    = None   # lock file journal milik proses ini, dipegang sampai stop()
+
+        self._engine     = None
+        self._table      = None
+        self._pending    = deque()
+        self._unjournaled = deque()                  # ekor _pending yang belum masuk journal
+        self._lock       = threading.Lock()          # _pending + _unjournaled
+        self._flush_lock = threading.Lock()          # hanya satu flush dalam satu waktu; pemilik file journal
+        self._journal      = None                    # handle append journal (dipakai di bawah _flush_lock)
+        self._journal_size = 0
+        self._journal_ends = deque()                 # offset akhir tiap record journal yang belum ter-commit
+        self._wakeup     = threading.Event()
+        self._stopping   = False
+        self._thread     = None
+
+        self.flushed        = 0
+        self.batches        = 0
+        self.failed_flushes = 0
+        self.dropped        = 0
+        self.replayed       = 0
+        self.last_flush_ms  = None
+        self.last_error     = None
+
+    # ── Journal ──
+
+    @staticmethod
+    def _encode(record: dict) -> str:
+        return json.dumps({**record, "created_at": record["created_at"].isoformat()}, ensure_ascii=False)
+
+    @staticmethod
+    def _decode(line: str) -> dict:
+        record = json.loads(line)
+        record["created_at"] = datetime.fromisoformat(record["created_at"])
+        return record
+
+    @staticmethod
+    def _fsync_dir(path: str):
+        if os.name == "nt":
+            return
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _rewrite_journal(self):
+        """Tulis journal baru berisi seluruh antrean (hanya saat startup/replay), lalu buka untuk append."""
+        tmp_path = f"{self.journal_path}.tmp"   # path journal sudah unik per proses
+        self._journal_ends.clear()
+        size = 0
+        with open(tmp_path, "wb") as f:
+            for record in self._pending:
+                line = (self._encode(record) + "\n").encode("utf-8")
+                f.write(line)
+                size += len(line)
+                self._journal_ends.append(size)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        self._fsync_dir(self.journal_path)
+        self._unjournaled.clear()
+        self._journal = open(self.journal_path, "ab")
+        self._journal_size = size
+
+    def _sync_journal(self):
+        """Group commit: append semua record yang belum di-journal, satu fsync. Di bawah _flush_lock."""
+        with self._lock:
+            records = list(self._unjournaled)
+            self._unjournaled.clear()
+        if not records or self._journal is None:
+            return
+        for record in records:
+            line = (self._encode(record) + "\n").encode("utf-8")
+            self._journal.write(line)
+            self._journal_size += len(line)
+            self._journal_ends.append(self._journal_size)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _release_journal(self, committed: int):
+        """
+        `committed` record teratas antrean sudah di DB. Journal tidak ditulis
+        ulang: kosongkan jika semua isinya ter-commit, padatkan jika awalan
+        yang ter-commit sudah besar. Di bawah _flush_lock.
+        """
+        journaled = min(committed, len(self._journal_ends))
+        base = 0
+        for _ in range(journaled):
+            base = self._journal_ends.popleft()
+        if committed > journaled:
+            # Ter-commit sebelum sempat di-journal (masuk setelah group commit)
+            with self._lock:
+                for _ in range(committed - journaled):
+                    self._unjournaled.popleft()
+        if self._journal is None:
+            return
+        if not self._journal_ends:
+            self._journal.truncate(0)
+            self._journal_size = 0
+        elif base >= HISTORY_JOURNAL_COMPACT_BYTES:
+            self._compact_journal(base)
+
+    def _compact_journal(self, base: int):
+        """Salin ekor journal yang belum ter-commit (mulai offset `base`) ke file baru."""
+        tmp_path = f"{self.journal_path}.tmp"
+        self._journal.close()
+        with open(self.journal_path, "rb") as src, open(tmp_path, "wb") as dst:
+            src.seek(base)
+            while True:
+                block = src.read(1024 * 1024)
+                if not block:
+                    break
+                dst.write(block)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp_path, self.journal_path)
+        self._fsync_dir(self.journal_path)
+        self._journal = open(self.journal_path, "ab")
+        self._journal_size -= base
+        self._journal_ends = deque(end - base for end in self._journal_ends)
+
+    def _read_journal(self, path: str) -> list:
+        records = []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(self._decode(line))
+                    except Exception as e:
+                        # Baris terakhir bisa terpotong jika proses mati saat menulis
+                        log.warning("Baris journal rusak dilewati (%s): %s", path, e)
+        except FileNotFoundError:
+            pass
+        return records
+
+    def _orphan_journals(self) -> list:
+        """
+        Journal yang pemiliknya sudah mati: lock file-nya bisa dikunci (atau
+        tidak ada). Returns list (path journal, handle lock yang sedang dipegang).
+        """
+        orphans = []
+        candidates = glob.glob(os.path.join(self.journal_dir, "history_*.jsonl"))
+        if os.path.exists(LEGACY_JOURNAL_PATH):
+            candidates.append(LEGACY_JOURNAL_PATH)
+        for path in candidates:
+            if os.path.abspath(path) == os.path.abspath(self.journal_path):
+                # PID dipakai ulang: journal proses lama dengan PID yang sama
+                orphans.append((path, None))
+                continue
+            lock = open(f"{path}.lock", "a+")
+            if try_lock(lock):
+                orphans.append((path, lock))
+            else:
+                lock.close()   # pemilik masih hidup
+        return orphans
+
+    def _committed_keys(self, records: list) -> set:
+        """Kunci dedup record yang sudah ada di tabel (commit sebelum journal sempat ditulis ulang)."""
+        committed = set()
+        if self._engine is None or not records:
+            return committed
+        t = self._table
+        stamps = sorted({r["created_at"] for r in records})
+        with self._engine.connect() as conn:
+            for start in range(0, len(stamps), 500):
+                rows = conn.execute(select(t.c.wallet_address, t.c.created_at)
+                                    .where(t.c.created_at.in_(stamps[start:start + 500]))).fetchall()
+                committed.update((w, c) for w, c in rows)
+        return committed
+
+    def _replay_journals(self) -> int:
+        """Ambil alih journal yatim ke journal proses ini; dijalankan di bawah .replay.lock."""
+        orphans = self._orphan_journals()
+        try:
+            seen, records = set(), []
+            for path, _ in orphans:
+                for record in self._read_journal(path):
+                    key = _record_key(record)
+                    if key not in seen:
+                        seen.add(key)
+                        records.append(record)
+            try:
+                committed = self._committed_keys(records)
+            except Exception as e:
+                # DB belum bisa dicek: lebih baik duplikat daripada kehilangan riwayat
+                log.warning("Cek riwayat yang sudah ter-commit gagal: %s", e)
+                committed = set()
+            self._pending.extend(r for r in records if _record_key(r) not in committed)
+            # Tulis ke journal sendiri DULU, baru hapus journal yatim (crash di antaranya = duplikat, bukan hilang)
+            self._rewrite_journal()
+            for path, lock in orphans:
+                if os.path.abspath(path) == os.path.abspath(self.journal_path):
+                    continue
+                os.remove(path)
+                if lock is not None:
+                    os.remove(lock.name)
+            if committed:
+                log.info("%d riwayat journal sudah ter-commit, dilewati", len(records) - len(self._pending))
+            return len(self._pending)
+        finally:
+            for _, lock in orphans:
+                if lock is not None:
+                    unlock(lock)
+                    lock.close()
+
+    # ── API ──
+
+    def start(self, engine, table=None):
+        """Putar ulang journal dari proses sebelumnya lalu jalankan thread flush."""
+        if table is None:
+            from models import SearchHistory
+            table = SearchHistory.__table__
+        self._engine, self._table = engine, table
+        os.makedirs(self.journal_dir, exist_ok=True)
+        # Kunci journal sendiri lebih dulu agar worker lain tidak menganggapnya yatim
+        self._owner_lock = open(f"{self.journal_path}.lock", "a+")
+        try_lock(self._owner_lock)
+        with open(os.path.join(self.journal_dir, ".replay.lock"), "a+") as replay_lock, self._lock:
+            lock_blocking(replay_lock)
+            try:
+                self.replayed = self._replay_journals()
+            finally:
+                unlock(replay_lock)
+        if self.replayed:
+            log.info("%d riwayat dari journal diantrekan ulang", self.replayed)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="herbalyze-history-writer", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, wallet_address: str, diagnoses, symptoms, special_conditions, chemical_drugs,
+                recommendations) -> bool:
+        """Antrekan satu riwayat (tanpa I/O). Returns False jika antrean penuh dan record dibuang."""
+        record = {
+            "wallet_address":     wallet_address,
+            "diagnoses":          diagnoses,
+            "symptoms":           symptoms,
+            "special_conditions": special_conditions,
+            "chemical_drugs":     chemical_drugs,
+            "recommendations":    recommendations,
+            "created_at":         datetime.utcnow(),
+        }
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                log.error("Antrean penuh (%d), riwayat %s dibuang", self.max_pending, wallet_address)
+                return False
+            self._pending.append(record)
+            self._unjournaled.append(record)
+            size = len(self._pending)
+        if size >= self.flush_batch:
+            self._wakeup.set()
+        return True
+
+    def flush(self) -> int:
+        """
+        Group commit journal lalu tulis seluruh antrean saat ini ke DB.
+        Dipanggil thread latar (dan stop()), bukan dari request.
+        Returns jumlah baris yang ter-commit.
+        """
+        if self._engine is None:
+            return 0
+        with self._flush_lock:
+            try:
+                self._sync_journal()
+            except OSError as e:
+                log.warning("Append journal gagal: %s", e)
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return 0
+            t0 = time.time()
+            written = 0
+            try:
+                for start in range(0, len(batch), self.flush_batch):
+                    rows = [{**r, "is_deleted": False} for r in batch[start:start + self.flush_batch]]
+                    with observe_stage("history_write"), self._engine.begin() as conn:
+                        conn.execute(insert(self._table).values(rows))
+                    written += len(rows)
+            except Exception as e:
+                self.failed_flushes += 1
+                self.last_error = str(e)
+                log.warning("Flush gagal (%d riwayat tetap di antrean): %s", len(batch) - written, e)
+            if written:
+                with self._lock:
+                    # Record baru hanya ditambahkan di ekor, jadi `written` teratas = yang sudah ter-commit
+                    for _ in range(written):
+                        self._pending.popleft()
+                try:
+                    self._release_journal(written)
+                except OSError as e:
+                    log.warning("Pemadatan journal gagal: %s", e)
+                self.flushed += written
+                self.batches += 1
+                self.last_flush_ms = (time.time() - t0) * 1000
+            return written
+
+    def pending_for(self, wallet_address: str) -> list:
+        """Salinan record `wallet_address` yang belum ter-commit (terlama dulu)."""
+        wallet = (wallet_address or "").lower()
+        with self._lock:
+            return [dict(r) for r in self._pending if (r["wallet_address"] or "").lower() == wallet]
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(timeout=self.flush_interval)
+            self._wakeup.clear()
+            if self._pending:
+                self.flush()
+
+    def stop(self):
+        """Hentikan thread dan lakukan flush terakhir (shutdown aplikasi)."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        written = self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._pending:
+            log.warning("%d riwayat belum tersimpan, tetap di journal %s", len(self._pending), self.journal_path)
+        else:
+            if written:
+                log.info("Flush terakhir: %d riwayat", written)
+            try:
+                os.remove(self.journal_path)
+            except FileNotFoundError:
+                pass
+        if self._owner_lock is not None:
+            # Journal yang tersisa bisa diambil alih worker berikutnya
+            unlock(self._owner_lock)
+            self._owner_lock.close()
+            if not self._pending:
+                os.remove(self._owner_lock.name)
+            self._owner_lock = None
+
+    def status(self) -> dict:
+        return {
+            "pending":        len(self._pending),
+            "max_pending":    self.max_pending,
+            "flushed":        self.flushed,
+            "batches":        self.batches,
+            "failed_flushes": self.failed_flushes,
+            "dropped":        self.dropped,
+            "replayed":       self.replayed,
+            "last_flush_ms":  round(self.last_flush_ms, 2) if self.last_flush_ms is not None else None,
+            "last_error":     self.last_error,
+        }
+
+
+history_writer = HistoryWriter()
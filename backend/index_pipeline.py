@@ -0,0 +1,194 @@
+"""
+index_pipeline.py
+Pipeline build index embedding (herbal_collection, med_labels) untuk
+scripts/update_dataset.py:
+
+    baris DB (server-side cursor, per batch)
+      → id konten; baris yang sudah ada di koleksi dilewati
+      → embedding store (embedding_store.py); yang belum ada dikirim ke
+        EncoderPool: N proses encoder, masing-masing satu model
+      → thread insert: tulis store + upsert ke koleksi
+
+Encode batch berikutnya berjalan di proses worker sementara thread insert
+menulis batch sebelumnya. Jumlah batch yang sedang diproses dibatasi
+(backpressure) sehingga memori tetap kecil berapa pun jumlah baris.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+
+import numpy as np
+
+from embedding_store import text_hash
+
+# ── Konfigurasi dari .env ──
+INDEX_BUILD_WORKERS = int(os.getenv("INDEX_BUILD_WORKERS", str(os.cpu_count() or 1)))
+INDEX_BUILD_BATCH   = int(os.getenv("INDEX_BUILD_BATCH", "256"))   # baris per batch cursor/upsert
+
+# Batch forward pass model di dalam satu batch pipeline
+ENCODE_BATCH = 64
+
+# Detik antar baris progress
+PROGRESS_EVERY = 2.0
+
+_worker_model = None
+
+
+def _init_worker(backend: str, model_name: str, onnx_path: str, threads: int):
+    """Dijalankan sekali per proses worker: muat model dengan jatah thread CPU sendiri."""
+    global _worker_model
+    if backend == "onnx":
+        from encoder_backends import OnnxEncoder
+        _worker_model = OnnxEncoder(onnx_path, threads=threads)
+        return
+    import torch
+    torch.set_num_threads(threads)
+    from encoder_backends import load_encoder
+    _worker_model = load_encoder(backend, model_name, onnx_path)
+
+
+def _encode(model, texts: list) -> np.ndarray:
+    return np.asarray(model.encode(texts, batch_size=ENCODE_BATCH, show_progress_bar=False), dtype=np.float32)
+
+
+def _encode_in_worker(texts: list) -> np.ndarray:
+    return _encode(_worker_model, texts)
+
+
+class EncoderPool:
+    """
+    workers > 1 : ProcessPoolExecutor (spawn), thread CPU dibagi rata per worker.
+    workers <= 1: satu thread dengan model in-process (`get_model`), tetap
+                  overlap dengan thread insert.
+    Proses baru dibuat saat submit pertama: run tanpa teks baru tidak memuat model.
+    """
+
+    def __init__(self, backend: str, model_name: str, onnx_path: str = None,
+                 workers: int = INDEX_BUILD_WORKERS, get_model=None):
+        self.backend, self.model_name, self.onnx_path = backend, model_name, onnx_path
+        self.workers   = max(1, workers)
+        self.get_model = get_model
+        self._executor = None
+
+    @property
+    def inflight(self) -> int:
+        """Batch maksimum yang menunggu encode/insert."""
+        return self.workers * 2
+
+    def _start(self):
+        if self.workers > 1:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.backend, self.model_name, self.onnx_path, threads),
+            )
+            print(f"   Encoder pool: {self.workers} proses x {threads} thread")
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encoder")
+
+    def submit(self, texts: list):
+        if self._executor is None:
+            self._start()
+        if self.workers > 1:
+            return self._executor.submit(_encode_in_worker, texts)
+        return self._executor.submit(_encode, self.get_model(), texts)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class _Progress:
+    def __init__(self, label: str, total: int = None):
+        self.label, self.total = label, total
+        self.rows = self.encoded = self.written = 0
+        self.started = self._last = time.perf_counter()
+
+    def report(self, final: bool = False):
+        now = time.perf_counter()
+        if not final and now - self._last < PROGRESS_EVERY:
+            return
+        self._last = now
+        elapsed = max(now - self.started, 1e-9)
+        of_total = f"/{self.total}" if self.total is not None else ""
+        print(f"   {self.label}: {self.rows}{of_total} baris, {self.written} ditulis, {self.encoded} di-encode "
+              f"({self.rows / elapsed:.0f} baris/s, {self.encoded / elapsed:.0f} encode/s)")
+
+
+def stream_into_collection(batches, collection, store, model_id: str, prefix: str, pool: EncoderPool,
+                           total: int = None) -> dict:
+    """
+    Sinkronkan `collection` dengan aliran batch (ids, documents, metadatas):
+    baris baru di-embed (store dulu, lalu pool) dan di-upsert, id yang tidak
+    muncul lagi dihapus di akhir. Returns ringkasan hitungan + throughput.
+    """
+    existing = set(collection.get(include=[])["ids"])
+    wanted   = set()
+    progress = _Progress(collection.name, total)
+    pending  = queue.Queue(maxsize=pool.inflight)
+    failure  = []
+
+    def insert_loop():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            if failure:
+                continue   # kosongkan antrean agar producer tidak tertahan
+            ids, docs, metas, found, missing, future = item
+            try:
+                if future is not None:
+                    vectors = future.result()
+                    store.put(missing, vectors, prefix, model_id)
+                    found.update(zip(map(text_hash, missing), vectors))
+                    progress.encoded += len(missing)
+                collection.upsert(ids=ids, documents=docs, metadatas=metas,
+                                  embeddings=[found[text_hash(d)].tolist() for d in docs])
+                progress.written += len(ids)
+                progress.report()
+            except Exception as e:
+                failure.append(e)
+
+    inserter = threading.Thread(target=insert_loop, name="index-insert", daemon=True)
+    inserter.start()
+    try:
+        for ids, docs, metas in batches:
+            if failure:
+                break
+            wanted.update(ids)
+            progress.rows += len(ids)
+            fresh = [k for k, i in enumerate(ids) if i not in existing]
+            if not fresh:
+                progress.report()
+                continue
+            ids, docs, metas = [ids[k] for k in fresh], [docs[k] for k in fresh], [metas[k] for k in fresh]
+            found   = store.lookup(docs, prefix, model_id)
+            missing = list(dict.fromkeys(d for d in docs if text_hash(d) not in found))
+            future  = pool.submit([f"{prefix}{d}" for d in missing]) if missing else None
+            pending.put((ids, docs, metas, found, missing, future))   # blok jika antrean penuh
+    finally:
+        pending.put(None)
+        inserter.join()
+    if failure:
+        raise failure[0]
+
+    stale = [i for i in existing if i not in wanted]
+    for start in range(0, len(stale), INDEX_BUILD_BATCH):
+        collection.delete(ids=stale[start:start + INDEX_BUILD_BATCH])
+    progress.report(final=True)
+
+    elapsed = time.perf_counter() - progress.started
+    return {
+        "rows":      progress.rows,
+        "written":   progress.written,
+        "encoded":   progress.encoded,
+        "deleted":   len(stale),
+        "unchanged": progress.rows - progress.written,
+        "seconds":   round(elapsed, 2),
+        "rows_per_s": round(progress.rows / elapsed, 1) if elapsed else None,
+    }
@@ -0,0 +1,162 @@
+"""
+inference_scheduler.py
+Micro-batching untuk encode embedding lintas request.
+
+Request /api/recommend_hybrid yang berjalan bersamaan masing-masing hanya
+membawa beberapa chunk pendek. Scheduler ini mengumpulkan teks dari semua
+pemanggil selama paling lama EMBED_BATCH_MAX_WAIT_MS (atau sampai
+EMBED_BATCH_MAX_SIZE teks), menjalankan SATU forward pass untuk semuanya,
+lalu mengisi Future milik tiap pemanggil dengan embedding-nya sendiri.
+
+Setiap Future pasti selesai: submit yang kalah balapan dengan close() ditolak
+(RuntimeError), item yang masih di antrean saat thread berhenti diberi
+exception, dan encode() menunggu paling lama EMBED_RESULT_TIMEOUT_S detik.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# ── Konfigurasi dari .env ──
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+EMBED_BATCH_MAX_SIZE    = int(os.getenv("EMBED_BATCH_MAX_SIZE", "64"))
+EMBED_RESULT_TIMEOUT_S  = float(os.getenv("EMBED_RESULT_TIMEOUT_S", "30"))
+
+# Batas atas bucket histogram ukuran batch (kumulatif, seperti `le` Prometheus)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+_STOP = object()
+
+
+class MicroBatchScheduler:
+    """
+    Satu thread latar memegang model; pemanggil dari thread mana pun cukup
+    memanggil encode(texts) dan menunggu hasilnya.
+    """
+
+    def __init__(self, encode_fn, max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS,
+                 max_batch_size: int = EMBED_BATCH_MAX_SIZE, name: str = "embed"):
+        self.encode_fn      = encode_fn
+        self.max_wait_ms    = max_wait_ms
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._queue   = queue.Queue()
+        self._lock    = threading.Lock()
+        self._submit_lock = threading.Lock()   # _closed + put ke antrean; _STOP selalu item terakhir
+        self._closed  = False
+        self._batches = 0
+        self._items   = 0
+        self._failed  = 0
+        self._encode_ms_total = 0.0
+        self._wait_ms_total   = 0.0
+        self._histogram = {str(b): 0 for b in BATCH_SIZE_BUCKETS}
+        self._histogram["+Inf"] = 0
+
+        self._thread = threading.Thread(target=self._run, name=f"herbalyze-{name}-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: list) -> list:
+        """Antrekan teks; kembalikan list Future (satu per teks) berisi vektor embedding."""
+        futures = []
+        now = time.perf_counter()
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("Scheduler embedding sudah ditutup")
+            for text in texts:
+                future = Future()
+                self._queue.put((text, future, now))
+                futures.append(future)
+        return futures
+
+    def encode(self, texts: list, timeout: float = EMBED_RESULT_TIMEOUT_S) -> np.ndarray:
+        """Padanan model.encode(texts) yang berbagi forward pass dengan request lain."""
+        futures = self.submit(texts)
+        return np.stack([f.result(timeout=timeout) for f in futures]) if futures else np.zeros((0, 0), dtype=np.float32)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Selesaikan batch ini dulu, berhenti di putaran berikutnya
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _drain(self):
+        """Gagalkan semua item yang tersisa di antrean (thread batcher sudah berhenti)."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP:
+                item[1].set_exception(RuntimeError("Scheduler embedding ditutup sebelum item diproses"))
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                self._drain()
+                return
+            started = time.perf_counter()
+            try:
+                embeddings = self.encode_fn([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                with self._lock:
+                    self._failed += 1
+                continue
+            encode_ms = (time.perf_counter() - started) * 1000
+
+            for (_, future, _), emb in zip(batch, embeddings):
+                future.set_result(emb)
+            self._record(len(batch), encode_ms, sum((started - t) * 1000 for _, _, t in batch))
+
+    def _record(self, size: int, encode_ms: float, wait_ms: float):
+        with self._lock:
+            self._batches += 1
+            self._items   += size
+            self._encode_ms_total += encode_ms
+            self._wait_ms_total   += wait_ms
+            for bound in BATCH_SIZE_BUCKETS:
+                if size <= bound:
+                    self._histogram[str(bound)] += 1
+            self._histogram["+Inf"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_wait_ms":        self.max_wait_ms,
+                "max_batch_size":     self.max_batch_size,
+                "pending":            self._queue.qsize(),
+                "batches":            self._batches,
+                "items":              self._items,
+                "failed_batches":     self._failed,
+                "avg_batch_size":     round(self._items / self._batches, 2) if self._batches else 0.0,
+                "avg_encode_ms":      round(self._encode_ms_total / self._batches, 2) if self._batches else 0.0,
+                "avg_queue_wait_ms":  round(self._wait_ms_total / self._items, 2) if self._items else 0.0,
+                "batch_size_histogram": dict(self._histogram),
+            }
+
+    def close(self, timeout: float = 5.0):
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
@@ -0,0 +1,204 @@
+"""
+inference_service.py
+Siklus hidup model embedding (SentenceTransformer / ONNX) dan index label `med_labels`
+untuk Lapis 2. Model dan index dimuat SEKALI per worker saat startup aplikasi,
+di-warm-up, lalu dipakai bersama oleh semua request.
+
+Index label bisa ChromaDB (default) atau matriks NumPy memory-mapped,
+dipilih lewat LABEL_INDEX_BACKEND (lihat label_index.py). Encoder bisa
+PyTorch (default) atau ONNX int8, dipilih lewat EMBEDDING_BACKEND
+(lihat encoder_backends.py).
+
+Encode chunk dari request-request yang bersamaan digabung menjadi satu
+forward pass oleh MicroBatchScheduler (lihat inference_scheduler.py).
+
+Index label per versi dataset dimiliki KnowledgeSnapshot (knowledge_base.py);
+request mengoper index dari snapshot-nya ke resolve_labels sehingga model
+tetap sama sementara index label bisa ditukar tanpa restart.
+"""
+
+import os
+import threading
+import time
+
+from embedding_cache import LabelResolutionCache
+from encoder_backends import EMBEDDING_BACKEND, ONNX_MODEL_PATH, load_encoder
+from inference_scheduler import EMBED_RESULT_TIMEOUT_S, MicroBatchScheduler
+from label_index import CHROMA_PATH, LABEL_COLLECTION_NAME, LABEL_INDEX_BACKEND, LABEL_INDEX_PATH, open_label_index
+from logging_service import get_logger
+from metrics_service import observe_stage
+
+log = get_logger("inference")
+
+# ── Konfigurasi dari .env ──
+EMBEDDING_MODEL_NAME  = os.getenv("EMBEDDING_MODEL_NAME", "intfloat/multilingual-e5-small")
+
+WARMUP_TEXT = "query: demam"
+
+
+class InferenceService:
+    """
+    Pemegang handle model + index label yang dipakai bersama dalam satu proses.
+    Status: "idle" → "loading" → "ready" / "failed".
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, chroma_path: str = CHROMA_PATH,
+                 collection_name: str = LABEL_COLLECTION_NAME, index_backend: str = LABEL_INDEX_BACKEND,
+                 index_path: str = LABEL_INDEX_PATH, encoder_backend: str = EMBEDDING_BACKEND,
+                 onnx_path: str = ONNX_MODEL_PATH):
+        self.model_name      = model_name
+        self.encoder_backend = encoder_backend
+        self.onnx_path       = onnx_path
+        self.chroma_path     = chroma_path
+        self.collection_name = collection_name
+        self.index_backend   = index_backend
+        self.index_path      = index_path
+
+        self._lock        = threading.Lock()
+        self._model       = None
+        self._label_index = None
+        self._scheduler   = None
+        self.state        = "idle"
+        self.error        = None
+        self.loaded_at    = None
+        self.load_ms      = None
+        self.warmup_ms    = None
+        self.version      = None
+        self.cache        = LabelResolutionCache()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def _index_version(self, label_index) -> str:
+        # Embedding ONNX int8 sedikit berbeda dari PyTorch → cache tidak boleh tercampur
+        return f"{self.model_name}|{self.encoder_backend}|{label_index.version}"
+
+    def load(self, label_index=None) -> bool:
+        """
+        Muat model + index label dan jalankan warm-up encode. Aman dipanggil berulang.
+        `label_index` dari snapshot knowledge aktif; None → buka dari CHROMA_PATH / LABEL_INDEX_PATH.
+        """
+        with self._lock:
+            if self.ready:
+                return True
+            self.state = "loading"
+            self.error = None
+            try:
+                t0 = time.time()
+                model = load_encoder(self.encoder_backend, self.model_name, self.onnx_path)
+                if label_index is None:
+                    label_index = open_label_index(self.index_backend, self.chroma_path,
+                                                   self.collection_name, self.index_path)
+                self.load_ms = (time.time() - t0) * 1000
+
+                # Warm-up: forward pass pertama selalu lambat (alokasi tensor, lazy init)
+                t1 = time.time()
+                label_index.query(model.encode([WARMUP_TEXT]), k=1)
+                self.warmup_ms = (time.time() - t1) * 1000
+
+                self._model       = model
+                self._label_index = label_index
+                self._scheduler   = MicroBatchScheduler(model.encode)
+                self.loaded_at    = time.time()
+                self.version      = self._index_version(label_index)
+                warm_entries      = self.cache.load(self.version)
+                self.cache.start()
+                self.state        = "ready"
+                log.info("%d entri label cache dimuat dari snapshot", warm_entries)
+                log.info("Model '%s' (%s) + index label (%s) siap (load %.0f ms, warm-up %.0f ms, %d label)",
+                         self.model_name, self.encoder_backend, label_index.backend,
+                         self.load_ms, self.warmup_ms, label_index.count())
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                log.error("Gagal memuat model/index label: %s", e)
+        return self.ready
+
+    def get_handles(self):
+        """
+        Kembalikan (model, label_index) bersama. Jika startup gagal, coba muat
+        ulang sekali; jika tetap gagal lempar RuntimeError.
+        """
+        if not self.ready and not self.load():
+            raise RuntimeError(f"Inference service belum siap: {self.error}")
+        return self._model, self._label_index
+
+    def warm_label_index(self, label_index):
+        """Warm-up index label snapshot baru sebelum ditukar masuk (dipanggil watcher knowledge)."""
+        if self.ready:
+            label_index.query(self._model.encode([WARMUP_TEXT]), k=1)
+
+    def use_snapshot(self, snapshot):
+        """Callback swap snapshot: index label snapshot menjadi default untuk status & pemanggil tanpa snapshot."""
+        if snapshot.label_index is not None and self.ready:
+            self._label_index = snapshot.label_index
+            self.version      = self._index_version(snapshot.label_index)
+
+    def resolve_labels(self, chunks: list, label_index=None, timeout: float = EMBED_RESULT_TIMEOUT_S) -> list:
+        """
+        Petakan semua chunk dari satu request ke label baku sekaligus:
+        satu forward pass (batch encode) + satu query multi-vektor ke index label.
+        `label_index` dari snapshot request; None → index default service.
+        `timeout` detik menunggu hasil encode (TimeoutError jika terlewati).
+
+        Returns:
+            list sejajar dengan `chunks`; tiap elemen dict {baku, similarity}
+            (similarity dalam persen) atau None jika index tidak mengembalikan hasil.
+        """
+        if not chunks:
+            return []
+        _, default_index = self.get_handles()
+        if label_index is None:
+            label_index = default_index
+        version = self._index_version(label_index)
+
+        # Chunk yang sudah pernah diresolusi tidak perlu di-encode ulang
+        results = [None] * len(chunks)
+        misses  = []
+        with observe_stage("lapis2_cache"):
+            for i, chunk in enumerate(chunks):
+                cached = self.cache.get(chunk, version)
+                if cached is not None:
+                    results[i] = {"baku": cached["baku"], "similarity": cached["similarity"]}
+                else:
+                    misses.append(i)
+        if not misses:
+            return results
+
+        with observe_stage("lapis2_encode"):
+            embeddings = self._scheduler.encode([f"query: {chunks[i]}" for i in misses], timeout=timeout)
+        with observe_stage("lapis2_search"):
+            hits = label_index.query(embeddings, k=1)
+
+        for i, emb, top in zip(misses, embeddings, hits):
+            if not top:
+                continue
+            resolved = top[0]
+            results[i] = resolved
+            self.cache.put(chunks[i], version, emb.astype("float32"), resolved["baku"], resolved["similarity"])
+        return results
+
+    def status(self) -> dict:
+        return {
+            "state":      self.state,
+            "model":      self.model_name,
+            "encoder":    self.encoder_backend,
+            "backend":    self.index_backend,
+            "labels":     self._label_index.count() if self._label_index is not None else 0,
+            "load_ms":    round(self.load_ms, 2) if self.load_ms is not None else None,
+            "warmup_ms":  round(self.warmup_ms, 2) if self.warmup_ms is not None else None,
+            "error":      self.error,
+            "version":    self.version,
+            "cache":      self.cache.stats(),
+            "batching":   self._scheduler.stats() if self._scheduler is not None else None,
+        }
+
+    def close(self):
+        """Hentikan thread micro-batching dan thread snapshot cache, lalu simpan snapshot terakhir (shutdown aplikasi)."""
+        if self._scheduler is not None:
+            self._scheduler.close()
+        self.cache.close()
+
+
+inference_service = InferenceService()
@@ -0,0 +1,591 @@
+"""
+knowledge_base.py
+Index in-memory dari tabel herbal_diagnoses & herbal_symptoms:
+- label (diagnosis/gejala ternormalisasi) → himpunan herbal + jenis grup.
+  Dipakai /api/recommend dan Lapis 1/2 /api/recommend_hybrid agar pencocokan
+  label cukup lookup dict O(1) tanpa round trip ke DB.
+- katalog herbal: herbal_name → detail + nama utama + varian nama + latin key,
+  semuanya dihitung sekali saat index dibangun.
+- pencocok istilah (term_matcher.py): Aho-Corasick atas semua label +
+  sinonim kamus_medis untuk Lapis 1 hybrid_rag, dan index fuzzy
+  (fuzzy_matcher.py) atas kosakata yang sama untuk typo sebelum Lapis 2.
+- index keamanan kondisi khusus: kondisi → himpunan herbal tidak aman beserta
+  deskripsi & referensi yang sudah digabung, sehingga klasifikasi kandidat
+  terhadap kombinasi kondisi aktif cukup operasi irisan himpunan.
+
+Index tabel + index label med_labels + mode membentuk satu snapshot
+berversi (KnowledgeSnapshot). scripts/update_dataset.py men-seed tabel ke
+staging, membangun index label ke knowledge/<versi>/ DARI tabel staging, lalu
+terakhir men-swap tabel dan langsung menulis manifest
+config/dataset_version.json (rebuild gagal → tabel live & manifest tidak
+berubah); watcher di sini membangun snapshot baru di latar dan menukarnya
+tanpa restart.
+"""
+
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import inspect, text
+
+from text_utils import normalize_text_key, herb_main_name, herb_name_variants
+from label_index import CHROMA_PATH, LABEL_INDEX_PATH, open_label_index
+from term_matcher import TermMatcher
+from fuzzy_matcher import FuzzyMatcher
+from logging_service import get_logger
+
+log = get_logger("knowledge")
+
+# ── Konfigurasi dari .env ──
+KNOWLEDGE_POLL_INTERVAL = float(os.getenv("KNOWLEDGE_POLL_INTERVAL", "5"))   # detik; 0 = tanpa watcher
+
+_CONFIG_DIR          = os.path.join(os.path.dirname(__file__), "config")
+DATASET_VERSION_PATH = os.path.join(_CONFIG_DIR, "dataset_version.json")
+ACTIVE_MODE_PATH     = os.path.join(_CONFIG_DIR, "active_mode.json")
+
+MODES        = ("pure_sbert", "rag", "hybrid_rag")
+DEFAULT_MODE = "hybrid_rag"
+
+# Isi med_labels yang dibutuhkan tiap mode (update_dataset.py rebuild_kamus_medis_chromadb):
+# pure_sbert = label baku saja, rag/hybrid_rag = label baku + sinonim kamus_medis
+LABEL_CONTENT = {"pure_sbert": "label", "rag": "label+sinonim", "hybrid_rag": "label+sinonim"}
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        log.warning("Gagal membaca %s: %s", path, e)
+        return {}
+
+
+def read_dataset_version(path: str = DATASET_VERSION_PATH) -> str:
+    """Versi dataset yang terakhir di-seed; 'unversioned' jika file belum ada."""
+    return str(_read_json(path).get("version") or "unversioned")
+
+
+def read_manifest(path: str = DATASET_VERSION_PATH, mode_path: str = ACTIVE_MODE_PATH) -> dict:
+    """
+    Manifest snapshot yang ditulis scripts/update_dataset.py (dataset_version.json):
+    version, mode, chroma_path, label_index_path. Manifest lama (hanya version)
+    tetap didukung: path index = CHROMA_PATH / LABEL_INDEX_PATH.
+
+    Mode aktif diambil dari active_mode.json; "mode" di manifest (index_mode)
+    adalah mode saat med_labels snapshot dibangun dan hanya menjadi default.
+    active_mode.json boleh berpindah antar mode dengan isi med_labels yang
+    sama (rag ↔ hybrid_rag); pindah pure_sbert ↔ rag/hybrid_rag butuh rebuild
+    med_labels, jadi ditolak dan snapshot tetap di index_mode.
+    """
+    data = _read_json(path)
+    index_mode = data.get("mode")
+    if index_mode is not None and index_mode not in MODES:
+        log.warning("Mode manifest '%s' tidak dikenal, diabaikan", index_mode)
+        index_mode = None
+    mode = _read_json(mode_path).get("mode") or index_mode or DEFAULT_MODE
+    if mode not in MODES:
+        log.warning("Mode '%s' tidak dikenal, gunakan %s", mode, index_mode or DEFAULT_MODE)
+        mode = index_mode or DEFAULT_MODE
+    if index_mode is not None and LABEL_CONTENT[mode] != LABEL_CONTENT[index_mode]:
+        log.warning("Mode '%s' butuh med_labels %s, tetapi snapshot %s dibangun untuk mode '%s' (%s); "
+                    "tetap '%s' sampai update_dataset.py dijalankan ulang", mode, LABEL_CONTENT[mode],
+                    data.get("version"), index_mode, LABEL_CONTENT[index_mode], index_mode)
+        mode = index_mode
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(path)))
+    resolve  = lambda p: p if os.path.isabs(p) else os.path.join(base_dir, p)
+    return {
+        "version":          str(data.get("version") or "unversioned"),
+        "mode":             mode,
+        "index_mode":       index_mode,
+        "versioned":        "label_index_path" in data or "chroma_path" in data,
+        "chroma_path":      resolve(data["chroma_path"]) if data.get("chroma_path") else CHROMA_PATH,
+        "label_index_path": resolve(data["label_index_path"]) if data.get("label_index_path") else LABEL_INDEX_PATH,
+        "updated_at":       data.get("updated_at"),
+    }
+
+
+def _key_expr(db, table: str, key_col: str, src_col: str) -> str:
+    """
+    Kolom kunci ternormalisasi ditulis saat seed (scripts/update_dataset.py).
+    Untuk database yang di-seed sebelum kolom itu ada, pakai kolom sumber
+    dan normalisasi di Python.
+    """
+    columns = {c["name"] for c in inspect(db.get_bind()).get_columns(table)}
+    return key_col if key_col in columns else src_col
+
+
+def _as_key(value, expr: str, key_col: str) -> str:
+    return (value or "") if expr == key_col else normalize_text_key(value)
+
+
+class KnowledgeBase:
+    """Snapshot read-only; tidak pernah dimutasi setelah dibangun."""
+
+    def __init__(self, version: str):
+        self.version  = version
+        self.built_at = time.time()
+        # key ternormalisasi → {"diagnosis": frozenset(herbal_name), "symptom": frozenset(herbal_name)}
+        self.labels   = {}
+        # herbal_name → {"detail", "main_name", "main_key", "latin_key", "variants"}
+        self.herbs    = {}
+        # key kondisi → {"herbs": frozenset(herbal_name), "rules": {herbal_name: {conditions, descriptions, references}}}
+        self.safety   = {}
+        # (sinonim_awam, istilah_baku) dari kamus_medis
+        self.synonyms = []
+        # Aho-Corasick atas label + sinonim (Lapis 1 hybrid_rag)
+        self.terms    = TermMatcher().compile()
+        # Index trigram + Levenshtein atas kosakata yang sama (tier fuzzy sebelum Lapis 2)
+        self.fuzzy    = FuzzyMatcher()
+
+    @classmethod
+    def build(cls, db, version: str) -> "KnowledgeBase":
+        kb = cls(version)
+        staging, names = {}, {}
+        for field, table in (("diagnosis", "herbal_diagnoses"), ("symptom", "herbal_symptoms")):
+            key_col = f"{field}_key"
+            expr = _key_expr(db, table, key_col, field)
+            rows = db.execute(text(f"SELECT {expr}, {field}, herbal_name FROM {table}")).fetchall()
+            for label, name, herbal_name in rows:
+                key = _as_key(label, expr, key_col)
+                if not key or not herbal_name:
+                    continue
+                entry = staging.setdefault(key, {"diagnosis": set(), "symptom": set()})
+                entry[field].add(herbal_name)
+                names.setdefault(key, str(name).strip())
+
+        kb.labels = {
+            key: {"diagnosis": frozenset(v["diagnosis"]), "symptom": frozenset(v["symptom"])}
+            for key, v in staging.items()
+        }
+        kb.herbs  = cls._build_herb_catalog(db)
+        kb.safety = cls._build_safety_index(db, kb.herbs)
+        kb.synonyms = cls._load_synonyms(db)
+        kb.terms  = TermMatcher.build(names.values(), kb.synonyms)
+        kb.fuzzy  = FuzzyMatcher.build(names.values(), kb.synonyms)
+        return kb
+
+    @staticmethod
+    def _load_synonyms(db) -> list:
+        """(sinonim_awam, istilah_baku) dari kamus_medis; kosong jika tabel belum di-seed."""
+        if not inspect(db.get_bind()).has_table("kamus_medis"):
+            return []
+        rows = db.execute(text("SELECT sinonim_awam, istilah_baku FROM kamus_medis")).fetchall()
+        return [(str(s).strip(), str(b).strip()) for s, b in rows if s and b]
+
+    @staticmethod
+    def _build_herb_catalog(db) -> dict:
+        detail_rows = db.execute(text("""
+            SELECT herbal_name, latin_name, image_url, preparation, part_used, part_image_url, source_label, source
+            FROM herbal_diagnoses
+            UNION ALL
+            SELECT herbal_name, latin_name, image_url, preparation, part_used, part_image_url, source_label, source
+            FROM herbal_symptoms
+        """)).fetchall()
+
+        catalog = {}
+        for r in detail_rows:
+            herbal_name = r[0]
+            if not herbal_name:
+                continue
+            entry = catalog.get(herbal_name)
+            if entry is None:
+                main_name = herb_main_name(herbal_name)
+                catalog[herbal_name] = {
+                    "detail": {
+                        "name": r[0], "latin": r[1], "image": r[2], "preparation": r[3],
+                        "part": r[4], "part_image": r[5], "source_label": r[6], "source_link": r[7]
+                    },
+                    "main_name": main_name,
+                    "main_key":  normalize_text_key(main_name),
+                    "latin_key": normalize_text_key(r[1] or ""),
+                    "variants":  frozenset(herb_name_variants(herbal_name)),
+                }
+            elif not entry["latin_key"] and r[1]:
+                # Baris pertama tanpa nama latin; pakai nama latin dari baris lain
+                entry["latin_key"] = normalize_text_key(r[1])
+        return catalog
+
+    @staticmethod
+    def _build_safety_index(db, catalog: dict) -> dict:
+        """
+        Rule dicocokkan ke katalog lewat nama utama ATAU nama latin
+        (normalize_text_key), sama seperti filter RBS sebelumnya.
+        """
+        table = "herbal_special_conditions"
+        cond_expr  = _key_expr(db, table, "special_condition_key", "special_condition")
+        herb_expr  = _key_expr(db, table, "herbal_name_key", "herbal_name")
+        latin_expr = _key_expr(db, table, "latin_name_key", "latin_name")
+        rule_rows = db.execute(text(f"""
+            SELECT {herb_expr}, {latin_expr}, {cond_expr}, special_condition, description, reference
+            FROM {table}
+        """)).fetchall()
+
+        # cond_key → herb_key/latin_key → {conditions, descriptions, references}
+        by_herb_key, by_latin_key = {}, {}
+        for herb_k, latin_k, cond_k, cond, desc, ref in rule_rows:
+            cond_key = _as_key(cond_k, cond_expr, "special_condition_key")
+            if not cond_key:
+                continue
+            for lookup, key in [
+                (by_herb_key.setdefault(cond_key, {}),  _as_key(herb_k, herb_expr, "herbal_name_key")),
+                (by_latin_key.setdefault(cond_key, {}), _as_key(latin_k, latin_expr, "latin_name_key"))
+            ]:
+                if not key:
+                    continue
+                rule = lookup.setdefault(key, {"conditions": set(), "descriptions": [], "references": []})
+                rule["conditions"].add(cond)
+                if desc and desc.strip() not in rule["descriptions"]:
+                    rule["descriptions"].append(desc.strip())
+                if ref and ref.strip() not in rule["references"]:
+                    rule["references"].append(ref.strip())
+
+        safety = {}
+        for cond_key in by_herb_key.keys() | by_latin_key.keys():
+            herb_rules  = by_herb_key.get(cond_key, {})
+            latin_rules = by_latin_key.get(cond_key, {})
+            rules = {}
+            for herbal_name, entry in catalog.items():
+                matched = [m for m in (herb_rules.get(entry["main_key"]),
+                                       latin_rules.get(entry["latin_key"]) if entry["latin_key"] else None) if m]
+                if not matched:
+                    continue
+                merged = {"conditions": set(), "descriptions": [], "references": []}
+                for m in matched:
+                    merged["conditions"] |= m["conditions"]
+                    merged["descriptions"] += [d for d in m["descriptions"] if d not in merged["descriptions"]]
+                    merged["references"]   += [r for r in m["references"]   if r not in merged["references"]]
+                rules[herbal_name] = merged
+            safety[cond_key] = {"herbs": frozenset(rules), "rules": rules}
+        return safety
+
+    def classify_safety(self, herb_names, conditions):
+        """
+        Pisahkan kandidat herbal menjadi aman / tidak aman untuk kondisi aktif.
+
+        Returns:
+            safe_names : list herbal_name yang lolos (urutan input dipertahankan)
+            unsafe     : dict herbal_name → {conditions, descriptions, references}
+                         gabungan dari semua kondisi aktif yang melarangnya
+        """
+        active = [self.safety[k] for k in dict.fromkeys(normalize_text_key(c) for c in conditions) if k in self.safety]
+        if not active:
+            return list(herb_names), {}
+
+        candidates = set(herb_names)
+        flagged    = set()
+        for cond in active:
+            flagged |= cond["herbs"] & candidates
+
+        unsafe = {}
+        for herbal_name in flagged:
+            merged = {"conditions": set(), "descriptions": [], "references": []}
+            for cond in active:
+                rule = cond["rules"].get(herbal_name)
+                if not rule:
+                    continue
+                merged["conditions"] |= rule["conditions"]
+                merged["descriptions"] += [d for d in rule["descriptions"] if d not in merged["descriptions"]]
+                merged["references"]   += [r for r in rule["references"]   if r not in merged["references"]]
+            unsafe[herbal_name] = merged
+        safe_names = [h for h in herb_names if h not in flagged]
+        return safe_names, unsafe
+
+    def herb(self, herbal_name: str):
+        return self.herbs.get(herbal_name)
+
+    def main_name(self, herbal_name: str) -> str:
+        entry = self.herbs.get(herbal_name)
+        return entry["main_name"] if entry else herb_main_name(herbal_name)
+
+    def details_for(self, herb_names) -> list:
+        """Detail payload herbal (urut nama), tanpa query ke DB."""
+        return [self.herbs[n]["detail"] for n in sorted(herb_names) if n in self.herbs]
+
+    def herbs_for(self, label: str, group_type: str) -> set:
+        """Herbal untuk label pilihan user (/api/recommend). group_type: 'Diagnosis' | 'Gejala'."""
+        entry = self.labels.get(normalize_text_key(label))
+        if not entry:
+            return set()
+        return set(entry["diagnosis"] if group_type == "Diagnosis" else entry["symptom"])
+
+    def match_exact(self, chunk: str):
+        """
+        Lapis 1: chunk persis sama dengan diagnosis/gejala.
+        Diagnosis diprioritaskan. Returns (group_type, herbs) atau None.
+        """
+        entry = self.labels.get(normalize_text_key(chunk))
+        if not entry:
+            return None
+        if entry["diagnosis"]:
+            return "Diagnosis", set(entry["diagnosis"])
+        if entry["symptom"]:
+            return "Gejala", set(entry["symptom"])
+        return None
+
+    def match_terms(self, words: list):
+        """
+        Lapis 1 (lanjutan): semua istilah dikenal (label/sinonim kamus_medis)
+        di dalam chunk. Returns (list (TermMatch, group_type, herbs), residue);
+        residue = potongan kata yang tetap harus dikirim ke Lapis 2.
+        """
+        terms, residue = self.terms.scan(words)
+        found = []
+        for term in terms:
+            if term.source == "label":
+                group_type, herbs = self.match_exact(term.label) or ("Gejala", set())
+            else:
+                # Sinonim → istilah baku, diperlakukan sama dengan hasil Lapis 2
+                group_type, herbs = self.match_label(term.label)
+            found.append((term, group_type, herbs))
+        return found, residue
+
+    def match_fuzzy(self, chunk: str):
+        """
+        Tier fuzzy: chunk yang mirip (typo) dengan label/sinonim.
+        Returns (FuzzyMatch, group_type, herbs) atau None.
+        """
+        hit = self.fuzzy.match(chunk)
+        if hit is None:
+            return None
+        if hit.source == "label":
+            group_type, herbs = self.match_exact(hit.label) or ("Gejala", set())
+        else:
+            group_type, herbs = self.match_label(hit.label)
+        return hit, group_type, herbs
+
+    def match_label(self, label: str):
+        """
+        Lapis 2: label baku hasil SBERT → gabungan herbal diagnosis + gejala.
+        Returns (group_type, herbs); herbs kosong jika label tidak ada di dataset.
+        """
+        entry = self.labels.get(normalize_text_key(label))
+        if not entry:
+            return "Gejala", set()
+        group_type = "Diagnosis" if entry["diagnosis"] else "Gejala"
+        return group_type, set(entry["diagnosis"] | entry["symptom"])
+
+    def stats(self) -> dict:
+        return {
+            "version":   self.version,
+            "labels":    len(self.labels),
+            "diagnoses": sum(1 for v in self.labels.values() if v["diagnosis"]),
+            "symptoms":  sum(1 for v in self.labels.values() if v["symptom"]),
+            "herbs":     len(self.herbs),
+            "conditions": len(self.safety),
+            "synonyms":  len(self.synonyms),
+            "terms":     self.terms.patterns,
+            "fuzzy_terms": self.fuzzy.size,
+        }
+
+
+class KnowledgeSnapshot:
+    """
+    Satu versi pengetahuan yang konsisten: index tabel (KnowledgeBase), index
+    label Lapis 2, dan mode. Request mengambil satu snapshot di awal dan
+    memakainya sampai selesai, meskipun snapshot baru ditukar di tengah jalan.
+    """
+
+    def __init__(self, manifest: dict, kb: KnowledgeBase, label_index=None):
+        self.manifest    = manifest
+        self.version     = manifest["version"]
+        self.mode        = manifest["mode"]
+        self.kb          = kb
+        # None → InferenceService memakai index label yang dimuatnya sendiri
+        self.label_index = label_index
+        self.built_at    = time.time()
+
+    def with_mode(self, mode: str) -> "KnowledgeSnapshot":
+        snap = KnowledgeSnapshot({**self.manifest, "mode": mode}, self.kb, self.label_index)
+        snap.built_at = self.built_at
+        return snap
+
+    def stats(self) -> dict:
+        return {
+            **self.kb.stats(),
+            "version":     self.version,
+            "mode":        self.mode,
+            "label_index": getattr(self.label_index, "version", None),
+            "built_at":    round(self.built_at, 3),
+        }
+
+
+class KnowledgeSnapshotManager:
+    """
+    Menyimpan snapshot aktif. Thread watcher memantau manifest
+    (config/dataset_version.json) + config/active_mode.json. Versi baru →
+    snapshot baru dibangun di latar lalu ditukar atomik (satu assignment
+    referensi). Hanya active_mode.json yang berubah → mode snapshot aktif
+    diganti tanpa rebuild, selama isi med_labels-nya cocok (read_manifest). Request yang sedang berjalan tetap memegang snapshot lama
+    hingga selesai; index lama dilepas GC setelah referensi terakhir hilang.
+    """
+
+    def __init__(self, version_path: str = DATASET_VERSION_PATH, mode_path: str = ACTIVE_MODE_PATH,
+                 poll_interval: float = KNOWLEDGE_POLL_INTERVAL):
+        self.version_path  = version_path
+        self.mode_path     = mode_path
+        self.poll_interval = poll_interval
+
+        self._lock            = threading.Lock()   # hanya satu build dalam satu waktu
+        self._current         = None
+        self._mtimes          = None
+        self._session_factory = None
+        self._warmup          = None
+        self._on_swap         = []
+        self._stop            = threading.Event()
+        self._thread          = None
+
+        self.swaps      = 0
+        self.failures   = 0
+        self.last_error = None
+        self.previous   = None
+
+    def _config_mtimes(self):
+        mtimes = []
+        for path in (self.version_path, self.mode_path):
+            try:
+                mtimes.append(os.path.getmtime(path))
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _build(self, db, manifest: dict) -> KnowledgeSnapshot:
+        t0 = time.time()
+        kb = KnowledgeBase.build(db, manifest["version"])
+        label_index = None
+        try:
+            label_index = open_label_index(chroma_path=manifest["chroma_path"], index_path=manifest["label_index_path"])
+            if self._warmup is not None:
+                self._warmup(label_index)
+        except Exception as e:
+            if manifest["versioned"]:
+                raise
+            # Layout lama (index di tempat): InferenceService tetap memakai index miliknya
+            log.warning("Index label snapshot %s tidak bisa dibuka: %s", manifest["version"], e)
+        snap = KnowledgeSnapshot(manifest, kb, label_index)
+        log.info("Snapshot %s dibangun (mode %s): %d label, %d herbal, index label %s (%.0f ms)",
+                 snap.version, snap.mode, len(kb.labels), len(kb.herbs),
+                 getattr(label_index, "version", "-"), (time.time() - t0) * 1000)
+        return snap
+
+    def _swap(self, snap: KnowledgeSnapshot, mtimes):
+        old = self._current
+        self._current, self._mtimes = snap, mtimes
+        if old is not None:
+            self.previous = old.version
+            self.swaps += 1
+            log.info("Snapshot aktif: %s → %s (mode %s → %s)", old.version, snap.version, old.mode, snap.mode)
+        for callback in self._on_swap:
+            try:
+                callback(snap)
+            except Exception as e:
+                log.warning("Callback swap snapshot gagal: %s", e)
+
+    def refresh(self, db=None) -> bool:
+        """
+        Bangun snapshot baru jika manifest/mode berubah. Snapshot yang gagal
+        dibangun (atau kosong padahal snapshot lama berisi) tidak pernah
+        ditukar masuk; snapshot lama tetap dilayani.
+        """
+        with self._lock:
+            mtimes = self._config_mtimes()
+            if self._current is not None and mtimes == self._mtimes:
+                return False
+            manifest = read_manifest(self.version_path, self.mode_path)
+            current = self._current
+            if current is not None and current.version == manifest["version"]:
+                # Versi data sama; hanya mode yang (mungkin) berganti → tanpa rebuild
+                if current.mode != manifest["mode"]:
+                    self._swap(current.with_mode(manifest["mode"]), mtimes)
+                else:
+                    self._mtimes = mtimes
+                return True
+
+            own_session = db is None
+            if own_session:
+                db = self._session_factory()
+            try:
+                snap = self._build(db, manifest)
+                if current is not None and current.kb.labels and not snap.kb.labels:
+                    raise ValueError("snapshot baru tidak berisi label")
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f"{manifest['version']}: {e}"
+                # Tandai sudah dilihat agar tidak dibangun ulang terus-menerus; perubahan berikutnya dicoba lagi
+                self._mtimes = mtimes
+                log.error("Snapshot %s ditolak, tetap melayani %s: %s", manifest["version"],
+                          current.version if current else "-", e)
+                if current is None:
+                    raise
+                return False
+            finally:
+                if own_session:
+                    db.close()
+            self.last_error = None
+            self._swap(snap, mtimes)
+            return True
+
+    @property
+    def current(self):
+        """Snapshot aktif tanpa pengecekan perubahan (None jika belum pernah dibangun)."""
+        return self._current
+
+    def get(self, db) -> KnowledgeSnapshot:
+        """Snapshot aktif. Tanpa watcher (script, test), perubahan dicek di sini secara sinkron."""
+        current = self._current
+        if current is not None and (self._thread is not None or self._config_mtimes() == self._mtimes):
+            return current
+        self.refresh(db)
+        return self._current
+
+    def set_mode(self, mode: str):
+        """Ganti mode snapshot aktif tanpa rebuild (dipakai scripts/load_test.py)."""
+        with self._lock:
+            if self._current is not None:
+                self._swap(self._current.with_mode(mode), self._mtimes)
+
+    def on_swap(self, callback):
+        self._on_swap.append(callback)
+
+    def start(self, session_factory, warmup=None):
+        """Bangun snapshot awal lalu jalankan watcher. warmup(label_index) dipanggil sebelum swap."""
+        self._session_factory = session_factory
+        self._warmup = warmup
+        try:
+            self.refresh()
+        except Exception as e:
+            log.warning("Gagal membangun snapshot saat startup: %s", e)
+        if self.poll_interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="herbalyze-knowledge-watcher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                log.warning("Watcher snapshot: %s", e)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self) -> dict:
+        current = self._current
+        status = current.stats() if current is not None else {"version": None}
+        status.update({
+            "previous":   self.previous,
+            "swaps":      self.swaps,
+            "failures":   self.failures,
+            "last_error": self.last_error,
+            "watching":   self._thread is not None,
+        })
+        return status
+
+
+knowledge_snapshots = KnowledgeSnapshotManager()
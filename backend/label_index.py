@@ -0,0 +1,151 @@
+"""
+label_index.py
+Backend pencarian label baku (med_labels) untuk Lapis 2:
+- ChromaLabelIndex : koleksi ChromaDB `med_labels` (default, HNSW + SQLite)
+- NumpyLabelIndex  : matriks embedding ternormalisasi (.npy) hasil export
+                     scripts/update_dataset.py, di-memory-map read-only sehingga
+                     halaman memorinya dipakai bersama oleh semua worker.
+                     Top-k = satu perkalian matriks untuk seluruh batch query.
+
+Keduanya punya antarmuka sama: query(embeddings, k) → per query list
+{"baku", "similarity"} (similarity dalam persen, cosine), urut menurun.
+"""
+
+import json
+import os
+
+import numpy as np
+
+# ── Konfigurasi dari .env ──
+LABEL_INDEX_BACKEND = os.getenv("LABEL_INDEX_BACKEND", "chroma")   # chroma | numpy
+LABEL_INDEX_PATH    = os.getenv("LABEL_INDEX_PATH", "./label_index")
+CHROMA_PATH         = os.getenv("CHROMA_PATH", "./chroma_db")
+LABEL_COLLECTION_NAME = os.getenv("LABEL_COLLECTION_NAME", "med_labels")
+
+MATRIX_FILENAME = "med_labels.npy"
+META_FILENAME   = "med_labels.meta.json"
+
+# Blok baris saat matriks float16 dikonversi ke float32 untuk perkalian (BLAS)
+_FLOAT16_BLOCK_ROWS = 4096
+
+
+class ChromaLabelIndex:
+    backend = "chroma"
+
+    def __init__(self, chroma_path: str, collection_name: str = "med_labels"):
+        import chromadb
+
+        self.path            = chroma_path
+        self.collection_name = collection_name
+        self._collection     = chromadb.PersistentClient(path=chroma_path).get_collection(name=collection_name)
+
+        sqlite_path = os.path.join(chroma_path, "chroma.sqlite3")
+        mtime = int(os.path.getmtime(sqlite_path)) if os.path.exists(sqlite_path) else 0
+        self.version = f"{collection_name}:{self._collection.count()}:{mtime}"
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def query(self, embeddings, k: int = 1) -> list:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        sr = self._collection.query(query_embeddings=embeddings.tolist(), n_results=k)
+        results = []
+        for distances, metadatas in zip(sr['distances'], sr['metadatas']):
+            results.append([
+                {"baku": meta['baku'].strip(), "similarity": (1 - dist) * 100}
+                for dist, meta in zip(distances, metadatas)
+            ])
+        return results
+
+
+class NumpyLabelIndex:
+    backend = "numpy"
+
+    def __init__(self, index_path: str = LABEL_INDEX_PATH):
+        with open(os.path.join(index_path, META_FILENAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.path    = index_path
+        self.meta    = meta
+        # mmap read-only: tidak ada salinan privat per worker (copy-on-write tidak pernah terpicu)
+        self.matrix  = np.load(os.path.join(index_path, MATRIX_FILENAME), mmap_mode="r")
+        self.baku    = [str(b).strip() for b in meta["baku"]]
+        self.version = f"npy:{meta.get('version', '')}:{self.matrix.shape[0]}"
+
+        if self.matrix.shape[0] != len(self.baku):
+            raise ValueError(f"Matriks ({self.matrix.shape[0]} baris) tidak sesuai metadata ({len(self.baku)} label)")
+
+    def count(self) -> int:
+        return int(self.matrix.shape[0])
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        if self.matrix.dtype == np.float32:
+            return queries @ self.matrix.T
+        # float16 tidak punya jalur BLAS; konversi per blok agar memori tetap kecil
+        scores = np.empty((queries.shape[0], self.matrix.shape[0]), dtype=np.float32)
+        for start in range(0, self.matrix.shape[0], _FLOAT16_BLOCK_ROWS):
+            block = np.asarray(self.matrix[start:start + _FLOAT16_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + block.shape[0]] = queries @ block.T
+        return scores
+
+    def query(self, embeddings, k: int = 1) -> list:
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        scores = self._scores(queries)
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in range(queries.shape[0])]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        results = []
+        for row, idxs in enumerate(top):
+            idxs = idxs[np.argsort(-scores[row, idxs])]
+            results.append([
+                {"baku": self.baku[i], "similarity": float(scores[row, i]) * 100}
+                for i in idxs
+            ])
+        return results
+
+
+def export_label_matrix(embeddings, documents: list, baku: list, index_path: str = LABEL_INDEX_PATH,
+                        dtype: str = "float32", extra_meta: dict = None) -> str:
+    """
+    Simpan embedding label sebagai matriks .npy ternormalisasi (L2) + sidecar
+    metadata. Ditulis ke file sementara lalu os.replace agar pembaca tidak
+    pernah melihat file setengah jadi.
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms  = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = (matrix / np.where(norms == 0, 1, norms)).astype(dtype)
+
+    os.makedirs(index_path, exist_ok=True)
+    matrix_path = os.path.join(index_path, MATRIX_FILENAME)
+    meta_path   = os.path.join(index_path, META_FILENAME)
+
+    with open(f"{matrix_path}.tmp", "wb") as f:
+        np.save(f, matrix)
+    meta = {
+        "count":     int(matrix.shape[0]),
+        "dim":       int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "dtype":     dtype,
+        "documents": list(documents),
+        "baku":      list(baku),
+        **(extra_meta or {}),
+    }
+    with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    os.replace(f"{matrix_path}.tmp", matrix_path)
+    os.replace(f"{meta_path}.tmp", meta_path)
+    return matrix_path
+
+
+def open_label_index(backend: str = LABEL_INDEX_BACKEND, chroma_path: str = CHROMA_PATH,
+                     collection_name: str = LABEL_COLLECTION_NAME, index_path: str = LABEL_INDEX_PATH):
+    if backend == "numpy":
+        return NumpyLabelIndex(index_path)
+    if backend == "chroma":
+        return ChromaLabelIndex(chroma_path, collection_name)
+    raise ValueError(f"LABEL_INDEX_BACKEND tidak dikenal: {backend}")
@@ -0,0 +1,168 @@
+"""
+logging_service.py
+Logging terstruktur untuk backend:
+- logger per subsistem di bawah "herbalyze" (engine, rbs, inference,
+  knowledge, history, cache, ipfs, blockchain, http, ...)
+- request id per request (contextvar, diisi middleware di main.py dari
+  header X-Request-ID atau dibuat baru) otomatis ikut di setiap baris log
+- satu baris ringkasan per request: middleware menulis method, path, status,
+  durasi + field yang ditambahkan endpoint lewat annotate_request()
+- trace engine yang verbose hanya dikeluarkan untuk sebagian request
+  (LOG_TRACE_SAMPLE_RATE) atau jika LOG_LEVEL=DEBUG
+- penulisan non-blocking: thread request hanya memasukkan LogRecord ke
+  antrean (QueueHandler); format + tulis ke stdout dikerjakan QueueListener
+  di thread terpisah
+
+LOG_FORMAT=text (default, satu baris ringkas) atau json (satu objek per baris).
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+
+# ── Konfigurasi dari .env ──
+LOG_LEVEL             = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT            = os.getenv("LOG_FORMAT", "text")               # text | json
+LOG_TRACE_SAMPLE_RATE = float(os.getenv("LOG_TRACE_SAMPLE_RATE", "0.0"))
+
+ROOT_LOGGER = "herbalyze"
+
+_level = logging.getLevelName(LOG_LEVEL) if isinstance(logging.getLevelName(LOG_LEVEL), int) else logging.INFO
+
+_request_id = contextvars.ContextVar("request_id", default="-")
+_traced     = contextvars.ContextVar("traced", default=_level <= logging.DEBUG)
+_fields     = contextvars.ContextVar("request_fields", default=None)
+
+_listener = None
+
+
+class _ContextFilter(logging.Filter):
+    """
+    Dijalankan di thread pemanggil (sebelum masuk antrean): tempelkan request id,
+    dan loloskan DEBUG hanya untuk trace request yang tersampel.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        if record.levelno >= _level:
+            return True
+        return getattr(record, "sampled", False)
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts":         self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level":      record.levelname,
+            "logger":     record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg":        record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler bawaan memformat pesan di thread pemanggil. Di sini record
+    dikirim apa adanya (antrean in-process) sehingga formatting juga pindah
+    ke thread listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging():
+    """Pasang QueueHandler + QueueListener pada logger "herbalyze". Aman dipanggil berulang."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream.setFormatter(_JsonFormatter())
+    else:
+        stream.setFormatter(_TextFormatter("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s",
+                                           "%H:%M:%S"))
+
+    log_queue = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(log_queue)
+    handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger(ROOT_LOGGER)
+    # DEBUG di level logger agar trace tersampel sampai ke filter; filter yang menegakkan LOG_LEVEL
+    root.setLevel(logging.DEBUG)
+    root.handlers[:] = [handler]
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=False)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Kosongkan antrean log lalu hentikan thread listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER}.{subsystem}")
+
+
+def begin_request(request_id: str = None) -> str:
+    """Set request id + keputusan sampling trace untuk konteks request saat ini."""
+    request_id = request_id or uuid.uuid4().hex[:12]
+    _request_id.set(request_id)
+    _fields.set({})
+    _traced.set(_level <= logging.DEBUG or (LOG_TRACE_SAMPLE_RATE > 0 and random.random() < LOG_TRACE_SAMPLE_RATE))
+    return request_id
+
+
+def current_request_id() -> str:
+    return _request_id.get()
+
+
+def annotate_request(**fields):
+    """Tambahkan field ke baris ringkasan request (ditulis middleware saat response selesai)."""
+    current = _fields.get()
+    if current is not None:
+        current.update(fields)
+
+
+def request_fields() -> dict:
+    return _fields.get() or {}
+
+
+def tracing() -> bool:
+    """True jika request ini tersampel untuk trace engine. Pakai untuk melewati pekerjaan trace yang mahal."""
+    return _traced.get()
+
+
+def trace(logger: logging.Logger, msg: str, *args):
+    """Log DEBUG yang hanya dikeluarkan untuk request tersampel; nyaris tanpa biaya jika tidak."""
+    if _traced.get():
+        logger.debug(msg, *args, extra={"sampled": True})
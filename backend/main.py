@@ -9,24 +9,37 @@ from eth_account import Account
 from eth_account.messages import encode_defunct
 import secrets
 from typing import Optional
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import os
-import traceback
 import re
 import time
 
-from db import get_db, Base, engine
+from db import get_db, Base, engine, SessionLocal
 from models import User, HerbalDiagnosis, HerbalSymptom, HerbalSpecialCondition, SearchHistory, MedicalRecordDraft
 from fastapi.encoders import jsonable_encoder
 from blockchain_service import approve_wallet_on_chain, add_medical_record_on_chain
+from inference_service import inference_service
+from history_writer import history_writer
+from logging_service import (setup_logging, get_logger, begin_request, annotate_request,
+                             request_fields, trace)
+from metrics_service import (observe_stage, record_sbert_match, record_tier_hits, tier_hits, timed_call,
+                             render_metrics, REQUEST_SECONDS)
+from executors import run_io, run_inference, executors_status, shutdown_executors
+from knowledge_base import knowledge_snapshots
+from rbs_filter import apply_filters_batch
 from datetime import datetime
 from dotenv import load_dotenv
 import requests
 import json as _json_lib
 
 load_dotenv()
+setup_logging()
+log        = get_logger("app")
+engine_log = get_logger("engine")
+rbs_log    = get_logger("rbs")
+
 PINATA_JWT = os.getenv("PINATA_JWT")
-print("PINATA_JWT loaded:", PINATA_JWT[:20])
+log.info("PINATA_JWT %s", "dimuat" if PINATA_JWT else "TIDAK ditemukan")
 
 _CONFIG_DIR = os.path.join(os.path.dirname(__file__), "config")
 
@@ -35,6 +48,7 @@ _CONFIG_DIR = os.path.join(os.path.dirname(__file__), "config")
 # PINATA / IPFS
 # ==============================================================================
 
+@timed_call("ipfs", "pin_file")
 def upload_to_ipfs(file):
     allowed_types = ["application/pdf", "image/jpeg", "image/png", "application/octet-stream"]
     if file.content_type not in allowed_types:
@@ -46,7 +60,7 @@ def upload_to_ipfs(file):
     files = {"file": (file.filename, file_bytes, file.content_type)}
     response = requests.post(url, files=files, headers=headers, timeout=30)
     if response.status_code != 200:
-        print("Pinata error:", response.text)
+        get_logger("ipfs").error("Pinata error: %s", response.text)
         raise Exception("Upload ke IPFS gagal")
     return response.json()["IpfsHash"]
 
@@ -60,50 +74,17 @@ def _load_json_config(filename: str, key: str) -> list:
         with open(path, "r", encoding="utf-8") as f:
             return _json_lib.load(f).get(key, [])
     except Exception as e:
-        print(f"⚠️ Gagal load config '{filename}': {e}")
+        log.warning("Gagal load config '%s': %s", filename, e)
         return []
 
 NLP_STOPWORDS       = set(_load_json_config("stopwords.json",       "stopwords"))
+log.debug("%d stopwords dimuat", len(NLP_STOPWORDS))
 
-print(NLP_STOPWORDS)  
-
-def _get_active_mode() -> str:
-    try:
-        path = os.path.join(_CONFIG_DIR, "active_mode.json")
-        print(f"[DEBUG] Mencoba membaca mode dari: {path}")
-        
-        if not os.path.exists(path):
-            print(f"[WARN] File active_mode.json tidak ditemukan di {path}. Gunakan default hybrid_rag")
-            return "hybrid_rag"
-            
-        with open(path, "r", encoding="utf-8") as f:
-            data = _json_lib.load(f)
-            mode = data.get("mode", "hybrid_rag")
-            print(f"[DEBUG] Berhasil membaca mode: {mode.upper()}")
-            return mode
-            
-    except Exception as e:
-        print(f"[WARN] Gagal membaca active_mode.json: {e}. Gunakan default hybrid_rag")
-        return "hybrid_rag"
-
-ACTIVE_MODE = _get_active_mode()
-print(f"✅ Mode aktif: {ACTIVE_MODE.upper()}")
 
 # ==============================================================================
 # GLOBAL UTILITY FUNCTIONS
 # ==============================================================================
 
-def normalize_text_key(value: str) -> str:
-    """
-    Normalisasi string untuk matching robust antar tabel:
-    - lowercase, samakan apostrof melengkung, buang karakter non-alfanumerik
-    """
-    if value is None:
-        return ""
-    v = str(value).strip().lower().replace("\u2019", "'")
-    return re.sub(r"[^a-z0-9]+", "", v)
-
-
 def get_user_allergies(wallet_address: str, db: Session) -> set:
     if not wallet_address or wallet_address == "guest_user":
         return set()
@@ -125,33 +106,10 @@ def get_user_allergies(wallet_address: str, db: Session) -> set:
                         result.add(clean)
         return result
     except Exception as e:
-        print(f"⚠️ Gagal ambil alergi user: {e}")
+        log.warning("Gagal ambil alergi user: %s", e)
         return set()
 
 
-def filter_allergies(herbs: list, allergies: set) -> list:
-    if not herbs:
-        return []
-    if not allergies:
-        return herbs
-    clean_allergies = {str(a).split("(")[0].strip().lower() for a in allergies}
-    filtered = []
-    for herb in herbs:
-        raw_name = herb.get("name", "")
-        name_variants = [
-            line.split("(")[0].strip().lower()
-            for line in raw_name.replace("\r", "").split("\n")
-            if line.strip()
-        ]
-        is_allergic = any(variant in clean_allergies for variant in name_variants)
-        if is_allergic:
-            matched = [v for v in name_variants if v in clean_allergies]
-            print(f"   🚫 [ALERGI] '{raw_name.splitlines()[0]}' DIELIMINASI → cocok dengan '{matched[0]}'")
-        else:
-            filtered.append(herb)
-    return filtered
-
-
 def is_child_under_five(wallet_address: str, db: Session) -> bool:
     if not wallet_address or wallet_address == "guest_user":
         return False
@@ -162,213 +120,26 @@ def is_child_under_five(wallet_address: str, db: Session) -> bool:
         tgl = datetime.strptime(user.tanggal_lahir, "%Y-%m-%d").date() if isinstance(user.tanggal_lahir, str) else user.tanggal_lahir
         return (datetime.utcnow().date() - tgl).days / 365.25 < 5
     except Exception as e:
-        print(f"⚠️ Gagal cek usia user: {e}")
+        log.warning("Gagal cek usia user: %s", e)
         return False
 
 
-def generate_random_nonce():
-    return f"Herbalyze Authentication\n\nPlease sign this message to authenticate with your wallet.\n\nSecret Nonce: {secrets.token_hex(16)}"
-
-
-# ==============================================================================
-# GLOBAL RBS FILTER FUNCTIONS
-# Digunakan oleh KEDUA endpoint: /api/recommend DAN /api/recommend_hybrid
-# Output unsafe_herbs selalu memiliki field: name, full_name, reason, description, reference
-# ==============================================================================
-
-def get_safe_herbs_global(herb_names, conditions, db: Session):
-    """
-    RBS Filter kondisi khusus dengan normalize_text_key (robust terhadap
-    perbedaan apostrof, spasi, kapitalisasi, dan nama latin).
-
-    Returns:
-        safe_list        : list nama herbal yang lolos filter
-        unsafe_herbs_list: list dict {name, full_name, reason, description, reference}
-    """
-    if not herb_names:
-        return [], []
-    if not conditions:
-        return list(herb_names), []
-
-    # 1. Mapping nama asli (multiline) → nama utama (baris pertama)
-    name_to_main = {}
-    for h in herb_names:
-        name_to_main[h] = str(h).strip().split("\n")[0].strip()
-
-    # 2. Ambil latin_name dari DB untuk setiap kandidat herbal
-    herb_main_to_latin_key = {}
-    latin_rows = db.execute(text("""
-        SELECT herbal_name, latin_name FROM herbal_diagnoses WHERE herbal_name = ANY(:names)
-        UNION
-        SELECT herbal_name, latin_name FROM herbal_symptoms  WHERE herbal_name = ANY(:names)
-    """), {"names": list(herb_names)}).fetchall()
-    for herb_n, latin_n in latin_rows:
-        main = str(herb_n).strip().split("\n")[0].strip()
-        herb_main_to_latin_key[normalize_text_key(main)] = normalize_text_key(latin_n or "")
-
-    # 3. Ambil semua rule unsafe dari herbal_special_conditions untuk kondisi aktif
-    unsafe_rows = db.execute(text("""
-        SELECT herbal_name, latin_name, special_condition, description, reference
-        FROM herbal_special_conditions
-        WHERE LOWER(TRIM(special_condition)) = ANY(:conds_lower)
-    """), {"conds_lower": [c.strip().lower() for c in list(conditions)]}).fetchall()
-
-    # 4. Bangun lookup: herb_key / latin_key → {conditions, descriptions, references}
-    unsafe_by_herb_key  = {}
-    unsafe_by_latin_key = {}
-    for herb_n, latin_n, cond, desc, ref in unsafe_rows:
-        for lookup, key in [
-            (unsafe_by_herb_key,  normalize_text_key(herb_n)),
-            (unsafe_by_latin_key, normalize_text_key(latin_n or ""))
-        ]:
-            if not key:
-                continue
-            if key not in lookup:
-                lookup[key] = {"conditions": set(), "descriptions": [], "references": []}
-            lookup[key]["conditions"].add(cond)
-            if desc and desc.strip() not in lookup[key]["descriptions"]:
-                lookup[key]["descriptions"].append(desc.strip())
-            if ref and ref.strip() not in lookup[key]["references"]:
-                lookup[key]["references"].append(ref.strip())
-
-    # 5. Klasifikasi tiap herbal
-    safe_herbs        = []
-    unsafe_herbs_list = []
-
-    for full_name in herb_names:
-        main      = name_to_main[full_name]
-        main_key  = normalize_text_key(main)
-        latin_key = herb_main_to_latin_key.get(main_key, "")
-
-        matched_herb  = unsafe_by_herb_key.get(main_key)
-        matched_latin = unsafe_by_latin_key.get(latin_key) if latin_key else None
-        match = matched_herb or matched_latin
-
-        if match:
-            # Gabungkan data dari kedua sumber
-            conditions_set = set()
-            descriptions   = []
-            references     = []
-            for m in [matched_herb, matched_latin]:
-                if not m:
-                    continue
-                conditions_set |= m["conditions"]
-                for d in m["descriptions"]:
-                    if d not in descriptions: descriptions.append(d)
-                for r in m["references"]:
-                    if r not in references: references.append(r)
-
-            alasan     = ", ".join(sorted(conditions_set))
-            desc_final = " ".join(descriptions) if descriptions else "Analisis medis menunjukkan adanya risiko efek samping."
-            ref_final  = ", ".join(references)  if references  else "Pedoman Keamanan Herbal"
-
-            print(f"      🛑 {main} → DIELIMINASI (berbahaya bagi: {alasan})")
-            unsafe_herbs_list.append({
-                "name":        main,
-                "full_name":   full_name.strip(),
-                "reason":      f"Berbahaya bagi: {alasan}",
-                "description": desc_final,
-                "reference":   ref_final
-            })
-        else:
-            safe_herbs.append(full_name)
-
-    return safe_herbs, unsafe_herbs_list
-
-
-def get_details_global(herb_names, db: Session):
-    """Ambil detail lengkap herbal dari DB (diagnoses + symptoms)."""
-    if not herb_names:
-        return []
-    result = db.execute(text("""
-        SELECT herbal_name, latin_name, image_url, preparation, part_used, part_image_url, source_label, source
-        FROM herbal_diagnoses WHERE herbal_name = ANY(:names)
-        UNION
-        SELECT herbal_name, latin_name, image_url, preparation, part_used, part_image_url, source_label, source
-        FROM herbal_symptoms WHERE herbal_name = ANY(:names)
-    """), {"names": list(herb_names)}).fetchall()
-    res, seen = [], set()
-    for r in result:
-        if r[0] not in seen:
-            res.append({
-                "name": r[0], "latin": r[1], "image": r[2], "preparation": r[3],
-                "part": r[4], "part_image": r[5], "source_label": r[6], "source_link": r[7]
-            })
-            seen.add(r[0])
-    return res
-
-
-def apply_all_filters_global(herb_names_set, label, conditions, allergies, db: Session):
+def load_patient_context(wallet_address: str, sel_cond: list, db: Session):
     """
-    Global wrapper: RBS kondisi + RBS alergi dengan log detail lengkap.
-
-    Returns:
-        details_final : list detail herbal yang aman
-        all_unsafe    : list dict unsafe_herbs (kondisi + alergi)
+    Semua akses DB sebelum analisis (usia, alergi, snapshot knowledge) dalam satu
+    fungsi sinkron agar endpoint async cukup sekali menyerahkannya ke io executor.
+    Snapshot diambil sekali per request: mode, index tabel dan index label tetap
+    konsisten walaupun snapshot baru ditukar masuk saat request berjalan.
     """
-    count_raw = len(herb_names_set)
-    print(f"\n   📋 [FILTER '{label}'] Total herbal ditemukan: {count_raw}")
-    print(f"   {'─'*50}")
-
-    # ── Filter 1: Kondisi Khusus ──
-    if conditions:
-        print(f"   🔎 Filter Kondisi Khusus ({', '.join(conditions)}):")
-    safe_names, unsafe_rbs = get_safe_herbs_global(herb_names_set, conditions, db)
-    count_rbs = count_raw - len(safe_names)
-    if count_rbs == 0:
-        print(f"      ✅ Tidak ada yang dieliminasi kondisi khusus")
-
-    # ── Filter 2: Alergi Personal ──
-    details_before = get_details_global(safe_names, db)
-    names_before   = {h['name'].splitlines()[0] for h in details_before}
-    if allergies:
-        print(f"   🔎 Filter Alergi ({', '.join(allergies)}):")
-    details_final  = filter_allergies(details_before, allergies)
-    names_after    = {h['name'].splitlines()[0] for h in details_final}
-    elim_allergy   = names_before - names_after
-
-    # Bangun unsafe_allergy dengan field lengkap
-    unsafe_allergy = []
-    for h in details_before:
-        h_main = h['name'].splitlines()[0]
-        if h_main in elim_allergy:
-            unsafe_allergy.append({
-                "name":        h_main,
-                "full_name":   h['name'],
-                "reason":      "Terdeteksi riwayat alergi pada profil Anda",
-                "description": "Tanaman ini masuk dalam daftar alergi Anda. Mengonsumsinya dapat memicu reaksi alergi.",
-                "reference":   "Profil kesehatan pengguna"
-            })
-
-    if not elim_allergy and allergies:
-        print(f"      ✅ Tidak ada yang dieliminasi karena alergi")
+    sel_cond = list(sel_cond)
+    if is_child_under_five(wallet_address, db) and "anak di bawah 5 tahun" not in sel_cond:
+        sel_cond.append("anak di bawah 5 tahun")
+        trace(rbs_log, "user %s berusia <5 tahun, kondisi ditambahkan otomatis", wallet_address)
+    return sel_cond, get_user_allergies(wallet_address, db), knowledge_snapshots.get(db)
 
-    all_unsafe = unsafe_rbs + unsafe_allergy
-
-    # ── Log Ringkasan ──
-    print(f"   {'─'*50}")
-    print(f"   📊 [RINGKASAN '{label}']")
-    print(f"      Total awal            : {count_raw} herbal")
-    print(f"         → {', '.join(sorted(str(h).splitlines()[0] for h in herb_names_set))}")
-
-    if count_rbs > 0:
-        print(f"      🛑 Eliminasi kondisi  : {count_rbs} herbal")
-        print(f"         → {', '.join(u['name'] for u in unsafe_rbs)}")
-    else:
-        print(f"      🛑 Eliminasi kondisi  : 0 herbal")
-
-    if elim_allergy:
-        print(f"      🚫 Eliminasi alergi   : {len(elim_allergy)} herbal")
-        print(f"         → {', '.join(sorted(elim_allergy))}")
-    else:
-        print(f"      🚫 Eliminasi alergi   : 0 herbal")
 
-    lolos = sorted([h['name'].splitlines()[0] for h in details_final])
-    print(f"      ✅ Lolos & ditampilkan: {len(details_final)} herbal")
-    if lolos:
-        print(f"         → {', '.join(lolos)}")
-
-    return details_final, all_unsafe
+def generate_random_nonce():
+    return f"Herbalyze Authentication\n\nPlease sign this message to authenticate with your wallet.\n\nSecret Nonce: {secrets.token_hex(16)}"
 
 
 # ==============================================================================
@@ -379,11 +150,54 @@ Base.metadata.create_all(bind=engine)
 app = FastAPI()
 
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    # Request id dari header (jika dikirim frontend/proxy) atau dibuat baru; ikut di semua log request ini
+    request_id = begin_request(request.headers.get("X-Request-ID"))
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - t0
+        route = request.scope.get("route")
+        # Template route (/api/history/{wallet_address}) agar label tidak meledak per wallet
+        REQUEST_SECONDS.observe(elapsed, method=request.method,
+                                route=route.path if route is not None else "unmatched", status=str(status))
+        if request.url.path.startswith("/api/"):
+            get_logger("http").info("%s %s %d %.1fms", request.method, request.url.path, status,
+                                    elapsed * 1000, extra={"fields": request_fields()})
+
+
 @app.exception_handler(HTTPException)
 async def custom_http_exception_handler(request, exc: HTTPException):
     return JSONResponse(status_code=exc.status_code, content={"error": exc.detail})
 
 
+@app.on_event("startup")
+def load_inference_models():
+    # Snapshot knowledge awal (index tabel + index label + mode), lalu watcher versi dataset
+    knowledge_snapshots.start(SessionLocal, warmup=inference_service.warm_label_index)
+    snapshot = knowledge_snapshots.current
+    if snapshot is not None:
+        log.info("Mode aktif: %s (dataset %s)", snapshot.mode.upper(), snapshot.version)
+    # Model embedding dimuat sekali per worker, bukan per request
+    inference_service.load(label_index=snapshot.label_index if snapshot is not None else None)
+    knowledge_snapshots.on_swap(inference_service.use_snapshot)
+    history_writer.start(engine)
+
+
+@app.on_event("shutdown")
+def save_inference_cache():
+    knowledge_snapshots.stop()
+    inference_service.close()
+    history_writer.stop()
+    shutdown_executors()
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://127.0.0.1:5173", "http://localhost:3000", "http://127.0.0.1:3000"],
@@ -460,6 +274,26 @@ def home():
     return {"message": "Welcome to Herbalyze FastAPI System RMP"}
 
 
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/health")
+def health():
+    knowledge = knowledge_snapshots.status()
+    status = {
+        "status":    "ready" if inference_service.ready else "not_ready",
+        "mode":      knowledge.get("mode"),
+        "inference": inference_service.status(),
+        "knowledge": knowledge,
+        "executors": executors_status(),
+        "history":   history_writer.status(),
+        "tiers":     tier_hits(),
+    }
+    return JSONResponse(status_code=200 if inference_service.ready else 503, content=status)
+
+
 @app.post("/api/setup-admin")
 def setup_admin(req: SetupAdminRequest, db: Session = Depends(get_db)):
     existing_admin = db.query(User).filter(User.role == "Admin").first()
@@ -515,8 +349,8 @@ def connect_wallet(req: ConnectWalletRequest, db: Session = Depends(get_db)):
     user.role = 'Patient' if user.role == 'Pending' else user.role
     db.commit(); db.refresh(user)
     blockchain_result = approve_wallet_on_chain(wallet_addr)
-    if blockchain_result.get("success"): print(f"✅ Blockchain approve sukses untuk {wallet_addr}")
-    else: print(f"⚠️ Blockchain approve gagal (non-fatal): {blockchain_result.get('error')}")
+    if blockchain_result.get("success"): get_logger("blockchain").info("Approve sukses untuk %s", wallet_addr)
+    else: get_logger("blockchain").warning("Approve gagal (non-fatal): %s", blockchain_result.get('error'))
     return {"message": "Wallet linked successfully", "user": user.to_dict(), "blockchain_approved": blockchain_result.get("success", False)}
 
 
@@ -544,7 +378,7 @@ def verify_signature(req: Web3AuthRequest, db: Session = Depends(get_db)):
             return {"message": "Login Sukses! Signature Anda Valid.", "user": user.to_dict()}
         raise HTTPException(status_code=401, detail="Akses Ditolak: Signature palsu.")
     except Exception as e:
-        print(f"Error kriptografi backend: {e}")
+        get_logger("auth").error("Error kriptografi backend: %s", e)
         raise HTTPException(status_code=500, detail="Terjadi kesalahan internal saat memverifikasi signature.")
 
 
@@ -563,7 +397,7 @@ async def request_doctor(wallet_address: str = Form(...), nomor_str: str = Form(
         db.commit(); db.refresh(user)
         return {"message": "Permintaan menjadi dokter berhasil diajukan.", "user": user.to_dict()}
     except Exception as e:
-        print(f"Error request doctor: {e}")
+        log.error("Error request doctor: %s", e)
         raise HTTPException(status_code=500, detail="Gagal menyimpan permintaan verifikasi dokter.")
 
 
@@ -698,6 +532,7 @@ def get_herbs(db: Session = Depends(get_db)):
 @app.post("/api/recommend")
 async def recommend_herbal(request: Request, db: Session = Depends(get_db)):
     try:
+        start_total = time.time()
         data       = await request.json()
         wallet_addr = data.get('wallet_address', 'guest_user')
         sel_diag   = data.get('diagnosis', [])
@@ -705,81 +540,52 @@ async def recommend_herbal(request: Request, db: Session = Depends(get_db)):
         raw_cond   = data.get('kondisi', [])
         obat_kimia = data.get('obat_kimia', [])
 
-        print(f"\n{'='*70}")
-        print(f"🚀 [ENGINE START] ANALISIS REKOMENDASI EXACT MATCHING (SQL)")
-        print(f"📥 Input Diagnosis : {sel_diag}")
-        print(f"📥 Input Gejala    : {sel_symp}")
-        print(f"{'='*70}")
+        trace(engine_log, "recommend mulai: diagnosis=%s gejala=%s", sel_diag, sel_symp)
 
         condition_mapping = {"Ibu hamil": "Hamil", "Ibu menyusui": "Menyusui", "Anak di bawah lima tahun": "anak di bawah 5 tahun"}
         sel_cond = [condition_mapping.get(c, c) for c in raw_cond if c != "Tidak ada"]
 
-        if is_child_under_five(wallet_addr, db):
-            if "anak di bawah 5 tahun" not in sel_cond:
-                sel_cond.append("anak di bawah 5 tahun")
-                print(f"👶 [RBS-AUTO] User {wallet_addr} terdeteksi berusia <5 tahun, kondisi ditambahkan otomatis.")
-
-        user_allergies = get_user_allergies(wallet_addr, db)
-        print(f"⚙️  [PRE-PROCESS] Kondisi : {sel_cond if sel_cond else 'Normal'}")
-        print(f"⚠️  [ALERGI]      Daftar  : {user_allergies if user_allergies else 'Tidak ada'}")
+        # Akses DB sinkron → io executor agar event loop tidak tertahan
+        sel_cond, user_allergies, snapshot = await run_io(load_patient_context, wallet_addr, sel_cond, db)
+        kb = snapshot.kb
+        trace(engine_log, "pre-process: kondisi=%s alergi=%s", sel_cond or "normal", user_allergies or "-")
 
         grouped_results = []
-        all_diags = db.execute(text("SELECT diagnosis, herbal_name FROM herbal_diagnoses")).fetchall()
-        all_symps = db.execute(text("SELECT symptom,   herbal_name FROM herbal_symptoms")).fetchall()
-
-        for d in sel_diag:
-            print(f"\n🔍 [SQL] Mencari diagnosis: '{d}'")
-            found = {r[1] for r in all_diags if r[0] and r[0].strip().lower() == d.strip().lower()}
-            if not found:
-                print(f"   ❌ Tidak ada data untuk '{d}'."); continue
-            print(f"   📋 Ditemukan {len(found)} herbal. Menjalankan filter...")
-            if sel_cond: print(f"   🔎 Filter Kondisi ({', '.join(sel_cond)}):")
-            details_final, all_unsafe = apply_all_filters_global(found, d, sel_cond, user_allergies, db)
-            if details_final or all_unsafe:
-                grouped_results.append({
-                    "group_type": "Diagnosis",
-                    "group_name": d,
-                    "herbs": details_final,
-                    "unsafe_herbs": all_unsafe
-                })
-            else:
-                print(f"   ⚠️ Tidak ada herbal aman maupun unsafe untuk '{d}'.")
-        for s in sel_symp:
-            print(f"\n🔍 [SQL] Mencari gejala: '{s}'")
-            found = {r[1] for r in all_symps if r[0] and r[0].strip().lower() == s.strip().lower()}
-            if not found:
-                print(f"   ❌ Tidak ada data untuk '{s}'."); continue
-            print(f"   📋 Ditemukan {len(found)} herbal. Menjalankan filter...")
-            if sel_cond: print(f"   🔎 Filter Kondisi ({', '.join(sel_cond)}):")
-            details_final, all_unsafe = apply_all_filters_global(found, s, sel_cond, user_allergies, db)
+
+        # Kumpulkan dulu semua grup, lalu filter RBS sekali untuk seluruh grup
+        pending = []
+        for group_type, labels in (("Diagnosis", sel_diag), ("Gejala", sel_symp)):
+            for label in labels:
+                found = kb.herbs_for(label, group_type)
+                trace(engine_log, "index %s '%s': %d herbal", group_type.lower(), label, len(found))
+                if found:
+                    pending.append((group_type, label, found))
+
+        filtered = apply_filters_batch([(label, found) for _, label, found in pending], sel_cond, user_allergies, kb)
+        for (group_type, label, _), (details_final, all_unsafe) in zip(pending, filtered):
             if details_final or all_unsafe:
                 grouped_results.append({
-                    "group_type": "Gejala",
-                    "group_name": s,
+                    "group_type": group_type,
+                    "group_name": label,
                     "herbs": details_final,
                     "unsafe_herbs": all_unsafe
                 })
             else:
-                print(f"   ⚠️ Tidak ada herbal aman maupun unsafe untuk '{s}'.")
-
-        print(f"\n✨ [FINISH] Analisis selesai. Ditemukan {len(grouped_results)} kategori.")
-        print(f"{'='*70}\n")
+                trace(engine_log, "tidak ada herbal aman maupun unsafe untuk '%s'", label)
 
+        # Write-behind: hanya masuk antrean in-memory, response tidak menunggu journal/commit
         if grouped_results:
-            try:
-                new_history = SearchHistory(
-                    wallet_address=wallet_addr.lower(), diagnoses=sel_diag, symptoms=sel_symp,
-                    special_conditions=raw_cond, chemical_drugs=obat_kimia, recommendations=grouped_results
-                )
-                db.add(new_history); db.commit(); db.refresh(new_history)
-                print(f"✅ [HISTORY] Berhasil tersimpan (ID: {new_history.id})")
-            except Exception as e:
-                db.rollback(); print(f"❌ [HISTORY] Gagal simpan: {str(e)}")
+            history_writer.enqueue(wallet_addr.lower(), sel_diag, sel_symp, raw_cond, obat_kimia, grouped_results)
 
+        annotate_request(
+            labels=len(sel_diag) + len(sel_symp), groups=len(grouped_results),
+            kondisi=len(sel_cond), alergi=len(user_allergies),
+            engine_ms=round((time.time() - start_total) * 1000, 2)
+        )
         return grouped_results
 
     except Exception as e:
-        traceback.print_exc()
+        engine_log.exception("recommend gagal: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -790,12 +596,6 @@ async def recommend_herbal(request: Request, db: Session = Depends(get_db)):
 @app.post("/api/recommend_hybrid")
 async def recommend_hybrid(req: HybridRequest, db: Session = Depends(get_db)):
     start_total = time.time()
-    print(f"[DEBUG] ACTIVE_MODE dari config: {ACTIVE_MODE}")
-    print(f"[DEBUG] Path config: {_CONFIG_DIR}")
-    print(f"\n{'='*70}")
-    print(f"🚀 [ENGINE START] ANALISIS REKOMENDASI HYBRID (SQL + SBERT)")
-    print(f"📥 Input Teks : '{req.query_text}'")
-    print(f"{'='*70}")
 
     try:
         query_clean = req.query_text.strip().lower()
@@ -804,125 +604,107 @@ async def recommend_hybrid(req: HybridRequest, db: Session = Depends(get_db)):
 
         condition_mapping = {"Ibu hamil": "Hamil", "Ibu menyusui": "Menyusui", "Anak di bawah lima tahun": "anak di bawah 5 tahun"}
         sel_cond = [condition_mapping.get(c, c) for c in req.kondisi if c != "Tidak ada"]
-        if is_child_under_five(req.wallet_address, db):
-            if "anak di bawah 5 tahun" not in sel_cond:
-                sel_cond.append("anak di bawah 5 tahun")
-                print(f"👶 [RBS-AUTO] Usia <5 tahun terdeteksi → kondisi ditambahkan.")
-
-        user_allergies = get_user_allergies(req.wallet_address, db)
-        print(f"\n📋 [PRE-PROCESS SUMMARY]")
-        print(f"   Kondisi Khusus : {sel_cond if sel_cond else 'Tidak ada'}")
-        print(f"   Alergi User    : {user_allergies if user_allergies else 'Tidak ada'}")
-
-        def save_history(result_group):
-            try:
-                new_history = SearchHistory(
-                    wallet_address=req.wallet_address.lower(),
-                    diagnoses=[f"Analisis: {req.query_text[:50]}..."], symptoms=[],
-                    special_conditions=req.kondisi, chemical_drugs=req.obat_kimia,
-                    recommendations=result_group
-                )
-                db.add(new_history); db.commit()
-                print(f"💾 [HISTORY] Tersimpan via ORM untuk: {req.wallet_address}")
-            except Exception as e:
-                db.rollback(); print(f"⚠️ [HISTORY] Gagal simpan: {e}")
+        sel_cond, user_allergies, snapshot = await run_io(load_patient_context, req.wallet_address, sel_cond, db)
+        kb, mode = snapshot.kb, snapshot.mode
+        trace(engine_log, "hybrid mulai (mode %s, dataset %s): '%s'", mode, snapshot.version, req.query_text)
+        trace(engine_log, "pre-process: kondisi=%s alergi=%s", sel_cond or "-", user_allergies or "-")
 
         # ── NLP CHUNKING ──
-        print(f"\n🧩 [NLP] Memecah kalimat input...")
-        print(f"   Mode aktif : {ACTIVE_MODE.upper()}")
-
         NEGATION_WORDS = {"tidak", "tanpa", "bukan", "belum", "ga"}
         NEGATION_PHRASES = ["tidak ada", "tidak mengalami", "tidak pernah", "belum pernah"]
 
         delimiters = r'[.,;/!]|\bdan juga\b|\bdan\b|\bserta\b|\bjuga\b|\bmaupun\b|\bdisertai\b|\bbersama\b|\bplus\b|\bditambah\b|\bselain itu\b|\blainnya\b|\btermasuk\b|\bseperti\b|\btetapi\b'
-        raw_chunks = re.split(delimiters, query_clean)
-
         clean_chunks = []
+        chunk_words  = []   # kata chunk sebelum stopword dibuang (untuk pencocok istilah Lapis 1)
         skipped_chunks = []
 
-        for chunk in raw_chunks:
-            temp = chunk.strip()
-            if not temp:
-                continue
-            words = re.sub(r'[^\w\s]', '', temp).split()
-
-            # Cek negasi (kata tunggal + frasa)
-            has_negation = (
-                any(w in NEGATION_WORDS for w in words) or
-                any(phrase in temp for phrase in NEGATION_PHRASES)
-            )
-            if has_negation:
-                skipped_chunks.append(temp)
-                print(f"   ⛔ [NEGASI] '{temp}' dilewati.")
-                continue
+        with observe_stage("nlp_chunking"):
+            raw_chunks = re.split(delimiters, query_clean)
+            for chunk in raw_chunks:
+                temp = chunk.strip()
+                if not temp:
+                    continue
+                words = re.sub(r'[^\w\s]', '', temp).split()
+
+                # Cek negasi (kata tunggal + frasa)
+                has_negation = (
+                    any(w in NEGATION_WORDS for w in words) or
+                    any(phrase in temp for phrase in NEGATION_PHRASES)
+                )
+                if has_negation:
+                    skipped_chunks.append(temp)
+                    continue
 
-            filtered_words = [w for w in words if w not in NLP_STOPWORDS]
-            result = " ".join(filtered_words).strip()
-            if len(result) > 2:
-                clean_chunks.append(result)
+                filtered_words = [w for w in words if w not in NLP_STOPWORDS]
+                result = " ".join(filtered_words).strip()
+                if len(result) > 2:
+                    clean_chunks.append(result)
+                    chunk_words.append(words)
 
-        print(f"   Hasil chunks    : {clean_chunks}")
-        if skipped_chunks:
-            print(f"   Chunk diabaikan : {skipped_chunks}")
+        trace(engine_log, "nlp: chunks=%s negasi=%s", clean_chunks, skipped_chunks)
 
         grouped_data  = {}
         chunks_to_ai  = []
+        matches       = []   # label yang dikenali Lapis 1/2, difilter RBS sekaligus di akhir
+        l1_hits = l1_terms = fuzzy_hits = l2_accepted = l2_rejected = 0
 
         # ══════════════════════════════════════════════════════════════════
-        # LAPIS 1: SQL EXACT MATCH
+        # LAPIS 1: EXACT MATCH + PENCOCOK ISTILAH (label & sinonim kamus_medis)
         # Hanya dijalankan pada mode: hybrid_rag
         # Dilewati pada mode: pure_sbert, rag
         # ══════════════════════════════════════════════════════════════════
-        if ACTIVE_MODE == "hybrid_rag":
-            start_l1 = time.time()
-            print(f"\n{'─'*60}")
-            print(f"🔍 [LAPIS 1] SQL EXACT MATCHING (mode: {ACTIVE_MODE})")
-            print(f"{'─'*60}")
-
-            for chunk in clean_chunks:
-                print(f"\n   🔎 Mencari: '{chunk}'")
-                diag_db = db.execute(text("SELECT herbal_name FROM herbal_diagnoses WHERE TRIM(diagnosis) ILIKE TRIM(:q)"), {"q": chunk}).fetchall()
-                symp_db = db.execute(text("SELECT herbal_name FROM herbal_symptoms  WHERE TRIM(symptom)   ILIKE TRIM(:q)"), {"q": chunk}).fetchall()
-
-                if diag_db or symp_db:
-                    print(f"   ✅ Ditemukan sebagai {'Diagnosis' if diag_db else 'Gejala'}")
-                    baku_name = chunk.strip().capitalize()
-                    db_res    = diag_db if diag_db else symp_db
-                    herbs_list, unsafe_list = apply_all_filters_global(
-                        {row[0] for row in db_res}, baku_name, sel_cond, user_allergies, db
-                    )
-                    if herbs_list or unsafe_list:
-                        if baku_name not in grouped_data:
-                            grouped_data[baku_name] = {
-                                "group_type": "Diagnosis" if diag_db else "Gejala",
-                                "group_name": baku_name,
-                                "herbs": herbs_list,
-                                "unsafe_herbs": unsafe_list,
-                                "detected_from_list": [chunk]
-                            }
-                        else:
-                            if chunk not in grouped_data[baku_name]["detected_from_list"]:
-                                grouped_data[baku_name]["detected_from_list"].append(chunk)
-                            existing_safe   = {h["name"] for h in grouped_data[baku_name]["herbs"]}
-                            existing_unsafe = {u["name"] for u in grouped_data[baku_name]["unsafe_herbs"]}
-                            for herb in herbs_list:
-                                if herb["name"] not in existing_safe:
-                                    grouped_data[baku_name]["herbs"].append(herb)
-                            for u in unsafe_list:
-                                if u["name"] not in existing_unsafe:
-                                    grouped_data[baku_name]["unsafe_herbs"].append(u)
-                    else:
-                        print(f"   ⚠️ Semua herbal '{chunk}' dieliminasi filter.")
-                else:
-                    print(f"   ❌ Tidak ditemukan SQL → ke Lapis 2")
-                    chunks_to_ai.append(chunk)
-
-            print(f"\n⏱️  Lapis 1 selesai: {(time.time() - start_l1)*1000:.2f} ms")
+        if mode == "hybrid_rag":
+            with observe_stage("lapis1"):
+                for chunk, words in zip(clean_chunks, chunk_words):
+                    match = kb.match_exact(chunk)
+
+                    if match:
+                        group_type, found = match
+                        l1_hits += 1
+                        trace(engine_log, "lapis1 '%s' → %s", chunk, group_type)
+                        matches.append({
+                            "group_name": chunk.strip().capitalize(), "group_type": group_type,
+                            "herbs": found, "chunk": chunk,
+                            "empty_msg": f"Semua herbal '{chunk}' dieliminasi filter."
+                        })
+                        continue
+
+                    # Istilah dikenal di dalam chunk; hanya sisa kata yang ke Lapis 2
+                    terms, residue = kb.match_terms(words)
+                    for term, group_type, found in terms:
+                        l1_terms += 1
+                        trace(engine_log, "lapis1 istilah '%s' → '%s' (%s)", term.text, term.label, term.source)
+                        matches.append({
+                            "group_name": term.label.capitalize(), "group_type": group_type,
+                            "herbs": found, "chunk": term.text,
+                            "empty_msg": f"Tidak ada hasil untuk '{term.label}'."
+                        })
+                    for part in residue:
+                        rest = " ".join(w for w in part if w not in NLP_STOPWORDS)
+                        if len(rest) > 2:
+                            chunks_to_ai.append(rest)
+
+            # ── TIER FUZZY: typo label/sinonim (trigram + Levenshtein), sebelum embedding ──
+            with observe_stage("lapis_fuzzy"):
+                remaining = []
+                for chunk in chunks_to_ai:
+                    hit = kb.match_fuzzy(chunk)
+                    if hit is None:
+                        remaining.append(chunk)
+                        continue
+                    fuzzy, group_type, found = hit
+                    fuzzy_hits += 1
+                    trace(engine_log, "fuzzy '%s' → '%s' via '%s' (%d edit)", chunk, fuzzy.label, fuzzy.term, fuzzy.distance)
+                    matches.append({
+                        "group_name": fuzzy.label.capitalize(), "group_type": group_type,
+                        "herbs": found, "chunk": chunk,
+                        "empty_msg": f"Tidak ada hasil untuk '{fuzzy.label}'."
+                    })
+                chunks_to_ai = remaining
 
         else:
             # pure_sbert / rag → semua chunk langsung ke Lapis 2
             chunks_to_ai = clean_chunks
-            print(f"\n⏭️  [LAPIS 1] DILEWATI (mode: {ACTIVE_MODE}) → semua chunk ke Lapis 2")
 
         # ══════════════════════════════════════════════════════════════════
         # LAPIS 2: SBERT / RAG SEMANTIC MATCHING
@@ -930,85 +712,64 @@ async def recommend_hybrid(req: HybridRequest, db: Session = Depends(get_db)):
         # Isi ChromaDB (pure vs sinonim) sudah ditentukan saat update_dataset
         # ══════════════════════════════════════════════════════════════════
         final_result_groups = []
+        record_tier_hits(mode, exact=l1_hits, istilah=l1_terms, fuzzy=fuzzy_hits, sbert=len(chunks_to_ai))
 
         if chunks_to_ai:
             start_l2 = time.time()
-            mode_label = {
-                "pure_sbert":  "PURE SBERT (tanpa sinonim)",
-                "rag":         "RAG (dengan sinonim kamus)",
-                "hybrid_rag":  "HYBRID RAG (fallback dari SQL)"
-            }.get(ACTIVE_MODE, ACTIVE_MODE.upper())
-
-            print(f"\n{'─'*60}")
-            print(f"🧠 [LAPIS 2] {mode_label}")
-            print(f"{'─'*60}")
-
-            from sentence_transformers import SentenceTransformer
-            import chromadb
-            model_ai      = SentenceTransformer('intfloat/multilingual-e5-small')
-            chroma_client = chromadb.PersistentClient(path="./chroma_db")
-            collection    = chroma_client.get_collection(name="med_labels")
-
-            for chunk in chunks_to_ai:
-                print(f"\n   🔎 Menganalisis: '{chunk}'")
-                cv = model_ai.encode([f"query: {chunk}"]).tolist()
-                sr = collection.query(query_embeddings=cv, n_results=1)
-
-                if sr['distances'][0]:
-                    similarity = (1 - sr['distances'][0][0]) * 100
-                    label_baku = sr['metadatas'][0][0]['baku'].strip()
+
+            # Semua chunk di-encode dalam satu batch + satu query multi-vektor (di inference executor)
+            resolutions = await run_inference(inference_service.resolve_labels, chunks_to_ai, snapshot.label_index)
+
+            for chunk, resolved in zip(chunks_to_ai, resolutions):
+                if resolved:
+                    similarity = resolved["similarity"]
+                    label_baku = resolved["baku"]
                     baku_cap   = label_baku.capitalize()
-                    print(f"   🤖 SBERT: '{chunk}' → '{label_baku}' (similarity: {similarity:.2f}%)")
+                    record_sbert_match(mode, similarity, similarity >= 88.0)
 
                     if similarity >= 88.0:
-                        print(f"   ✅ Diterima (≥88%). Mapping ke database...")
-                        is_diag = db.execute(text("SELECT 1 FROM herbal_diagnoses WHERE TRIM(diagnosis) ILIKE TRIM(:q)"), {"q": label_baku}).first()
-                        ai_db   = db.execute(text("""
-                            SELECT herbal_name FROM herbal_diagnoses WHERE TRIM(diagnosis) ILIKE TRIM(:q)
-                            UNION
-                            SELECT herbal_name FROM herbal_symptoms  WHERE TRIM(symptom)   ILIKE TRIM(:q)
-                        """), {"q": label_baku}).fetchall()
-
-                        herbs_ai_list, unsafe_ai_list = apply_all_filters_global(
-                            {r[0] for r in ai_db}, baku_cap, sel_cond, user_allergies, db
-                        )
-
-                        if herbs_ai_list or unsafe_ai_list:
-                            if baku_cap not in grouped_data:
-                                grouped_data[baku_cap] = {
-                                    "group_type": "Diagnosis" if is_diag else "Gejala",
-                                    "group_name": baku_cap,
-                                    "herbs": herbs_ai_list,
-                                    "unsafe_herbs": unsafe_ai_list,
-                                    "detected_from_list": [chunk]
-                                }
-                            else:
-                                if chunk not in grouped_data[baku_cap]["detected_from_list"]:
-                                    grouped_data[baku_cap]["detected_from_list"].append(chunk)
-                                existing_safe   = {h["name"] for h in grouped_data[baku_cap]["herbs"]}
-                                existing_unsafe = {u["name"] for u in grouped_data[baku_cap]["unsafe_herbs"]}
-                                for herb in herbs_ai_list:
-                                    if herb["name"] not in existing_safe:
-                                        grouped_data[baku_cap]["herbs"].append(herb)
-                                for u in unsafe_ai_list:
-                                    if u["name"] not in existing_unsafe:
-                                        grouped_data[baku_cap]["unsafe_herbs"].append(u)
-                        else:
-                            print(f"   ⚠️ Tidak ada hasil untuk '{label_baku}'.")
+                        l2_accepted += 1
+                        trace(engine_log, "lapis2 '%s' → '%s' (%.2f%%) diterima", chunk, label_baku, similarity)
+                        group_type, found = kb.match_label(label_baku)
+                        matches.append({
+                            "group_name": baku_cap, "group_type": group_type,
+                            "herbs": found, "chunk": chunk,
+                            "empty_msg": f"Tidak ada hasil untuk '{label_baku}'."
+                        })
                     else:
-                        print(f"   ⚠️ Ditolak (similarity {similarity:.2f}% < 88%).")
-
-            print(f"\n⏱️  Lapis 2 selesai: {(time.time() - start_l2)*1000:.2f} ms")
+                        l2_rejected += 1
+                        trace(engine_log, "lapis2 '%s' → '%s' (%.2f%% < 88%%) ditolak", chunk, label_baku, similarity)
 
-        elif ACTIVE_MODE in ("pure_sbert", "rag") and not chunks_to_ai:
-            print(f"\n⚠️ Tidak ada chunk yang bisa dianalisis setelah filter negasi/stopword.")
+            trace(engine_log, "lapis2 selesai: %.2f ms", (time.time() - start_l2) * 1000)
 
-            print(f"\n⏱️  Lapis 2 selesai: {(time.time() - start_l2)*1000:.2f} ms")
+        # ── RBS FILTER: satu pass untuk seluruh grup Lapis 1 + Lapis 2 ──
+        filtered = apply_filters_batch([(m["group_name"], m["herbs"]) for m in matches], sel_cond, user_allergies, kb)
+        for m, (herbs_list, unsafe_list) in zip(matches, filtered):
+            name, chunk = m["group_name"], m["chunk"]
+            if not (herbs_list or unsafe_list):
+                trace(engine_log, "%s", m["empty_msg"])
+                continue
+            if name not in grouped_data:
+                grouped_data[name] = {
+                    "group_type": m["group_type"],
+                    "group_name": name,
+                    "herbs": herbs_list,
+                    "unsafe_herbs": unsafe_list,
+                    "detected_from_list": [chunk]
+                }
+            else:
+                if chunk not in grouped_data[name]["detected_from_list"]:
+                    grouped_data[name]["detected_from_list"].append(chunk)
+                existing_safe   = {h["name"] for h in grouped_data[name]["herbs"]}
+                existing_unsafe = {u["name"] for u in grouped_data[name]["unsafe_herbs"]}
+                for herb in herbs_list:
+                    if herb["name"] not in existing_safe:
+                        grouped_data[name]["herbs"].append(herb)
+                for u in unsafe_list:
+                    if u["name"] not in existing_unsafe:
+                        grouped_data[name]["unsafe_herbs"].append(u)
 
         # ── FINAL CONSOLIDATION ──
-        print(f"\n{'─'*60}")
-        print(f"📦 [FINAL CONSOLIDATION] Menyusun hasil akhir...")
-        print(f"{'─'*60}")
         for name, data in grouped_data.items():
             sources = data["detected_from_list"]
             h_list  = [f'"{s}"' for s in sources]
@@ -1021,21 +782,21 @@ async def recommend_hybrid(req: HybridRequest, db: Session = Depends(get_db)):
                 "herbs":        data["herbs"],
                 "unsafe_herbs": data.get("unsafe_herbs", []),
             })
-            print(f"   ✅ '{name}' → {len(data['herbs'])} aman, {len(data.get('unsafe_herbs', []))} dieliminasi")
-
-        end_total = (time.time() - start_total) * 1000
-        print(f"\n{'='*70}")
-        print(f"✨ [SELESAI] {len(final_result_groups)} kategori ditemukan. ⏱️ {end_total:.2f} ms")
-        print(f"{'='*70}\n")
 
         if final_result_groups:
-            save_history(final_result_groups)
-            return final_result_groups
-        return []
+            # Write-behind: hanya masuk antrean in-memory, response tidak menunggu journal/commit
+            history_writer.enqueue(req.wallet_address.lower(), [f"Analisis: {req.query_text[:50]}..."], [],
+                                   req.kondisi, req.obat_kimia, final_result_groups)
+
+        annotate_request(
+            mode=mode, dataset=snapshot.version, chunks=len(clean_chunks), negasi=len(skipped_chunks),
+            lapis1=l1_hits, lapis1_istilah=l1_terms, fuzzy=fuzzy_hits, lapis2_ok=l2_accepted, lapis2_tolak=l2_rejected,
+            groups=len(final_result_groups), engine_ms=round((time.time() - start_total) * 1000, 2)
+        )
+        return final_result_groups
 
     except Exception as e:
-        print(f"\n🔥 [CRITICAL ERROR] {e}")
-        traceback.print_exc()
+        engine_log.exception("hybrid gagal: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1046,6 +807,9 @@ async def recommend_hybrid(req: HybridRequest, db: Session = Depends(get_db)):
 @app.get("/api/history/{wallet_address}")
 def get_user_history(wallet_address: str, db: Session = Depends(get_db)):
     try:
+        # Riwayat wallet ini yang masih di antrean write-behind digabung ke respons (tanpa menunggu flush).
+        # Diambil SEBELUM query: record yang ter-commit di antaranya muncul di keduanya → dedup via created_at.
+        pending = history_writer.pending_for(wallet_address)
         result = db.execute(text("""
             SELECT id, diagnoses, symptoms, special_conditions, chemical_drugs, recommendations,
                 created_at, blockchain_tx_hash, blockchain_record_id
@@ -1053,7 +817,16 @@ def get_user_history(wallet_address: str, db: Session = Depends(get_db)):
             WHERE wallet_address = :wallet AND (is_deleted = FALSE OR is_deleted IS NULL)
             ORDER BY created_at DESC
         """), {"wallet": wallet_address.lower()}).fetchall()
-        return [{
+        committed = {r[6] for r in result}
+        queued = [{
+            "id": None, "diagnoses": p["diagnoses"], "symptoms": p["symptoms"],
+            "special_conditions": p["special_conditions"], "chemical_drugs": p["chemical_drugs"],
+            "recommendations": p["recommendations"],
+            "created_at": p["created_at"].strftime("%Y-%m-%dT%H:%M:%S") + "Z",
+            "blockchain_tx_hash": None, "blockchain_record_id": None,
+            "is_on_blockchain": False
+        } for p in reversed(pending) if p["created_at"] not in committed]
+        return queued + [{
             "id": r[0], "diagnoses": r[1], "symptoms": r[2], "special_conditions": r[3],
             "chemical_drugs": r[4], "recommendations": r[5],
             "created_at": (r[6].strftime("%Y-%m-%dT%H:%M:%S") + "Z") if r[6] else None,
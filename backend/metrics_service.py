@@ -0,0 +1,223 @@
+"""
+metrics_service.py
+Metrik in-process berformat teks Prometheus (exposition format 0.0.4),
+diekspos di GET /metrics. Diimplementasi sendiri (tanpa prometheus_client)
+karena cukup counter + histogram berlabel.
+
+Metrik utama:
+- herbalyze_stage_duration_seconds{stage}      : latensi per tahap engine
+  (nlp_chunking, lapis1, lapis_fuzzy, lapis2_cache, lapis2_encode, lapis2_search,
+  safety_filter, detail_fetch, history_write). Satu sampel per request per
+  tahap yang dijalankan; lapis2_cache tercatat setiap request masuk Lapis 2,
+  lapis2_encode/lapis2_search hanya jika ada chunk cache miss.
+- herbalyze_sbert_matches_total{mode,decision,bucket} : hasil Lapis 2
+  diterima/ditolak per rentang similarity dan mode snapshot aktif
+- herbalyze_tier_hits_total{mode,tier}          : chunk yang diselesaikan per tier
+  (exact, istilah, fuzzy) dan yang tetap dikirim ke SBERT (sbert)
+- herbalyze_external_call_duration_seconds{service,operation,outcome} +
+  herbalyze_external_calls_total : panggilan IPFS (Pinata) & blockchain
+- herbalyze_http_request_duration_seconds{method,route,status}
+"""
+
+import functools
+import threading
+import time
+
+# Detik; rentang dari operasi in-memory (sub-ms) sampai panggilan blockchain (detik)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Batas rentang similarity (persen) untuk label `bucket` metrik SBERT; 88 = ambang Lapis 2
+SIMILARITY_BUCKETS = (50, 60, 70, 80, 85, 88, 90, 95)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._lock   = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> dict:
+        """Salinan nilai per tuple label."""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock   = threading.Lock()
+        # key label → [count per bucket (non-kumulatif) + overflow, sum, count]
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        # Cari bucket pertama yang >= value (linear; jumlah bucket kecil)
+        idx = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                idx = i
+                break
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip((*self.buckets, float("inf")), counts):
+                cumulative += c
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "herbalyze_stage_duration_seconds", "Latensi per tahap engine rekomendasi (lapis2_encode/lapis2_search hanya untuk request dengan cache miss; lapis2_cache untuk semua request Lapis 2).", ("stage",)))
+REQUEST_SECONDS = registry.register(Histogram(
+    "herbalyze_http_request_duration_seconds", "Latensi request HTTP per route.", ("method", "route", "status")))
+SBERT_MATCHES = registry.register(Counter(
+    "herbalyze_sbert_matches_total", "Hasil pencocokan Lapis 2 per mode, keputusan, dan rentang similarity.",
+    ("mode", "decision", "bucket")))
+TIER_HITS = registry.register(Counter(
+    "herbalyze_tier_hits_total", "Chunk keluhan yang diselesaikan per tier pencocokan (sbert = dikirim ke Lapis 2).",
+    ("mode", "tier")))
+EXTERNAL_SECONDS = registry.register(Histogram(
+    "herbalyze_external_call_duration_seconds", "Latensi panggilan layanan eksternal (IPFS, blockchain).",
+    ("service", "operation", "outcome")))
+EXTERNAL_CALLS = registry.register(Counter(
+    "herbalyze_external_calls_total", "Jumlah panggilan layanan eksternal per hasil.",
+    ("service", "operation", "outcome")))
+
+
+def observe_stage(stage: str) -> _Timer:
+    """`with observe_stage("lapis1"): ...` → catat durasi ke herbalyze_stage_duration_seconds."""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def similarity_bucket(similarity: float) -> str:
+    lower = 0
+    for bound in SIMILARITY_BUCKETS:
+        if similarity < bound:
+            return f"{lower}-{bound}"
+        lower = bound
+    return f"{lower}-100"
+
+
+def record_sbert_match(mode: str, similarity: float, accepted: bool):
+    SBERT_MATCHES.inc(mode=mode, decision="accepted" if accepted else "rejected",
+                      bucket=similarity_bucket(similarity))
+
+
+def record_tier_hits(mode: str, **counts):
+    """record_tier_hits(mode, exact=1, fuzzy=2, sbert=0) → herbalyze_tier_hits_total per tier."""
+    for tier, count in counts.items():
+        if count:
+            TIER_HITS.inc(count, mode=mode, tier=tier)
+
+
+def tier_hits() -> dict:
+    """Total per tier (semua mode) + porsi chunk yang tidak perlu SBERT, untuk /api/health."""
+    totals = {}
+    for (_, tier), value in TIER_HITS.values().items():
+        totals[tier] = totals.get(tier, 0) + int(value)
+    resolved = sum(v for t, v in totals.items() if t != "sbert")
+    total = resolved + totals.get("sbert", 0)
+    return {**totals, "sbert_avoided_ratio": round(resolved / total, 4) if total else None}
+
+
+def timed_call(service: str, operation: str):
+    """
+    Decorator untuk panggilan eksternal. Outcome "error" jika melempar exception
+    atau mengembalikan dict dengan success=False (konvensi blockchain_service).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start, outcome = time.perf_counter(), "error"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = "error" if isinstance(result, dict) and result.get("success") is False else "ok"
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                EXTERNAL_SECONDS.observe(elapsed, service=service, operation=operation, outcome=outcome)
+                EXTERNAL_CALLS.inc(service=service, operation=operation, outcome=outcome)
+        return wrapper
+    return decorator
+
+
+def render_metrics() -> str:
+    return registry.render()
@@ -0,0 +1,109 @@
+"""
+rbs_filter.py
+Filter RBS (rule-based safety) yang dipakai KEDUA endpoint: /api/recommend
+DAN /api/recommend_hybrid (main.py). Kandidat herbal disaring terhadap
+kondisi khusus (index keamanan KnowledgeBase.classify_safety) lalu alergi
+profil user. Output unsafe_herbs selalu memiliki field: name, full_name,
+reason, description, reference.
+"""
+
+from logging_service import get_logger, trace, tracing
+from metrics_service import observe_stage
+
+log = get_logger("rbs")
+
+
+def _unsafe_condition_entry(full_name, rule, kb) -> dict:
+    alasan     = ", ".join(sorted(rule["conditions"]))
+    desc_final = " ".join(rule["descriptions"]) if rule["descriptions"] else "Analisis medis menunjukkan adanya risiko efek samping."
+    ref_final  = ", ".join(rule["references"])  if rule["references"]  else "Pedoman Keamanan Herbal"
+    return {
+        "name":        kb.main_name(full_name),
+        "full_name":   full_name.strip(),
+        "reason":      f"Berbahaya bagi: {alasan}",
+        "description": desc_final,
+        "reference":   ref_final
+    }
+
+
+def _unsafe_allergy_entry(full_name, kb) -> dict:
+    return {
+        "name":        kb.main_name(full_name),
+        "full_name":   full_name,
+        "reason":      "Terdeteksi riwayat alergi pada profil Anda",
+        "description": "Tanaman ini masuk dalam daftar alergi Anda. Mengonsumsinya dapat memicu reaksi alergi.",
+        "reference":   "Profil kesehatan pengguna"
+    }
+
+
+def find_allergic_herbs(herb_names, allergies: set, kb) -> dict:
+    """herbal_name → varian nama yang cocok dengan daftar alergi user."""
+    if not herb_names or not allergies:
+        return {}
+    clean_allergies = {str(a).split("(")[0].strip().lower() for a in allergies}
+    allergic = {}
+    for name in herb_names:
+        matched = kb.herb(name)["variants"] & clean_allergies
+        if matched:
+            allergic[name] = sorted(matched)[0]
+    return allergic
+
+
+def apply_filters_batch(groups, conditions, allergies, kb):
+    """
+    Filter RBS kondisi + alergi untuk SEMUA grup hasil satu request sekaligus:
+    union kandidat herbal diklasifikasi sekali, lalu hasilnya dipecah lagi per grup.
+
+    Args:
+        groups: list (label, herb_names_set)
+
+    Returns:
+        list (details_final, all_unsafe) sejajar dengan `groups`:
+            details_final : list detail herbal yang aman
+            all_unsafe    : list dict unsafe_herbs (kondisi + alergi)
+    """
+    if not groups:
+        return []
+    union = set().union(*(herbs for _, herbs in groups))
+
+    # ── Filter 1: Kondisi Khusus (sekali untuk union) ──
+    with observe_stage("safety_filter"):
+        if conditions:
+            safe_union, unsafe_rules = kb.classify_safety(union, conditions)
+        else:
+            safe_union, unsafe_rules = union, {}
+        unsafe_entries = {h: _unsafe_condition_entry(h, rule, kb) for h, rule in unsafe_rules.items()}
+
+        # ── Filter 2: Alergi Personal (sekali untuk union yang lolos kondisi) ──
+        allergic = find_allergic_herbs(safe_union, allergies, kb)
+
+    traced = tracing()
+    if traced:
+        trace(log, "kondisi=%s alergi=%s kandidat=%d eliminasi_kondisi=%s eliminasi_alergi=%s",
+              conditions, sorted(allergies), len(union),
+              {unsafe_entries[h]["name"]: sorted(unsafe_rules[h]["conditions"]) for h in sorted(unsafe_entries)},
+              {kb.main_name(h): allergic[h] for h in sorted(allergic)})
+
+    # Satu sampel detail_fetch per request (bukan per grup), sejajar dengan tahap lain
+    summaries = []
+    with observe_stage("detail_fetch"):
+        for label, herbs in groups:
+            ordered = sorted(herbs)
+            unsafe_rbs     = [unsafe_entries[h] for h in ordered if h in unsafe_entries]
+            details_final  = kb.details_for(h for h in ordered if h not in unsafe_entries and h not in allergic)
+            unsafe_allergy = [_unsafe_allergy_entry(h, kb) for h in ordered if h in allergic and h not in unsafe_entries]
+            summaries.append((label, ordered, unsafe_rbs, unsafe_allergy, details_final))
+    if traced:
+        for summary in summaries:
+            _log_filter_summary(*summary, kb)
+    return [(details_final, unsafe_rbs + unsafe_allergy)
+            for _, _, unsafe_rbs, unsafe_allergy, details_final in summaries]
+
+
+def _log_filter_summary(label, herb_names, unsafe_rbs, unsafe_allergy, details_final, kb):
+    trace(log, "ringkasan '%s': awal=%s eliminasi_kondisi=%s eliminasi_alergi=%s lolos=%s",
+          label,
+          sorted(kb.main_name(h) for h in herb_names),
+          [u["name"] for u in unsafe_rbs],
+          sorted(u["name"] for u in unsafe_allergy),
+          sorted(kb.main_name(h["name"]) for h in details_final))
@@ -0,0 +1,299 @@
+"""
+benchmark_models.py
+Benchmark kualitas + latensi retrieval Lapis 2 untuk beberapa model encoder
+dan dua varian isi med_labels (sama dengan rebuild_kamus_medis_chromadb di
+update_dataset.py):
+- pure : label baku diagnosis & gejala saja      (mode pure_sbert)
+- rag  : label baku + sinonim dari Kamus_Medis   (mode rag / hybrid_rag)
+
+Set label di-encode SEKALI per (model, varian); query set berlabel (default
+dataset_herbal_masif.csv dari generate_dataset.py, kolom text/label) di-encode
+sekali per model lalu dicari ke semua varian. Yang diukur:
+- akurasi top-1 / top-k dan MRR (label baku, skor per baku = maks skor sinonimnya)
+- acceptance rate di ambang 88% + presisi/recall keputusan yang diterima
+- waktu encode label, throughput encode query (batch), latensi encode & search
+  per query tunggal (p50/p95, jalur online), throughput search batch
+
+Jalankan dari folder backend:
+    python scripts/benchmark_models.py --models intfloat/multilingual-e5-small ./model_herbal_lokal onnx:./onnx_model \
+        --limit 2000 --report reports/benchmark.json
+
+    # Bandingkan dengan laporan rilis sebelumnya (selisih dicetak per metrik)
+    python scripts/benchmark_models.py --baseline reports/benchmark_prev.json --report reports/benchmark.json
+
+Laporan JSON ditulis dengan kunci terurut agar bisa di-diff antar rilis.
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from csv_ingest import read_csv
+from dataset_transform import KAMUS_MEDIS_MAPPING, transform_chunk
+from encoder_backends import load_encoder
+from generate_dataset import kamus_sinonim, load_unique_labels
+from text_utils import normalize_text_key
+
+ACCEPT_THRESHOLD = 88.0   # sama dengan ambang Lapis 2 di main.py
+VARIANTS = ("pure", "rag")
+DEFAULT_MODELS = ["intfloat/multilingual-e5-small", "./model_herbal_lokal"]
+
+# Metrik yang dibandingkan dengan --baseline: per model, lalu per varian
+MODEL_KEYS   = ("query_encode_p50_ms", "query_encode_p95_ms", "query_encode_batch_qps")
+VARIANT_KEYS = ("top1_accuracy", "topk_accuracy", "mrr", "acceptance_rate", "accepted_precision",
+                "accepted_recall", "search_p50_ms", "search_p95_ms")
+
+
+def load_label_sets(dataset_labels: list) -> dict:
+    """
+    Bangun dokumen med_labels per varian: list (dokumen, baku).
+    Sumber utama datasets/*.csv (sama dengan seed update_dataset.py); jika tidak
+    ada, label dari query set + kamus_sinonim generate_dataset.py.
+    """
+    datasets_dir = os.path.join(BACKEND_DIR, "datasets")
+    try:
+        labels = [l for l in load_unique_labels(
+            os.path.join(datasets_dir, "Herbal gejala.csv"),
+            os.path.join(datasets_dir, "Herbal diagnosis.csv")) if l]
+    except FileNotFoundError:
+        print("[INFO] datasets/Herbal *.csv tidak ditemukan, pakai label dari query set")
+        labels = []
+    # Label query set yang tidak ada di datasets tetap harus bisa ditemukan
+    known = {normalize_text_key(l) for l in labels}
+    labels += sorted({l for l in dataset_labels if normalize_text_key(l) not in known})
+
+    synonyms = []
+    kamus_path = os.path.join(datasets_dir, "Kamus_Medis.csv")
+    if os.path.exists(kamus_path):
+        # Sel Sinonim berisi banyak sinonim per baris (dipisah newline): pecah persis seperti seed kamus_medis
+        df_kamus = transform_chunk(read_csv(kamus_path), "Kamus medis", KAMUS_MEDIS_MAPPING, "kamus_medis")
+        synonyms = list(zip(df_kamus["sinonim_awam"], df_kamus["istilah_baku"]))
+    else:
+        print("[INFO] datasets/Kamus_Medis.csv tidak ditemukan, sinonim RAG dari kamus_sinonim")
+        synonyms = [(s, baku) for baku, items in kamus_sinonim.items() for s in items]
+
+    base = [(label.strip().lower(), label.strip()) for label in labels]
+    return {
+        "pure": base,
+        "rag":  base + [(s.lower(), baku) for s, baku in synonyms],
+    }
+
+
+def load_queries(dataset_path: str, limit: int, seed: int):
+    df = pd.read_csv(dataset_path).dropna(subset=["text", "label"])
+    if limit and limit < len(df):
+        df = df.sample(n=limit, random_state=seed)
+    return df["text"].astype(str).tolist(), df["label"].astype(str).str.strip().tolist()
+
+
+def parse_model_spec(spec: str):
+    """'onnx:./onnx_model' → backend onnx; selain itu nama HF / folder SentenceTransformer."""
+    if spec.startswith("onnx:"):
+        return "onnx", spec[len("onnx:"):]
+    return "torch", spec
+
+
+def percentile(values, p: float):
+    return round(float(np.percentile(values, p)), 3) if len(values) else None
+
+
+def group_by_baku(documents: list):
+    """Urutkan baris per baku → (urutan baris, offset awal tiap grup, daftar baku) untuk np.maximum.reduceat."""
+    keys  = [normalize_text_key(b) for _, b in documents]
+    order = sorted(range(len(documents)), key=lambda i: keys[i])
+    starts, names = [], []
+    for pos, i in enumerate(order):
+        if not names or keys[i] != normalize_text_key(names[-1]):
+            starts.append(pos)
+            names.append(documents[i][1])
+    return np.asarray(order), np.asarray(starts), names
+
+
+def evaluate(query_emb: np.ndarray, truth: list, label_emb: np.ndarray, documents: list, k: int) -> dict:
+    order, starts, names = group_by_baku(documents)
+    matrix = label_emb[order]
+
+    t0 = time.perf_counter()
+    scores = np.maximum.reduceat(query_emb @ matrix.T, starts, axis=1) * 100   # skor per baku
+    search_batch_s = time.perf_counter() - t0
+
+    name_pos   = {normalize_text_key(n): i for i, n in enumerate(names)}
+    truth_idx  = np.asarray([name_pos.get(normalize_text_key(t), -1) for t in truth])
+    truth_score = np.where(truth_idx >= 0, scores[np.arange(len(truth)), np.maximum(truth_idx, 0)], -np.inf)
+    # rank 1-based label benar = 1 + jumlah baku dengan skor lebih tinggi
+    rank = 1 + (scores > truth_score[:, None]).sum(axis=1)
+    rank = np.where(truth_idx >= 0, rank, np.iinfo(np.int32).max)
+
+    best     = scores.max(axis=1)
+    correct  = rank == 1
+    accepted = best >= ACCEPT_THRESHOLD
+    n = len(truth)
+    return {
+        "label_rows":          int(len(documents)),
+        "label_baku":          int(len(names)),
+        "missing_truth":       int(np.sum(truth_idx < 0)),
+        "top1_accuracy":       round(float(correct.mean()), 4),
+        "topk_accuracy":       round(float((rank <= k).mean()), 4),
+        "mrr":                 round(float(np.mean(np.where(rank <= len(names), 1.0 / rank, 0.0))), 4),
+        "acceptance_rate":     round(float(accepted.mean()), 4),
+        # dari yang diterima (>= 88%), berapa yang labelnya benar
+        "accepted_precision":  round(float(correct[accepted].mean()), 4) if accepted.any() else None,
+        # dari semua query, berapa yang diterima DAN benar (yang benar-benar sampai ke user)
+        "accepted_recall":     round(float((correct & accepted).sum() / n), 4),
+        "top1_score_mean":     round(float(best.mean()), 2),
+        "search_batch_qps":    round(n / search_batch_s, 1) if search_batch_s else None,
+    }
+
+
+def time_single(fn, items: list) -> list:
+    latencies = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies
+
+
+def benchmark_model(spec: str, queries: list, truth: list, label_sets: dict, k: int,
+                    batch_size: int, latency_samples: int) -> dict:
+    backend, name = parse_model_spec(spec)
+    print(f"\n[RUN] model={name} backend={backend}")
+    t0 = time.perf_counter()
+    model = load_encoder(backend, model_name=name, onnx_path=name)
+    load_s = time.perf_counter() - t0
+
+    def encode(texts, bs=batch_size):
+        return np.asarray(model.encode(texts, batch_size=bs, normalize_embeddings=True,
+                                       show_progress_bar=False), dtype=np.float32)
+
+    q_texts = [f"query: {q.strip().lower()}" for q in queries]
+    t0 = time.perf_counter()
+    query_emb = encode(q_texts)
+    query_batch_s = time.perf_counter() - t0
+
+    # Jalur online: satu chunk per encode (sebelum micro-batching menggabungkan request)
+    single = q_texts[:latency_samples]
+    encode_ms = time_single(lambda t: encode([t], bs=1), single)
+
+    result = {
+        "backend": backend,
+        "model_load_s": round(load_s, 3),
+        "query_encode_batch_qps": round(len(q_texts) / query_batch_s, 1) if query_batch_s else None,
+        "query_encode_p50_ms": percentile(encode_ms, 50),
+        "query_encode_p95_ms": percentile(encode_ms, 95),
+        "variants": {},
+    }
+
+    for variant, documents in label_sets.items():
+        t0 = time.perf_counter()
+        label_emb = encode([f"passage: {doc}" for doc, _ in documents])
+        label_encode_s = time.perf_counter() - t0
+
+        metrics = evaluate(query_emb, truth, label_emb, documents, k)
+        # Search per query tunggal di matriks label (setara NumpyLabelIndex float32)
+        matrix = label_emb.T.copy()
+        search_ms = time_single(lambda q: np.argmax(q @ matrix), list(query_emb[:latency_samples]))
+        metrics.update({
+            "label_encode_s": round(label_encode_s, 3),
+            "search_p50_ms":  percentile(search_ms, 50),
+            "search_p95_ms":  percentile(search_ms, 95),
+        })
+        result["variants"][variant] = metrics
+        print(f"   {variant:<5} top1={metrics['top1_accuracy']:.2%} top{k}={metrics['topk_accuracy']:.2%} "
+              f"accept={metrics['acceptance_rate']:.2%} accept&benar={metrics['accepted_recall']:.2%} "
+              f"label_encode={label_encode_s:.2f}s")
+    return result
+
+
+def print_report(report: dict):
+    k = report["config"]["k"]
+    print("\n" + "=" * 118)
+    print(f"{'model':<34} {'var':<5} {'top1':>7} {f'top{k}':>7} {'mrr':>6} {'accept':>7} {'prec':>7} "
+          f"{'recall':>7} {'enc p50':>8} {'enc p95':>8} {'srch p95':>9} {'enc qps':>8}")
+    print("-" * 118)
+    for spec, m in report["models"].items():
+        for variant, v in m["variants"].items():
+            prec = f"{v['accepted_precision']:.2%}" if v["accepted_precision"] is not None else "-"
+            print(f"{spec[-34:]:<34} {variant:<5} {v['top1_accuracy']:>7.2%} {v['topk_accuracy']:>7.2%} {v['mrr']:>6.3f} "
+                  f"{v['acceptance_rate']:>7.2%} {prec:>7} {v['accepted_recall']:>7.2%} "
+                  f"{m['query_encode_p50_ms']:>8} {m['query_encode_p95_ms']:>8} {v['search_p95_ms']:>9} "
+                  f"{m['query_encode_batch_qps']:>8}")
+    print("=" * 118)
+
+
+def compare_with_baseline(report: dict, baseline_path: str):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("config", {}).get("query_set_sha1") != report["config"]["query_set_sha1"]:
+        print("[INFO] Query set berbeda dengan baseline; selisih akurasi tidak sebanding langsung")
+
+    print(f"\nSelisih terhadap baseline {baseline_path}:")
+    for spec, m in report["models"].items():
+        old_model = baseline.get("models", {}).get(spec)
+        if not old_model:
+            print(f"   {spec}: tidak ada di baseline")
+            continue
+        pairs = [("", old_model, m, MODEL_KEYS)]
+        pairs += [(f" [{variant}]", old_model.get("variants", {}).get(variant, {}), v, VARIANT_KEYS)
+                  for variant, v in m["variants"].items()]
+        for tag, old, new, keys in pairs:
+            for key in keys:
+                if old.get(key) is not None and new.get(key) is not None:
+                    print(f"   {spec}{tag} {key}: {old[key]} → {new[key]} ({new[key] - old[key]:+.4f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark kualitas + latensi retrieval Lapis 2 per model & varian med_labels")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS,
+                        help="nama HF, folder SentenceTransformer, atau onnx:<folder export_onnx.py>")
+    parser.add_argument("--dataset", default="dataset_herbal_masif.csv", help="query set berlabel (kolom text, label)")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument("--limit", type=int, default=0, help="sampel N query (0 = semua)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--k", type=int, default=5, help="k untuk akurasi top-k")
+    parser.add_argument("--batch-size", type=int, default=64, help="batch encode untuk query set & label")
+    parser.add_argument("--latency-samples", type=int, default=200, help="jumlah query untuk latensi per query tunggal")
+    parser.add_argument("--baseline", default=None, help="laporan JSON sebelumnya untuk dibandingkan")
+    parser.add_argument("--report", default=None, help="simpan laporan (JSON) ke path ini")
+    args = parser.parse_args()
+
+    os.chdir(BACKEND_DIR)   # path relatif (dataset, model lokal, onnx_model) sama seperti script lain
+    queries, truth = load_queries(args.dataset, args.limit, args.seed)
+    label_sets = {v: docs for v, docs in load_label_sets(truth).items() if v in args.variants}
+    print(f"[INFO] {len(queries)} query, varian: " +
+          ", ".join(f"{v}={len(docs)} dokumen" for v, docs in label_sets.items()))
+
+    report = {
+        "config": {
+            "dataset": args.dataset,
+            "queries": len(queries),
+            "query_set_sha1": hashlib.sha1("\n".join(f"{q}\t{t}" for q, t in zip(queries, truth)).encode("utf-8")).hexdigest(),
+            "k": args.k,
+            "accept_threshold": ACCEPT_THRESHOLD,
+            "batch_size": args.batch_size,
+            "latency_samples": min(args.latency_samples, len(queries)),
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "models": {},
+    }
+    for spec in args.models:
+        report["models"][spec] = benchmark_model(spec, queries, truth, label_sets, args.k,
+                                                 args.batch_size, args.latency_samples)
+
+    print_report(report)
+    if args.baseline:
+        compare_with_baseline(report, args.baseline)
+    if args.report:
+        os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+        print(f"[OK] Laporan disimpan: {args.report}")
@@ -0,0 +1,214 @@
+"""
+distill_model.py
+Distilasi encoder Lapis 2 ke model yang lebih dangkal untuk CPU.
+
+Lapis 2 hanya memetakan potongan keluhan pendek ke himpunan label med_labels
+yang tertutup, jadi student tidak perlu 12 layer:
+- student = salinan teacher dengan sebagian layer transformer saja (--layers,
+  dipilih merata dari bawah ke atas; layer teratas selalu ikut) dan
+  max_seq_length lebih pendek. Dimensi embedding sama dengan teacher.
+- dilatih dengan MSE terhadap embedding teacher (sentence_transformers
+  losses.MSELoss) pada teks dataset_herbal_masif.csv (generate_dataset.py,
+  prefix "query: ") + dokumen med_labels varian rag (prefix "passage: "),
+  sehingga ruang embedding student tetap sejajar dengan teacher.
+- evaluasi pada query yang TIDAK dipakai latih: akurasi label + latensi
+  encode teacher vs student (fungsi benchmark_models.py).
+
+Bias evaluasi: tanpa --eval-dataset, query evaluasi ditahan dari
+dataset_herbal_masif.csv, yaitu set fine-tuning ./model_herbal_lokal
+(teacher yang disarankan). Query itu tidak dilihat student, tetapi bisa
+jadi sudah dilihat teacher dan berasal dari template yang sama, sehingga
+akurasi teacher (dan selisih student vs teacher) terlalu optimis. Untuk
+perbandingan yang adil, beri --eval-dataset berisi keluhan di luar set
+fine-tuning (kolom text, label); teksnya juga dikeluarkan dari data latih.
+Sumber evaluasi dicatat di laporan (config.eval_source / eval_note).
+
+Jalankan dari folder backend:
+    python scripts/distill_model.py --teacher ./model_herbal_lokal --layers 4 --output ./model_herbal_distil
+
+    # Evaluasi ulang student yang sudah ada, pada query di luar set fine-tuning
+    python scripts/distill_model.py --teacher ./model_herbal_lokal --output ./model_herbal_distil --eval-only \
+        --eval-dataset datasets/keluhan_uji.csv
+
+Jika hasilnya diterima, pakai student untuk index DAN query (lalu jalankan
+ulang update_dataset.py agar med_labels di-embed dengan model yang sama):
+    EMBEDDING_MODEL_NAME=./model_herbal_distil
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from benchmark_models import benchmark_model, load_label_sets, print_report
+
+DEFAULT_TEACHER = "intfloat/multilingual-e5-small"
+
+
+def read_pairs(path: str) -> pd.DataFrame:
+    """Baca CSV (kolom text, label); teks di-lowercase seperti query di main.py."""
+    df = pd.read_csv(path).dropna(subset=["text", "label"])
+    df["text"]  = df["text"].astype(str).str.strip().str.lower()
+    df["label"] = df["label"].astype(str).str.strip()
+    return df
+
+
+def split_dataset(dataset_path: str, eval_size: int, seed: int, eval_path: str = None):
+    """
+    Pisahkan query evaluasi dari teks latih. Split per teks unik (bukan per
+    baris) agar kalimat yang sama tidak muncul di kedua sisi. Dengan
+    `eval_path`, query evaluasi diambil dari file itu (maks. `eval_size` teks
+    unik) dan teks yang sama dibuang dari data latih.
+    """
+    df = read_pairs(dataset_path)
+    texts = df["text"].drop_duplicates().sample(frac=1, random_state=seed).tolist()
+    if eval_path:
+        eval_df = read_pairs(eval_path).drop_duplicates(subset=["text"])
+        held_out = eval_df.sample(frac=1, random_state=seed).head(eval_size)
+        eval_texts = set(held_out["text"])
+    else:
+        eval_texts = set(texts[:eval_size])
+        held_out = df[df["text"].isin(eval_texts)].drop_duplicates(subset=["text"])
+    train    = [t for t in texts if t not in eval_texts]
+    return train, held_out["text"].tolist(), held_out["label"].tolist()
+
+
+def truncate_layers(model, n_layers: int) -> list:
+    """Sisakan `n_layers` layer transformer (indeks merata, termasuk layer pertama & terakhir)."""
+    import torch
+
+    auto = model[0].auto_model
+    layers = auto.encoder.layer
+    if n_layers >= len(layers):
+        raise ValueError(f"--layers {n_layers} harus < jumlah layer teacher ({len(layers)})")
+    keep = sorted({int(round(i)) for i in np.linspace(0, len(layers) - 1, n_layers)})
+    auto.encoder.layer = torch.nn.ModuleList([layers[i] for i in keep])
+    auto.config.num_hidden_layers = len(keep)
+    return keep
+
+
+def distill(teacher_name: str, output_dir: str, train_texts: list, n_layers: int, epochs: int,
+            batch_size: int, lr: float, max_seq_length: int) -> dict:
+    from sentence_transformers import InputExample, SentenceTransformer, losses
+    from torch.utils.data import DataLoader
+
+    print(f"[1/3] Embedding teacher ({teacher_name}) untuk {len(train_texts)} teks latih...")
+    teacher = SentenceTransformer(teacher_name, device="cpu")
+    t0 = time.perf_counter()
+    targets = teacher.encode(train_texts, batch_size=batch_size, normalize_embeddings=True,
+                             show_progress_bar=True, convert_to_numpy=True)
+    print(f"[OK] {time.perf_counter() - t0:.1f}s")
+
+    # Student = teacher yang dipangkas; bobot layer tersisa jadi titik awal yang baik
+    student = SentenceTransformer(teacher_name, device="cpu")
+    keep = truncate_layers(student, n_layers)
+    student.max_seq_length = max_seq_length
+    print(f"[2/3] Latih student: layer {keep} dari {teacher[0].auto_model.config.num_hidden_layers}, "
+          f"max_seq_length={max_seq_length}, {epochs} epoch")
+
+    examples = [InputExample(texts=[t], label=v) for t, v in zip(train_texts, targets)]
+    loader = DataLoader(examples, shuffle=True, batch_size=batch_size)
+    t0 = time.perf_counter()
+    student.fit(
+        train_objectives=[(loader, losses.MSELoss(model=student))],
+        epochs=epochs, warmup_steps=int(0.1 * len(loader) * epochs),
+        optimizer_params={"lr": lr}, show_progress_bar=True,
+    )
+    train_s = time.perf_counter() - t0
+    student.save(output_dir)
+    print(f"[OK] Student disimpan: {output_dir} ({train_s:.1f}s latih)")
+    return {"layers_kept": keep, "train_texts": len(train_texts), "train_s": round(train_s, 1)}
+
+
+def compare(report: dict, teacher: str, student: str):
+    t, s = report["models"][teacher], report["models"][student]
+    print("\nStudent vs teacher:")
+    for key in ("query_encode_p50_ms", "query_encode_p95_ms", "query_encode_batch_qps"):
+        if t[key] and s[key]:
+            print(f"   {key}: {t[key]} → {s[key]} (x{s[key] / t[key]:.2f})")
+    for variant, v in s["variants"].items():
+        tv = t["variants"][variant]
+        for key in ("top1_accuracy", "accepted_recall", "acceptance_rate"):
+            print(f"   [{variant}] {key}: {tv[key]:.2%} → {v[key]:.2%} ({(v[key] - tv[key]) * 100:+.2f} poin)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distilasi encoder Lapis 2 ke student yang lebih dangkal + evaluasi vs teacher")
+    parser.add_argument("--teacher", default=DEFAULT_TEACHER, help="nama HF atau ./model_herbal_lokal")
+    parser.add_argument("--output", default="./model_herbal_distil", help="folder SentenceTransformer student")
+    parser.add_argument("--layers", type=int, default=4, help="jumlah layer transformer student")
+    parser.add_argument("--dataset", default="dataset_herbal_masif.csv", help="teks latih + query evaluasi (kolom text, label)")
+    parser.add_argument("--eval-dataset", default=None,
+                        help="query evaluasi dari file terpisah (kolom text, label), di luar set fine-tuning teacher; "
+                             "default: ditahan dari --dataset")
+    parser.add_argument("--eval-size", type=int, default=1000, help="jumlah teks unik yang ditahan untuk evaluasi")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--max-seq-length", type=int, default=64, help="keluhan & label pendek; token sisanya dipotong")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--k", type=int, default=5, help="k untuk akurasi top-k")
+    parser.add_argument("--latency-samples", type=int, default=200, help="jumlah query untuk latensi per query tunggal")
+    parser.add_argument("--eval-only", action="store_true", help="lewati latih, evaluasi student yang sudah ada di --output")
+    parser.add_argument("--report", default=None, help="default: <output>/distill_report.json")
+    args = parser.parse_args()
+
+    os.chdir(BACKEND_DIR)   # path relatif (dataset, model lokal) sama seperti script lain
+    train, queries, truth = split_dataset(args.dataset, args.eval_size, args.seed, args.eval_dataset)
+    if args.eval_dataset:
+        eval_source = args.eval_dataset
+        eval_note = "query evaluasi dari file terpisah; teks yang sama dibuang dari data latih"
+    else:
+        eval_source = f"holdout:{args.dataset}"
+        eval_note = (f"query evaluasi ditahan dari {args.dataset}; jika teacher di-fine-tune pada dataset "
+                     "ini (mis. ./model_herbal_lokal) akurasi teacher terlalu optimis, pakai --eval-dataset")
+        print(f"[INFO] {eval_note}")
+    label_sets = load_label_sets(truth)
+    # Student juga harus meng-embed sisi dokumen (med_labels), bukan hanya query
+    passages = sorted({f"passage: {doc}" for doc, _ in label_sets["rag"]})
+    train_texts = [f"query: {t}" for t in train] + passages
+    print(f"[INFO] {len(train)} query latih + {len(passages)} dokumen label, {len(queries)} query evaluasi")
+
+    distill_info = {}
+    if not args.eval_only:
+        distill_info = distill(args.teacher, args.output, train_texts, args.layers, args.epochs,
+                               args.batch_size, args.lr, args.max_seq_length)
+    elif not os.path.isdir(args.output):
+        print(f"[GAGAL] Student tidak ditemukan: {args.output}")
+        sys.exit(1)
+
+    print(f"[3/3] Evaluasi teacher vs student ({len(queries)} query yang tidak dilatih)...")
+    report = {
+        "config": {
+            "teacher": args.teacher,
+            "student": args.output,
+            "layers": args.layers,
+            "max_seq_length": args.max_seq_length,
+            "dataset": args.dataset,
+            "eval_source": eval_source,
+            "eval_note": eval_note,
+            "queries": len(queries),
+            "k": args.k,
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            **distill_info,
+        },
+        "models": {},
+    }
+    for spec in (args.teacher, args.output):
+        report["models"][spec] = benchmark_model(spec, queries, truth, label_sets, args.k,
+                                                 args.batch_size, args.latency_samples)
+
+    print_report(report)
+    compare(report, args.teacher, args.output)
+    report_path = args.report or os.path.join(args.output, "distill_report.json")
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+    print(f"[OK] Laporan disimpan: {report_path}")
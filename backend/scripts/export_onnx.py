@@ -0,0 +1,155 @@
+"""
+export_onnx.py
+Export encoder embedding (model dasar atau ./model_herbal_lokal) ke graph ONNX,
+kuantisasi dinamis int8, lalu cek paritas terhadap embedding PyTorch.
+
+Jalankan dari folder backend:
+    python scripts/export_onnx.py --model intfloat/multilingual-e5-small --output ./onnx_model
+
+Setelah paritas OK, aktifkan di .env:
+    EMBEDDING_BACKEND=onnx
+    ONNX_MODEL_PATH=./onnx_model
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from encoder_backends import OnnxEncoder
+
+ACCEPT_THRESHOLD = 88.0   # sama dengan ambang Lapis 2 di main.py
+
+# Dipakai jika dataset_herbal_masif.csv (generate_dataset.py) belum ada
+FALLBACK_QUERIES = ["badan panas", "berat badan berlebohan", "bentolan bernanah di kaki", "batuk berdahak", "nyeri haid"]
+FALLBACK_LABELS  = ["Demam", "Bisul", "Obesitas", "Batuk", "Gula darah tinggi", "Asam Urat", "Nyeri haid"]
+
+
+def export_onnx(model_name: str, output_dir: str, opset: int = 17) -> str:
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    print(f"[1/3] Export '{model_name}' ke ONNX (opset {opset})...")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+
+    sample = tokenizer(["query: contoh keluhan pasien"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    dynamic_axes = {n: {0: "batch", 1: "sequence"} for n in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    onnx_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[n] for n in input_names), onnx_path,
+            input_names=input_names, output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes, opset_version=opset, do_constant_folding=True,
+        )
+    print(f"[OK] {onnx_path} ({os.path.getsize(onnx_path) / 1e6:.1f} MB)")
+    return onnx_path
+
+
+def quantize_int8(onnx_path: str) -> str:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print("[2/3] Kuantisasi dinamis int8...")
+    quant_path = os.path.join(os.path.dirname(onnx_path), "model_quantized.onnx")
+    quantize_dynamic(onnx_path, quant_path, weight_type=QuantType.QInt8)
+    print(f"[OK] {quant_path} ({os.path.getsize(quant_path) / 1e6:.1f} MB)")
+    return quant_path
+
+
+def load_parity_texts(dataset_path: str, limit: int):
+    if os.path.exists(dataset_path):
+        df = pd.read_csv(dataset_path).dropna()
+        labels  = sorted(df["label"].astype(str).str.strip().unique().tolist())
+        queries = df["text"].astype(str).sample(n=min(limit, len(df)), random_state=42).tolist()
+        return queries, labels
+    print(f"[INFO] {dataset_path} tidak ditemukan, pakai contoh bawaan")
+    return FALLBACK_QUERIES, FALLBACK_LABELS
+
+
+def parity_check(model_name: str, onnx_dir: str, onnx_file: str, queries: list, labels: list) -> dict:
+    """
+    Bandingkan embedding PyTorch vs ONNX:
+    - drift cosine per teks (1 - cos(torch, onnx))
+    - selisih skor similarity query→label top-1 (poin persen)
+    - keputusan Lapis 2 yang berubah: label top-1 berbeda atau lolos/tidak
+      lolos ambang 88% berbeda
+    """
+    from sentence_transformers import SentenceTransformer
+
+    print(f"[3/3] Cek paritas ({len(queries)} query, {len(labels)} label)...")
+    torch_model = SentenceTransformer(model_name)
+    onnx_model  = OnnxEncoder(onnx_dir, onnx_file)
+
+    q_texts = [f"query: {q}" for q in queries]
+    l_texts = [f"passage: {l.lower()}" for l in labels]
+
+    t0 = time.time(); q_torch = torch_model.encode(q_texts, normalize_embeddings=True); torch_ms = (time.time() - t0) * 1000
+    t0 = time.time(); q_onnx  = onnx_model.encode(q_texts, normalize_embeddings=True);  onnx_ms  = (time.time() - t0) * 1000
+    l_torch = torch_model.encode(l_texts, normalize_embeddings=True)
+    l_onnx  = onnx_model.encode(l_texts, normalize_embeddings=True)
+
+    drift = 1 - np.sum(q_torch * q_onnx, axis=1)
+    s_torch = q_torch @ l_torch.T * 100
+    s_onnx  = q_onnx  @ l_onnx.T  * 100
+    top_torch, top_onnx = s_torch.argmax(axis=1), s_onnx.argmax(axis=1)
+    best_torch = s_torch[np.arange(len(queries)), top_torch]
+    best_onnx  = s_onnx[np.arange(len(queries)), top_onnx]
+
+    label_flips  = int(np.sum(top_torch != top_onnx))
+    accept_flips = int(np.sum((best_torch >= ACCEPT_THRESHOLD) != (best_onnx >= ACCEPT_THRESHOLD)))
+    report = {
+        "model": model_name,
+        "onnx": os.path.join(onnx_dir, onnx_file),
+        "queries": len(queries),
+        "labels": len(labels),
+        "cosine_drift_mean": float(drift.mean()),
+        "cosine_drift_max": float(drift.max()),
+        "top1_score_delta_mean": float(np.abs(best_torch - best_onnx).mean()),
+        "top1_score_delta_max": float(np.abs(best_torch - best_onnx).max()),
+        "top1_label_flips": label_flips,
+        "accept_threshold": ACCEPT_THRESHOLD,
+        "accept_decision_flips": accept_flips,
+        "encode_ms_torch": round(torch_ms, 2),
+        "encode_ms_onnx": round(onnx_ms, 2),
+        "parity_ok": label_flips == 0 and accept_flips == 0,
+    }
+    print(json.dumps(report, indent=2))
+    if report["parity_ok"]:
+        print("✅ Paritas OK: keputusan Lapis 2 (label & ambang 88%) identik.")
+    else:
+        print("⚠️ Ada keputusan Lapis 2 yang berubah. Jangan ganti backend sebelum dievaluasi.")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export encoder ke ONNX int8 + cek paritas")
+    parser.add_argument("--model", default="intfloat/multilingual-e5-small", help="nama HF atau ./model_herbal_lokal")
+    parser.add_argument("--output", default="./onnx_model")
+    parser.add_argument("--no-quantize", action="store_true", help="pakai graph float32 tanpa kuantisasi")
+    parser.add_argument("--dataset", default="dataset_herbal_masif.csv", help="sumber teks untuk cek paritas")
+    parser.add_argument("--limit", type=int, default=500, help="jumlah query sampel untuk cek paritas")
+    parser.add_argument("--report", default=None, help="simpan laporan paritas (JSON) ke path ini")
+    args = parser.parse_args()
+
+    onnx_path = export_onnx(args.model, args.output)
+    model_file = os.path.basename(onnx_path) if args.no_quantize else os.path.basename(quantize_int8(onnx_path))
+
+    queries, labels = load_parity_texts(args.dataset, args.limit)
+    report = parity_check(args.model, args.output, model_file, queries, labels)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report["parity_ok"] else 1)
@@ -0,0 +1,255 @@
+"""
+load_test.py
+Load test /api/recommend dan /api/recommend_hybrid dengan catatan keluhan
+sintetis berbahasa Indonesia (template + kamus_sinonim dari generate_dataset.py,
+ditambah klausa negasi dan stopword seperti catatan dokter sungguhan).
+
+Dua cara menjalankan (dari folder backend):
+    # In-process: app FastAPI dipanggil langsung lewat ASGI (tanpa uvicorn).
+    # DB_* di .env menunjuk ke Postgres lokal yang sudah di-seed update_dataset.py,
+    # CHROMA_PATH / LABEL_INDEX_PATH ke index yang sudah dibangun.
+    python scripts/load_test.py --modes pure_sbert rag hybrid_rag --concurrency 16 --requests 500
+
+    # HTTP: server yang sudah berjalan (mode = mode aktif server, dibaca dari /api/health)
+    python scripts/load_test.py --url http://127.0.0.1:8000 --concurrency 16 --duration 60
+
+Catatan: in-process hanya mengganti mode snapshot aktif, dan isi med_labels
+(pure vs sinonim) tetap yang terakhir dibangun update_dataset.py. Karena itu
+hanya mode yang cocok dengan isi med_labels snapshot yang diuji
+(knowledge_base.LABEL_CONTENT): snapshot pure_sbert → pure_sbert saja,
+snapshot rag → rag + hybrid_rag. Mode lain dilewati dengan pesan; bangun
+snapshot untuk mode itu lalu jalankan ulang.
+
+Riwayat: in-process memasang DiscardHistoryWriter ke app sehingga
+search_history di Postgres tidak terisi dan journal riwayat tidak disentuh
+(--keep-history untuk ikut mengukur write-behind riwayat). Mode HTTP menulis
+riwayat seperti request biasa: arahkan --url ke server uji dengan DB terpisah.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from generate_dataset import templates, kamus_sinonim, load_unique_labels
+from history_writer import HistoryWriter
+
+MODES = ("pure_sbert", "rag", "hybrid_rag")
+
+# Pembuka/penghubung yang penuh stopword (lihat config/stopwords.json)
+OPENERS = ["", "pasien mengeluhkan ", "px datang dengan keluhan ", "pada pemeriksaan ditemukan ",
+           "seorang pasien mengalami ", "keluhan utama adalah "]
+JOINERS = [", ", " dan ", " serta ", " disertai ", "; ", " juga "]
+NEGATIONS = ["tidak ada {label}", "tanpa {label}", "belum pernah {label}", "tidak mengalami {label}", "bukan {label}"]
+CONDITIONS = ["Tidak ada", "Ibu hamil", "Ibu menyusui", "Anak di bawah lima tahun"]
+
+
+def load_labels() -> list:
+    try:
+        labels = [l for l in load_unique_labels(
+            os.path.join(BACKEND_DIR, "datasets", "Herbal gejala.csv"),
+            os.path.join(BACKEND_DIR, "datasets", "Herbal diagnosis.csv")) if len(l) >= 2]
+        if labels:
+            return labels
+    except FileNotFoundError:
+        pass
+    print("[INFO] datasets/*.csv tidak ditemukan, pakai label dari kamus_sinonim")
+    return list(kamus_sinonim.keys())
+
+
+def complaint_phrase(rng: random.Random, label: str) -> str:
+    synonyms = kamus_sinonim.get(label, [])
+    term = rng.choice(synonyms) if synonyms and rng.random() < 0.5 else label
+    if rng.random() < 0.4:
+        return rng.choice(templates).format(label=term).lower()
+    return term.lower()
+
+
+def synthetic_note(rng: random.Random, labels: list) -> str:
+    parts = [complaint_phrase(rng, l) for l in rng.sample(labels, k=min(len(labels), rng.randint(1, 3)))]
+    if rng.random() < 0.35:
+        parts.insert(rng.randrange(len(parts) + 1), rng.choice(NEGATIONS).format(label=rng.choice(labels).lower()))
+    note = parts[0]
+    for part in parts[1:]:
+        note += rng.choice(JOINERS) + part
+    return rng.choice(OPENERS) + note
+
+
+def build_payloads(rng: random.Random, labels: list, n: int, wallet: str):
+    for _ in range(n):
+        kondisi = [rng.choice(CONDITIONS)]
+        if rng.random() < 0.5:
+            yield "/api/recommend_hybrid", {
+                "wallet_address": wallet, "query_text": synthetic_note(rng, labels),
+                "kondisi": kondisi, "obat_kimia": []
+            }
+        else:
+            picked = rng.sample(labels, k=min(len(labels), rng.randint(1, 3)))
+            split = rng.randint(0, len(picked))
+            yield "/api/recommend", {
+                "wallet_address": wallet, "diagnosis": picked[:split], "gejala": picked[split:],
+                "kondisi": kondisi, "obat_kimia": []
+            }
+
+
+class DiscardHistoryWriter(HistoryWriter):
+    """Pengganti history_writer app in-process: record riwayat dihitung lalu dibuang."""
+
+    def __init__(self):
+        super().__init__()
+        self.discarded = 0
+
+    def start(self, engine, table=None):
+        pass
+
+    def enqueue(self, wallet_address, *args, **kwargs) -> bool:
+        self.discarded += 1
+        return True
+
+    def stop(self):
+        pass
+
+    def status(self) -> dict:
+        return {**super().status(), "discarded": self.discarded}
+
+
+def percentile(sorted_values: list, p: float):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[idx], 2)
+
+
+async def run_load(client: httpx.AsyncClient, payloads: list, concurrency: int, duration: float) -> dict:
+    """
+    Jalankan payload dengan `concurrency` worker. Tanpa `duration`: setiap
+    payload sekali. Dengan `duration`: payload diputar ulang terus sampai
+    `duration` detik lewat (worker tidak berhenti lebih awal).
+    """
+    # Satu iterator bersama; aman karena semua worker berjalan di satu event loop
+    source = itertools.cycle(payloads) if duration else iter(payloads)
+    samples = {}   # endpoint → list (latency_ms, ok)
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def worker():
+        for endpoint, body in source:
+            if deadline and time.perf_counter() > deadline:
+                return
+            t0 = time.perf_counter()
+            try:
+                resp = await client.post(endpoint, json=body)
+                ok = resp.status_code < 400
+            except Exception:
+                ok = False
+            samples.setdefault(endpoint, []).append(((time.perf_counter() - t0) * 1000, ok))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    report = {}
+    for endpoint, rows in sorted(samples.items()):
+        latencies = sorted(ms for ms, _ in rows)
+        errors = sum(1 for _, ok in rows if not ok)
+        report[endpoint] = {
+            "requests":   len(rows),
+            "throughput_rps": round(len(rows) / elapsed, 2) if elapsed else None,
+            "p50_ms":     percentile(latencies, 50),
+            "p95_ms":     percentile(latencies, 95),
+            "p99_ms":     percentile(latencies, 99),
+            "max_ms":     round(latencies[-1], 2) if latencies else None,
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+        }
+    report["_elapsed_s"] = round(elapsed, 2)
+    return report
+
+
+async def run_in_process(modes, payloads, concurrency, duration, keep_history: bool = False) -> dict:
+    os.chdir(BACKEND_DIR)   # path relatif (chroma_db, config, cache) sama seperti uvicorn dari folder backend
+    import main
+    if not keep_history:
+        # Dipasang sebelum lifespan: startup tidak me-replay journal, request tidak mengisi search_history
+        main.history_writer = DiscardHistoryWriter()
+    from knowledge_base import LABEL_CONTENT
+
+    results = {}
+    # ASGITransport tidak mengirim event lifespan; jalankan startup/shutdown app secara eksplisit
+    async with main.app.router.lifespan_context(main.app):
+        snapshot = main.knowledge_snapshots.current
+        if snapshot is None:
+            print("[GAGAL] Snapshot knowledge tidak bisa dibangun (cek DB_* dan config/dataset_version.json)")
+            return results
+        # Mode saat med_labels dibangun; manifest lama tanpa "mode" → mode aktif snapshot
+        built = snapshot.manifest.get("index_mode") or snapshot.mode
+        supported = [m for m in modes if LABEL_CONTENT[m] == LABEL_CONTENT[built]]
+        skipped = [m for m in modes if m not in supported]
+        if skipped:
+            print(f"[INFO] med_labels snapshot {snapshot.version} berisi '{LABEL_CONTENT[built]}' (mode {built}); "
+                  f"mode {', '.join(skipped)} dilewati. Jalankan update_dataset.py dengan mode itu untuk mengujinya.")
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=120) as client:
+            for mode in supported:
+                main.knowledge_snapshots.set_mode(mode)
+                print(f"[RUN] mode={mode} concurrency={concurrency}")
+                results[mode] = await run_load(client, payloads, concurrency, duration)
+    return results
+
+
+async def run_over_http(url, payloads, concurrency, duration) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        health = await client.get("/api/health")
+        mode = health.json().get("mode", "unknown")
+        print(f"[RUN] {url} mode={mode} concurrency={concurrency}")
+        return {mode: await run_load(client, payloads, concurrency, duration)}
+
+
+def print_report(results: dict):
+    print("\n" + "=" * 100)
+    print(f"{'mode':<12} {'endpoint':<24} {'req':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'error':>7}")
+    print("-" * 100)
+    for mode, report in results.items():
+        for endpoint, r in report.items():
+            if endpoint.startswith("_"):
+                continue
+            print(f"{mode:<12} {endpoint:<24} {r['requests']:>6} {r['throughput_rps']:>8} {r['p50_ms']:>9} "
+                  f"{r['p95_ms']:>9} {r['p99_ms']:>9} {r['max_ms']:>9} {r['error_rate']:>7.2%}")
+    print("=" * 100)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test endpoint rekomendasi Herbalyze")
+    parser.add_argument("--url", default=None, help="base URL server; kosong = in-process (ASGI)")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES, help="mode yang diuji (in-process)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="jumlah payload unik per mode")
+    parser.add_argument("--duration", type=float, default=0, help="detik; >0 = putar ulang payload sampai waktu habis")
+    parser.add_argument("--wallet", default="guest_user", help="wallet pengirim (guest_user = tanpa lookup profil)")
+    parser.add_argument("--keep-history", action="store_true",
+                        help="in-process: tetap tulis riwayat ke search_history (default dimatikan)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--report", default=None, help="simpan hasil (JSON) ke path ini")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    payloads = list(build_payloads(rng, load_labels(), args.requests, args.wallet))
+
+    if args.url:
+        results = asyncio.run(run_over_http(args.url, payloads, args.concurrency, args.duration))
+    else:
+        results = asyncio.run(run_in_process(args.modes, payloads, args.concurrency, args.duration,
+                                             keep_history=args.keep_history))
+
+    print_report(results)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[OK] Laporan disimpan: {args.report}")
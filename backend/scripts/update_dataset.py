@@ -6,10 +6,19 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 import os
 import shutil
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 import warnings
 
+# Agar modul backend (text_utils, dst.) bisa di-import saat dijalankan sebagai `python scripts/update_dataset.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_transform import KAMUS_MEDIS_MAPPING, MATCH_KEY_COLUMNS, transform_chunk
+from label_index import export_label_matrix
+from encoder_backends import EMBEDDING_BACKEND, load_encoder
+from embedding_store import EmbeddingStore, text_hash
+from csv_ingest import read_with_fallback, sniff_csv
+from index_pipeline import EncoderPool, stream_into_collection, INDEX_BUILD_BATCH
+
 load_dotenv()
 
 DB_USER     = os.getenv("DB_USER", "postgres")
@@ -20,21 +29,115 @@ DB_NAME     = os.getenv("DB_NAME", "db_herbal_ta")
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 CHROMA_PATH = "./chroma_db"
-
-def read_csv_robust(filepath):
-    encodings = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
-    separators = [',', ';', '\t']
-    for enc in encodings:
-        for sep in separators:
-            try:
-                df_preview = pd.read_csv(filepath, sep=sep, encoding=enc, nrows=5)
-                if len(df_preview.columns) > 1:
-                    df_full = pd.read_csv(filepath, sep=sep, encoding=enc)
-                    print(f"   -> Encoding='{enc}', separator='{sep}', {len(df_full)} baris")
-                    return df_full
-            except Exception:
+LABEL_INDEX_PATH  = os.getenv("LABEL_INDEX_PATH", "./label_index")
+LABEL_INDEX_DTYPE = os.getenv("LABEL_INDEX_DTYPE", "float32")   # float32 | float16
+
+# Snapshot knowledge berversi: setiap run membangun index ke knowledge/<versi>/,
+# lalu manifest config/dataset_version.json ditulis PALING AKHIR. API yang
+# sedang berjalan (knowledge_base.py) menukar snapshot tanpa restart.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KNOWLEDGE_DIR           = os.getenv("KNOWLEDGE_DIR", "./knowledge")
+KNOWLEDGE_KEEP_VERSIONS = int(os.getenv("KNOWLEDGE_KEEP_VERSIONS", "3"))
+
+# Re-embedding inkremental: embedding disimpan per (model, prefix, sha1 teks) di
+# embedding_store.py; koleksi Chroma snapshot baru disalin dari snapshot
+# sebelumnya lalu disinkronkan (id = hash konten) → hanya baris baru/berubah
+# yang di-encode dan ditulis.
+EMBEDDING_MODEL    = os.getenv("EMBEDDING_MODEL_NAME", "intfloat/multilingual-e5-small")   # sama dengan inference_service.py
+EMBEDDING_MODEL_ID = f"{EMBEDDING_MODEL}|{EMBEDDING_BACKEND}"   # ONNX int8 ≠ PyTorch
+EMBEDDING_STORE_MAX_AGE_DAYS = float(os.getenv("EMBEDDING_STORE_MAX_AGE_DAYS", "90"))
+PASSAGE_PREFIX     = "passage: "
+
+# Build index: baris dibaca dari Postgres dengan server-side cursor per
+# INDEX_BUILD_BATCH, di-encode paralel oleh INDEX_BUILD_WORKERS proses dan
+# ditulis ke Chroma sambil batch berikutnya di-encode (index_pipeline.py)
+
+# Seed tabel: CSV dibaca streaming per potongan (csv_ingest.py, CSV_CHUNK_ROWS),
+# di-COPY ke <table>__staging, index + validasi, lalu swap atomik
+STAGING_SUFFIX    = "__staging"
+SEED_LOCK_TIMEOUT = os.getenv("SEED_LOCK_TIMEOUT", "5s")
+
+# Transformasi potongan CSV (rename, explode sinonim, kolom kunci) ada di
+# dataset_transform.py agar bisa dipakai script lain tanpa efek samping modul ini
+
+def index_columns(table, columns):
+    """Kolom yang diberi index btree: "index" (seperti to_sql) + kolom kunci ternormalisasi."""
+    return ["index"] + [k for k in MATCH_KEY_COLUMNS.get(table, {}) if k in columns]
+
+def _sql_type(dtype) -> str:
+    if pd.api.types.is_bool_dtype(dtype):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "BIGINT"
+    if pd.api.types.is_float_dtype(dtype):
+        return "DOUBLE PRECISION"
+    return "TEXT"
+
+def load_staging_table(engine, chunks, table):
+    """
+    Stream potongan DataFrame ke tabel staging <table>__staging lewat COPY
+    (satu COPY per potongan, bukan INSERT per baris), buat index-nya, lalu
+    validasi jumlah baris. Memori = satu potongan. Tabel live tidak disentuh;
+    swap dilakukan swap_staging_tables(). Returns (jumlah baris, kolom).
+    """
+    staging = f"{table}{STAGING_SUFFIX}"
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(f'DROP TABLE IF EXISTS "{staging}"')
+        columns, copy_sql, streamed = None, None, 0
+        for df in chunks:
+            if columns is None:
+                columns = [str(c) for c in df.columns]
+                col_defs = ", ".join(['"index" BIGINT'] + [f'"{c}" {_sql_type(df[c].dtype)}' for c in df.columns])
+                cur.execute(f'CREATE TABLE "{staging}" ({col_defs})')
+                column_list = ", ".join(f'"{c}"' for c in ["index", *columns])
+                copy_sql = f"COPY \"{staging}\" ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+            if df.empty:
                 continue
-    raise ValueError(f"Gagal membaca file {filepath}")
+            buffer = io.StringIO()
+            df[columns].to_csv(buffer, index=True, header=False, na_rep="\\N")
+            buffer.seek(0)
+            cur.copy_expert(copy_sql, buffer)
+            streamed += len(df)
+
+        if not streamed:
+            raise ValueError("CSV tidak berisi baris data; tabel live tidak diganti")
+        for col in index_columns(table, columns):
+            cur.execute(f'CREATE INDEX "ix_{staging}_{col}" ON "{staging}" USING btree ("{col}")')
+        cur.execute(f'SELECT COUNT(*) FROM "{staging}"')
+        loaded = cur.fetchone()[0]
+        if loaded != streamed:
+            raise ValueError(f"jumlah baris staging {loaded} != {streamed} baris CSV")
+        cur.execute(f'ANALYZE "{staging}"')
+        raw.commit()
+        return loaded, columns
+    except Exception:
+        raw.rollback()
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP TABLE IF EXISTS "{staging}"'))
+        raise
+    finally:
+        raw.close()
+
+def swap_staging_tables(engine, tables):
+    """
+    Tukar semua tabel staging ke tempatnya dalam SATU transaksi: pembaca melihat
+    seluruh tabel lama atau seluruh tabel baru, tidak pernah tabel hilang/setengah
+    terisi. lock_timeout mencegah swap mengantre lama di belakang query panjang
+    (dan menahan pembaca lain di belakangnya); jika habis, tabel live utuh.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{SEED_LOCK_TIMEOUT}'"))
+        for table, columns in tables:
+            old = f"{table}__old"
+            conn.execute(text(f'DROP TABLE IF EXISTS "{old}"'))
+            conn.execute(text(f'ALTER TABLE IF EXISTS "{table}" RENAME TO "{old}"'))
+            conn.execute(text(f'ALTER TABLE "{table}{STAGING_SUFFIX}" RENAME TO "{table}"'))
+            conn.execute(text(f'DROP TABLE IF EXISTS "{old}"'))
+            # Nama index ikut tabel lama yang sudah di-drop → nama live bisa dipakai lagi
+            for col in index_columns(table, columns):
+                conn.execute(text(f'ALTER INDEX "ix_{table}{STAGING_SUFFIX}_{col}" RENAME TO "ix_{table}_{col}"'))
 
 def seed_postgresql():
     print("\n" + "="*55)
@@ -94,14 +197,11 @@ def seed_postgresql():
         "Kamus medis": {
             "file": "datasets/Kamus_Medis.csv",
             "table": "kamus_medis",
-            "mapping": {
-                'Nama Diagnosis/Gejala': 'istilah_baku',
-                'Sinonim': 'sinonim_awam'
-            }
+            "mapping": KAMUS_MEDIS_MAPPING
         }
     }
 
-    success_count = 0
+    staged = []   # (tabel, kolom) yang sudah lengkap di staging
     for label, info in files_config.items():
         print(f"\n--- Memproses: {label} ---")
         filepath = info['file']
@@ -111,132 +211,231 @@ def seed_postgresql():
             continue
 
         try:
-            df = read_csv_robust(filepath)
-            df.columns = df.columns.astype(str).str.strip()
-
-            df.columns = ['Nama Herbal' if col == 'Nama Hebal' else col for col in df.columns]
-
-            # Khusus untuk Kamus Medis: Kita perlu memecah sinonim yang dipisahkan newline (\n)
-            if label == "Kamus medis":
-                # Lakukan rename dulu sesuai mapping
-                df = df.rename(columns=info['mapping'])
-                
-                if 'sinonim_awam' in df.columns:
-                    # 1. BERSIHKAN ISTILAH BAKU (PENTING!)
-                    # Ini agar 'Mual ' menjadi 'Mual'
-                    df['istilah_baku'] = df['istilah_baku'].astype(str).str.strip()
-                    
-                    # 2. BERSIHKAN SINONIM
-                    df['sinonim_awam'] = df['sinonim_awam'].astype(str)
-                    
-                    # Pecah kolom sinonim_awam berdasarkan newline menjadi list
-                    df['sinonim_awam'] = df['sinonim_awam'].str.split('\n')
-                    
-                    # Gunakan fungsi explode
-                    df = df.explode('sinonim_awam')
-                    
-                    # Bersihkan spasi di tiap sinonim hasil pecahan
-                    df['sinonim_awam'] = df['sinonim_awam'].str.strip()
-                    
-                    # Hapus baris yang kosong atau "nan"
-                    df = df[~df['sinonim_awam'].isin(["", "nan", "None", "NaN"])]
-            else:
-                # Untuk tabel Herbal Gejala & Diagnosis, bersihkan juga kolom kuncinya
-                df = df.rename(columns=info['mapping'])
-                if 'symptom' in df.columns: df['symptom'] = df['symptom'].astype(str).str.strip().str.title()
-                if 'diagnosis' in df.columns: df['diagnosis'] = df['diagnosis'].astype(str).str.strip().str.title()
-
-            # Filter hanya kolom yang ada di mapping values
-            valid_cols = [c for c in df.columns if c in info['mapping'].values()]
-            df = df[valid_cols]
-            df.fillna("", inplace=True)
-
-            # Masukkan ke database (ganti tabel yang lama)
-            df.to_sql(info['table'], engine, if_exists='replace', index=True, index_label='index')
-            print(f"[OK] {len(df)} baris berhasil masuk ke tabel '{info['table']}'")
-            success_count += 1
+            fmt = sniff_csv(filepath)
+            print(f"   -> Encoding='{fmt['encoding']}', separator='{fmt['sep']}'")
+
+            # Potongan langsung di-COPY ke tabel staging; tabel live tetap dilayani sampai swap.
+            # Dekode gagal di tengah file → staging di-DROP (load_staging_table) dan seluruh
+            # file di-COPY ulang dengan encoding berikutnya.
+            def load(chunks, fmt, info=info, label=label):
+                return load_staging_table(engine, (transform_chunk(chunk, label, info['mapping'], info['table'])
+                                                   for chunk in chunks), info['table'])
+
+            def on_retry(fmt, error):
+                print(f"[INFO] Dekode gagal di tengah file ({error.reason}, byte {error.start}); "
+                      f"ulang dengan encoding='{fmt['encoding']}'")
+
+            t0 = datetime.datetime.now()
+            loaded, columns = read_with_fallback(filepath, load, fmt=fmt, on_retry=on_retry)
+            staged.append((info['table'], columns))
+            print(f"[OK] {loaded} baris di-COPY ke '{info['table']}{STAGING_SUFFIX}' "
+                  f"({(datetime.datetime.now() - t0).total_seconds():.2f} s)")
         except Exception as e:
             print(f"[GAGAL] {label}: {e}")
 
-    print(f"\n[SELESAI] {success_count}/3 tabel berhasil diperbarui di PostgreSQL")
-    return success_count > 0
+    # Swap ditunda sampai index Chroma + matriks label snapshot selesai (publish_snapshot)
+    print(f"\n[SELESAI] {len(staged)}/{len(files_config)} tabel siap di staging PostgreSQL")
+    return staged
+
+def source_tables(staged) -> dict:
+    """Nama tabel yang dibaca rebuild index: staging untuk tabel yang baru di-seed, live untuk sisanya."""
+    return {table: f"{table}{STAGING_SUFFIX}" for table, _ in staged}
+
+def drop_staging_tables(engine, staged):
+    with engine.begin() as conn:
+        for table, _ in staged:
+            conn.execute(text(f'DROP TABLE IF EXISTS "{table}{STAGING_SUFFIX}"'))
 
-def reset_chromadb():
+def publish_snapshot(engine, staged, version: str, mode: str, paths: dict) -> bool:
+    """
+    Tabel DB + index snapshot dipublikasikan bersama: swap staging (satu
+    transaksi) lalu langsung manifest. Dipanggil hanya jika semua index
+    snapshot sudah lengkap; gagal swap → manifest tidak ditulis, tabel live
+    dan snapshot lama tetap berpasangan.
+    """
+    if staged:
+        try:
+            swap_staging_tables(engine, staged)
+            print(f"[OK] Swap atomik: {', '.join(t for t, _ in staged)}")
+        except Exception as e:
+            print(f"[GAGAL] Swap tabel staging: {e} (tabel live tidak berubah)")
+            drop_staging_tables(engine, staged)
+            return False
+    return save_dataset_version(version, mode, paths) is not None
+
+_encoder = None
+_store   = None
+_pool    = None
+
+def get_encoder():
+    """Model dimuat hanya jika ada teks yang belum ada di embedding store."""
+    global _encoder
+    if _encoder is None:
+        print(f"Memuat model embedding ({EMBEDDING_MODEL})...")
+        _encoder = load_encoder(model_name=EMBEDDING_MODEL)
+    return _encoder
+
+def get_embedding_store() -> EmbeddingStore:
+    global _store
+    if _store is None:
+        _store = EmbeddingStore()
+    return _store
+
+def get_encoder_pool() -> EncoderPool:
+    """Satu pool untuk semua koleksi; proses worker baru dibuat saat ada teks yang perlu di-encode."""
+    global _pool
+    if _pool is None:
+        _pool = EncoderPool(EMBEDDING_BACKEND, EMBEDDING_MODEL, get_model=get_encoder)
+    return _pool
+
+def close_encoder_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+def embed_passages(documents: list):
+    """Embedding `passage: <dokumen>`; yang sudah ada di store tidak di-encode ulang."""
+    store = get_embedding_store()
+    before = store.misses
+    embeddings = store.embed(documents, PASSAGE_PREFIX, EMBEDDING_MODEL_ID, get_encoder, show_progress_bar=True)
+    print(f"   Embedding: {len(documents)} teks, {store.misses - before} di-encode baru")
+    return embeddings
+
+def content_ids(namespace: str, documents: list, metadatas: list, seen: dict = None) -> list:
+    """
+    Id stabil dari hash dokumen + metadata. Baris identik diberi nomor urut
+    kemunculan agar id tetap unik tanpa bergantung pada posisi baris di CSV.
+    `seen` dibawa antar batch saat baris dibaca bertahap.
+    """
+    ids, seen = [], ({} if seen is None else seen)
+    for doc, meta in zip(documents, metadatas):
+        h = text_hash(doc + "\x1f" + "\x1f".join(f"{k}={meta[k]}" for k in sorted(meta)))[:20]
+        seen[h] = seen.get(h, 0) + 1
+        ids.append(f"{namespace}_{h}_{seen[h]}")
+    return ids
+
+def stream_query(engine, sql: str, batch_size: int = INDEX_BUILD_BATCH):
+    """Baris hasil `sql` per batch (list of mapping) lewat server-side cursor; tabel tidak dimuat sekaligus."""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(text(sql))
+        yield from result.mappings().partitions(batch_size)
+
+def sync_collection(collection, batches, total: int = None):
+    """
+    Samakan isi koleksi dengan aliran batch (namespace, documents, metadatas):
+    id = hash konten, jadi baris tak berubah dilewati, id yang tidak muncul
+    lagi dihapus.
+    """
+    seen = {}   # namespace → hitungan kemunculan, berlanjut antar batch
+    stats = stream_into_collection(
+        ((content_ids(ns, docs, metas, seen.setdefault(ns, {})), docs, metas) for ns, docs, metas in batches),
+        collection, get_embedding_store(), EMBEDDING_MODEL_ID, PASSAGE_PREFIX, get_encoder_pool(), total=total,
+    )
+    print(f"[OK] {collection.name}: {stats['written']} baru/berubah, {stats['deleted']} dihapus, "
+          f"{stats['unchanged']} tidak berubah ({stats['seconds']} s, {stats['rows_per_s']} baris/s)")
+    return stats
+
+def previous_snapshot_chroma() -> str:
+    """Folder chroma_db snapshot yang sedang dipublikasikan (atau ./chroma_db lama), jika ada."""
+    manifest_path = os.path.join(BACKEND_DIR, "config", "dataset_version.json")
+    try:
+        import json as _j
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            path = _j.load(f).get("chroma_path")
+        if path:
+            path = path if os.path.isabs(path) else os.path.join(BACKEND_DIR, path)
+            if os.path.isdir(path):
+                return path
+    except (OSError, ValueError):
+        pass
+    return CHROMA_PATH if os.path.isdir(CHROMA_PATH) else None
+
+def prepare_snapshot_dir(version: str) -> dict:
+    """Folder snapshot baru knowledge/<versi>/ (chroma_db + label_index). Snapshot lama tidak disentuh."""
     print("\n" + "="*55)
-    print("STEP 3 - HAPUS CHROMADB LAMA")
+    print(f"STEP 3 - SIAPKAN SNAPSHOT {version}")
     print("="*55)
 
-    if os.path.exists(CHROMA_PATH):
+    snapshot_dir = os.path.join(KNOWLEDGE_DIR, version)
+    if os.path.exists(snapshot_dir):
+        # Sisa run yang gagal dengan versi sama; belum pernah dipublikasikan
+        shutil.rmtree(snapshot_dir)
+    os.makedirs(snapshot_dir)
+    paths = {
+        "chroma_path":      os.path.join(snapshot_dir, "chroma_db"),
+        "label_index_path": os.path.join(snapshot_dir, "label_index"),
+    }
+    # Salin koleksi snapshot sebelumnya; rebuild berikutnya hanya menerapkan selisih
+    previous = previous_snapshot_chroma()
+    if previous:
+        shutil.copytree(previous, paths["chroma_path"])
+        print(f"[OK] ChromaDB disalin dari snapshot sebelumnya: {previous}")
+    print(f"[OK] Folder snapshot: {snapshot_dir}")
+    return paths
+
+def prune_old_snapshots(keep: int = KNOWLEDGE_KEEP_VERSIONS, current: str = None):
+    """
+    Hapus snapshot lama, sisakan `keep` versi terbaru. Beberapa versi tetap
+    disimpan karena worker API bisa masih melayani request dengan snapshot lama.
+    """
+    if not os.path.isdir(KNOWLEDGE_DIR):
+        return
+    versions = sorted(d for d in os.listdir(KNOWLEDGE_DIR) if os.path.isdir(os.path.join(KNOWLEDGE_DIR, d)))
+    for version in versions[:-keep] if keep > 0 else []:
+        if version == current:
+            continue
         try:
-            shutil.rmtree(CHROMA_PATH)
-            print(f"[OK] Folder ChromaDB lama dihapus: {CHROMA_PATH}")
+            shutil.rmtree(os.path.join(KNOWLEDGE_DIR, version))
+            print(f"[OK] Snapshot lama dihapus: {version}")
         except Exception as e:
-            print(f"[WARN] Tidak bisa menghapus {CHROMA_PATH}: {e}")
-    else:
-        print(f"[INFO] Folder ChromaDB tidak ditemukan, skip.")
+            print(f"[WARN] Tidak bisa menghapus snapshot {version}: {e}")
 
-def rebuild_chromadb():
+def rebuild_chromadb(chroma_path=CHROMA_PATH, tables=None):
     print("\n" + "="*55)
     print("STEP 4 - REBUILD CHROMADB (DATA HERBAL)")
     print("="*55)
 
     try:
-        from sentence_transformers import SentenceTransformer
         import chromadb
+        t = lambda name: (tables or {}).get(name, name)   # source_tables(): staging yang belum di-swap
 
         engine = create_engine(DATABASE_URL)
         print("[OK] Terhubung ke PostgreSQL")
 
-        df_symp = pd.read_sql_query("SELECT symptom, herbal_name, latin_name, preparation, part_used FROM herbal_symptoms", engine)
-        df_symp.fillna("", inplace=True)
-
-        df_diag = pd.read_sql_query("SELECT diagnosis, herbal_name, latin_name, preparation, part_used FROM herbal_diagnoses", engine)
-        df_diag.fillna("", inplace=True)
-
-        df_cond_preview = pd.read_sql_query("SELECT * FROM herbal_special_conditions LIMIT 1", engine)
+        df_cond_preview = pd.read_sql_query(f'SELECT * FROM "{t("herbal_special_conditions")}" LIMIT 1', engine)
         herbal_col = next((col for col in df_cond_preview.columns if 'herbal' in col.lower() or 'hebal' in col.lower()), None)
 
+        # Bentuk kolom sama untuk ketiga tabel: text = gejala / diagnosis / deskripsi kondisi
+        queries = [
+            f"SELECT symptom AS text, herbal_name, latin_name, preparation, part_used, '' AS special_condition FROM \"{t('herbal_symptoms')}\"",
+            f"SELECT diagnosis AS text, herbal_name, latin_name, preparation, part_used, '' AS special_condition FROM \"{t('herbal_diagnoses')}\"",
+        ]
+        counted = [t("herbal_symptoms"), t("herbal_diagnoses")]
         if herbal_col:
-            select_herbal = f'"{herbal_col}" as herbal_name' if herbal_col != 'herbal_name' else 'herbal_name'
-            df_cond = pd.read_sql_query(f"SELECT {select_herbal}, special_condition, description FROM herbal_special_conditions", engine)
-        else:
-            df_cond = pd.DataFrame(columns=['herbal_name', 'special_condition', 'description'])
-        df_cond.fillna("", inplace=True)
-
-        records = []
-        for _, row in df_symp.iterrows():
-            records.append({"symptom": row.get('symptom',''), "diagnosis": "", "description": "", "herbal_name": row.get('herbal_name',''), "latin_name": row.get('latin_name',''), "preparation": row.get('preparation',''), "part_used": row.get('part_used',''), "special_condition": ""})
-        for _, row in df_diag.iterrows():
-            records.append({"symptom": "", "diagnosis": row.get('diagnosis',''), "description": "", "herbal_name": row.get('herbal_name',''), "latin_name": row.get('latin_name',''), "preparation": row.get('preparation',''), "part_used": row.get('part_used',''), "special_condition": ""})
-        for _, row in df_cond.iterrows():
-            records.append({"symptom": "", "diagnosis": "", "description": row.get('description',''), "herbal_name": row.get('herbal_name',''), "latin_name": "", "preparation": "", "part_used": "", "special_condition": row.get('special_condition','')})
-
-        df = pd.DataFrame(records)
-        df['combined_text'] = df.apply(lambda r: ". ".join(filter(None, [r['symptom'], r['diagnosis'], r['description']])).strip() or r['herbal_name'], axis=1)
-
-        print("Memuat model embedding (intfloat/multilingual-e5-small)...")
-        model = SentenceTransformer('intfloat/multilingual-e5-small')
-        
-        # WAJIB UNTUK MODEL E5: Tambahkan prefix "query: "
-        texts_to_embed = [f"passage: {text}" for text in df['combined_text'].tolist()]
-        
-        print(f"Proses embedding {len(df)} teks... (sabar ya)")
-        embeddings = model.encode(texts_to_embed, show_progress_bar=True).tolist()
-
-        chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+            queries.append(f'SELECT description AS text, "{herbal_col}" AS herbal_name, \'\' AS latin_name, '
+                           f"'' AS preparation, '' AS part_used, special_condition FROM \"{t('herbal_special_conditions')}\"")
+            counted.append(t("herbal_special_conditions"))
+        with engine.connect() as conn:
+            total = sum(conn.execute(text(f'SELECT COUNT(*) FROM "{name}"')).scalar() for name in counted)
+        print(f"[INFO] {total} baris herbal, batch {INDEX_BUILD_BATCH}")
+
+        def batches():
+            for sql in queries:
+                for rows in stream_query(engine, sql):
+                    documents, metadatas = [], []
+                    for row in rows:
+                        row = {k: ("" if v is None else str(v)) for k, v in row.items()}
+                        documents.append(row["text"].strip() or row["herbal_name"])
+                        metadatas.append({k: row[k] for k in ("herbal_name", "latin_name", "preparation",
+                                                              "part_used", "special_condition")})
+                    yield "herbal", documents, metadatas
+
+        chroma_client = chromadb.PersistentClient(path=chroma_path)
         collection = chroma_client.get_or_create_collection(name="herbal_collection", metadata={"hnsw:space": "cosine"})
 
-        documents, metadatas, ids = [], [], []
-        for idx, row in df.iterrows():
-            documents.append(row['combined_text'])
-            metadatas.append({"herbal_name": str(row['herbal_name']), "latin_name": str(row['latin_name']), "preparation": str(row['preparation']), "part_used": str(row['part_used']), "special_condition": str(row['special_condition'])})
-            fmt = str(row['herbal_name']).lower().replace(" ", "_")
-            ids.append(f"herbal_{fmt}_{idx + 1}")
-            
-        batch_size = 500
-        for i in range(0, len(ids), batch_size):
-            collection.add(documents=documents[i:i+batch_size], embeddings=embeddings[i:i+batch_size], metadatas=metadatas[i:i+batch_size], ids=ids[i:i+batch_size])
-            print(f"   Batch {i//batch_size + 1}: {min(i+batch_size, len(ids))}/{len(ids)} tersimpan")
+        # WAJIB UNTUK MODEL E5: prefix "passage: " (ditambahkan di index_pipeline)
+        sync_collection(collection, batches(), total=total)
 
         print(f"[OK] Koleksi herbal_collection berhasil dibangun! Total: {collection.count()}")
         return True
@@ -244,77 +443,112 @@ def rebuild_chromadb():
         print(f"[GAGAL] Rebuild ChromaDB gagal: {e}")
         return False
 
-def rebuild_kamus_medis_chromadb(mode="pure_sbert"):
+def rebuild_kamus_medis_chromadb(mode="pure_sbert", chroma_path=CHROMA_PATH, index_path=LABEL_INDEX_PATH, version=None,
+                                 tables=None):
     """
     mode="pure_sbert" → hanya label dari tabel diagnosis & gejala
     mode="rag"        → label diagnosis & gejala + sinonim dari kamus_medis
+    tables            → source_tables(): baca tabel staging yang belum di-swap
     """
+    t = lambda name: (tables or {}).get(name, name)
     print("\n" + "="*55)
     print(f"STEP 5 - REBUILD MED_LABELS (MODE: {mode.upper()})")
     print("="*55)
     try:
-        from sentence_transformers import SentenceTransformer
         import chromadb
         engine = create_engine(DATABASE_URL)
 
-        # Ambil label baku dari tabel utama (SELALU dipakai di kedua mode)
-        df_dasar = pd.read_sql_query("""
-            SELECT DISTINCT diagnosis as label FROM herbal_diagnoses WHERE diagnosis != ''
+        # Label baku dari tabel utama (SELALU dipakai di kedua mode) + sinonim kamus_medis HANYA jika mode RAG.
+        # Dibaca per batch lewat server-side cursor; teks + metadata tetap dikumpulkan untuk matriks label.
+        label_sql = f"""
+            SELECT DISTINCT diagnosis as label FROM "{t('herbal_diagnoses')}" WHERE diagnosis != ''
             UNION
-            SELECT DISTINCT symptom as label FROM herbal_symptoms WHERE symptom != ''
-        """, engine)
-
-        model = SentenceTransformer('intfloat/multilingual-e5-small')
-        documents, metadatas, ids = [], [], []
-
-        # Daftarkan label baku
-        for idx, label in enumerate(df_dasar['label'].tolist()):
-            documents.append(label.strip().lower())
-            metadatas.append({"baku": label.strip()})
-            ids.append(f"db_{idx}")
-
-        # Tambah sinonim dari kamus_medis HANYA jika mode RAG
+            SELECT DISTINCT symptom as label FROM "{t('herbal_symptoms')}" WHERE symptom != ''
+        """
+        kamus_sql = f'SELECT istilah_baku, sinonim_awam FROM "{t("kamus_medis")}"'
+        with engine.connect() as conn:
+            n_dasar = conn.execute(text(f"SELECT COUNT(*) FROM ({label_sql}) AS labels")).scalar()
+            n_kamus = conn.execute(text(f'SELECT COUNT(*) FROM "{t("kamus_medis")}"')).scalar() if mode == "rag" else 0
         if mode == "rag":
-            df_kamus = pd.read_sql_query(
-                "SELECT istilah_baku, sinonim_awam FROM kamus_medis", engine
-            )
-            for idx, row in df_kamus.iterrows():
-                documents.append(str(row['sinonim_awam']).lower())
-                metadatas.append({"baku": str(row['istilah_baku'])})
-                ids.append(f"syn_{idx}")
-            print(f"[INFO] Mode RAG: {len(df_dasar)} label baku + {len(df_kamus)} sinonim kamus")
+            print(f"[INFO] Mode RAG: {n_dasar} label baku + {n_kamus} sinonim kamus")
         else:
-            print(f"[INFO] Mode Pure SBERT: {len(df_dasar)} label baku saja (tanpa kamus sinonim)")
-
-        texts = [f"passage: {doc}" for doc in documents]
-        embeddings = model.encode(texts, show_progress_bar=True).tolist()
-
-        chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
-        
-        # Hapus collection lama kalau ada, biar fresh
-        try:
-            chroma_client.delete_collection(name="med_labels")
-            print("[OK] Collection med_labels lama dihapus")
-        except:
-            pass
-        
+            print(f"[INFO] Mode Pure SBERT: {n_dasar} label baku saja (tanpa kamus sinonim)")
+
+        documents, metadatas = [], []
+
+        # Id per jenis dokumen: label baku "db_", sinonim "syn_" (ganti mode pure↔rag = hapus/tambah sinonim saja)
+        def batches():
+            for rows in stream_query(engine, label_sql):
+                docs  = [row['label'].strip().lower() for row in rows]
+                metas = [{"baku": row['label'].strip()} for row in rows]
+                documents.extend(docs)
+                metadatas.extend(metas)
+                yield "db", docs, metas
+            if mode != "rag":
+                return
+            for rows in stream_query(engine, kamus_sql):
+                docs  = [str(row['sinonim_awam']).lower() for row in rows]
+                metas = [{"baku": str(row['istilah_baku'])} for row in rows]
+                documents.extend(docs)
+                metadatas.extend(metas)
+                yield "syn", docs, metas
+
+        chroma_client = chromadb.PersistentClient(path=chroma_path)
         collection = chroma_client.get_or_create_collection(
             name="med_labels", 
             metadata={"hnsw:space": "cosine"}
         )
-        collection.add(
-            documents=documents, 
-            embeddings=embeddings, 
-            metadatas=metadatas, 
-            ids=ids
-        )
+        sync_collection(collection, batches(), total=n_dasar + n_kamus)
+        # Matriks NumPy butuh semua embedding; setelah sync semuanya sudah ada di store
+        embeddings = embed_passages(documents)
 
         print(f"[OK] med_labels berhasil dibangun: {collection.count()} entri.")
+
+        # Export matriks yang sama untuk backend NumPy (LABEL_INDEX_BACKEND=numpy)
+        export_label_matrix(
+            embeddings, documents, [m["baku"] for m in metadatas],
+            index_path=index_path, dtype=LABEL_INDEX_DTYPE,
+            extra_meta={
+                "model": EMBEDDING_MODEL,
+                "encoder": EMBEDDING_BACKEND,
+                "mode": mode,
+                "version": version or datetime.datetime.now().strftime("%Y%m%d%H%M%S%f"),
+            }
+        )
+        print(f"[OK] Matriks label ({LABEL_INDEX_DTYPE}) diekspor ke: {index_path}")
         return True
     except Exception as e:
         print(f"[GAGAL] Rebuild Kamus: {e}")
         return False
     
+def save_dataset_version(version: str, mode: str, paths: dict):
+    """
+    Publikasikan snapshot: tulis manifest (versi, mode, path index label) ke
+    config/dataset_version.json secara atomik. Watcher di API
+    (knowledge_base.py) lalu membangun snapshot baru dan menukarnya.
+    """
+    config_dir = os.path.join(BACKEND_DIR, "config")
+    os.makedirs(config_dir, exist_ok=True)
+    config_path = os.path.join(config_dir, "dataset_version.json")
+
+    try:
+        tmp_path = f"{config_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            import json as _j
+            _j.dump({
+                "version": version,
+                "mode": mode,
+                # Relatif terhadap folder backend (dibaca knowledge_base.read_manifest)
+                **{k: os.path.relpath(os.path.abspath(p), BACKEND_DIR) for k, p in paths.items()},
+                "updated_at": datetime.datetime.now().isoformat()
+            }, f, indent=2)
+        os.replace(tmp_path, config_path)
+        print(f"[OK] Versi dataset disimpan ke: {config_path}")
+        return config_path
+    except Exception as e:
+        print(f"[GAGAL] Gagal menyimpan dataset_version.json: {e}")
+        return None
+
 def save_active_mode(mode: str):
     """Simpan mode aktif ke config agar main.py bisa membacanya."""
     config_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config")
@@ -322,13 +556,15 @@ def save_active_mode(mode: str):
     config_path = os.path.join(config_dir, "active_mode.json")
     
     try:
-        with open(config_path, "w", encoding="utf-8") as f:
+        tmp_path = f"{config_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             import json as _j
             _j.dump({
                 "mode": mode,
                 "description": "pure_sbert | rag | hybrid_rag",
                 "updated_at": datetime.datetime.now().isoformat()   # ← Pakai datetime.datetime
             }, f, indent=2)
+        os.replace(tmp_path, config_path)   # watcher API tidak pernah membaca file setengah jadi
         
         print(f"[OK] Mode '{mode}' berhasil disimpan ke: {config_path}")
         return config_path
@@ -348,22 +584,36 @@ if __name__ == "__main__":
 
     print(f"\n🔧 Mode aktif: {ACTIVE_MODE.upper()}")
 
-    if not seed_postgresql():
+    # Tabel baru hanya di staging; tabel live + snapshot lama tetap dilayani sampai publish_snapshot
+    staged = seed_postgresql()
+    if not staged:
         sys.exit(1)
+    engine = create_engine(DATABASE_URL)
+    tables = source_tables(staged)
 
-    reset_chromadb()
-    ok_herbal = rebuild_chromadb()
+    version = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+    paths = prepare_snapshot_dir(version)
+    ok_herbal = rebuild_chromadb(chroma_path=paths["chroma_path"], tables=tables)
 
     # Tentukan isi ChromaDB med_labels
-    if ACTIVE_MODE == "pure_sbert":
-        ok_kamus = rebuild_kamus_medis_chromadb(mode="pure_sbert")
-    else:
-        ok_kamus = rebuild_kamus_medis_chromadb(mode="rag")   # rag & hybrid_rag pakai sinonim
+    label_mode = "pure_sbert" if ACTIVE_MODE == "pure_sbert" else "rag"   # rag & hybrid_rag pakai sinonim
+    ok_kamus = rebuild_kamus_medis_chromadb(mode=label_mode, chroma_path=paths["chroma_path"],
+                                            index_path=paths["label_index_path"], version=version, tables=tables)
+
+    close_encoder_pool()
 
-    if ok_herbal and ok_kamus:
+    if not (ok_herbal and ok_kamus):
+        drop_staging_tables(engine, staged)
+    if ok_herbal and ok_kamus and publish_snapshot(engine, staged, version, ACTIVE_MODE, paths):
+        # Tabel DB + manifest dipublikasikan setelah semua index lengkap: API tidak pernah
+        # memasangkan tabel baru dengan index lama
         saved_path = save_active_mode(ACTIVE_MODE)
+        prune_old_snapshots(current=version)
+        store = get_embedding_store()
+        pruned = store.prune(EMBEDDING_STORE_MAX_AGE_DAYS)
+        print(f"[OK] Embedding store: {store.stats()} ({pruned} entri kedaluwarsa dihapus)")
         
-        print(f"\n✅ SELESAI! Mode {ACTIVE_MODE} aktif.")
+        print(f"\n✅ SELESAI! Mode {ACTIVE_MODE} aktif (snapshot {version}).")
         
         if saved_path and os.path.exists(saved_path):
             print(f"[DEBUG] Config path: {saved_path}")
@@ -376,4 +626,5 @@ if __name__ == "__main__":
         else:
             print("[WARN] save_active_mode gagal atau path tidak valid")
     else:
-        print("\n⚠️ Selesai dengan catatan error.")
\ No newline at end of file
+        print(f"\n⚠️ Selesai dengan catatan error. Snapshot {version} tidak dipublikasikan; "
+              f"tabel live & snapshot lama tetap dipakai API.")
\ No newline at end of file
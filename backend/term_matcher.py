@@ -0,0 +1,123 @@
+"""
+term_matcher.py
+Pencocok kamus multi-pola (Aho-Corasick tingkat token) untuk Lapis 1
+/api/recommend_hybrid. Pola = semua label diagnosis/gejala + sinonim_awam
+kamus_medis (→ istilah_baku), dibangun sekali per snapshot knowledge
+(knowledge_base.py).
+
+Satu kali scan per chunk, linear terhadap jumlah kata: semua istilah yang
+dikenal ditemukan sekaligus (leftmost-longest, tidak tumpang tindih), dan
+hanya sisa kata yang tidak tertutup istilah mana pun dikirim ke Lapis 2.
+
+Token dinormalisasi dengan normalize_text_key per kata, sehingga tanda baca
+di dalam kata ("buang-air", "alzheimer's") diperlakukan sama seperti
+pembersihan chunk di main.py.
+"""
+
+from collections import deque, namedtuple
+
+from text_utils import normalize_text_key
+
+# start/end = indeks kata di chunk (end eksklusif); text = kata aslinya
+TermMatch = namedtuple("TermMatch", "start end text label source")
+
+
+def term_tokens(text: str) -> list:
+    return [t for t in (normalize_text_key(w) for w in str(text or "").split()) if t]
+
+
+class TermMatcher:
+    """Automaton read-only setelah compile(); aman dipakai bersama antar request."""
+
+    def __init__(self):
+        self._goto = [{}]      # state → {token: state}
+        self._fail = [0]
+        self._out  = [None]    # state → (jumlah token, label, source) pola yang berakhir di state ini
+        self._link = [0]       # state → state akhiran terdekat yang punya output (0 = tidak ada)
+        self.patterns = 0
+
+    def add(self, text: str, label: str, source: str) -> bool:
+        """Daftarkan pola. Pola pertama untuk urutan token yang sama dipertahankan."""
+        tokens = term_tokens(text)
+        if not tokens:
+            return False
+        state = 0
+        for token in tokens:
+            nxt = self._goto[state].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][token] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(None)
+                self._link.append(0)
+            state = nxt
+        if self._out[state] is not None:
+            return False
+        self._out[state] = (len(tokens), label, source)
+        self.patterns += 1
+        return True
+
+    def compile(self) -> "TermMatcher":
+        """Hitung failure link + output link (BFS)."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and token not in self._goto[f]:
+                    f = self._fail[f]
+                fallback = self._goto[f].get(token, 0)
+                self._fail[nxt] = fallback if fallback != nxt else 0
+                self._link[nxt] = fallback if self._out[fallback] is not None else self._link[fallback]
+        return self
+
+    @classmethod
+    def build(cls, labels, synonyms) -> "TermMatcher":
+        """
+        labels   : iterable label baku (teks asli)
+        synonyms : iterable (sinonim_awam, istilah_baku)
+        Label didaftarkan lebih dulu: jika sinonim sama persis dengan sebuah
+        label, label itu yang dipakai.
+        """
+        matcher = cls()
+        for label in labels:
+            matcher.add(label, label, "label")
+        for sinonim, baku in synonyms:
+            matcher.add(sinonim, baku, "sinonim")
+        return matcher.compile()
+
+    def find(self, words: list) -> list:
+        """Semua istilah di `words` (list kata), leftmost-longest tanpa tumpang tindih."""
+        tokens = [normalize_text_key(w) for w in words]
+        found, state = [], 0
+        for end, token in enumerate(tokens, start=1):
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            s = state if self._out[state] is not None else self._link[state]
+            while s:
+                length, label, source = self._out[s]
+                found.append((end - length, end, label, source))
+                s = self._link[s]
+
+        matches, covered = [], 0
+        for start, end, label, source in sorted(found, key=lambda m: (m[0], m[0] - m[1])):
+            if start >= covered:
+                matches.append(TermMatch(start, end, " ".join(words[start:end]), label, source))
+                covered = end
+        return matches
+
+    def scan(self, words: list):
+        """
+        Returns (matches, residue): residue = potongan kata berurutan yang
+        tidak tertutup istilah mana pun (urutan dipertahankan).
+        """
+        matches = self.find(words)
+        residue, pos = [], 0
+        for m in matches + [TermMatch(len(words), len(words), "", None, None)]:
+            if m.start > pos:
+                residue.append(words[pos:m.start])
+            pos = m.end
+        return matches, residue
@@ -0,0 +1,62 @@
+"""
+conftest.py
+Fixture bersama unit test backend. Jalankan dari folder backend:
+    python -m pytest tests
+
+Tabel herbal di-seed ke SQLite in-memory dengan kolom yang sama seperti hasil
+scripts/update_dataset.py (tanpa kolom kunci *_key, sehingga jalur
+normalisasi di Python ikut teruji), jadi tidak butuh Postgres.
+"""
+
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge_base import KnowledgeBase  # noqa: E402
+
+DETAIL_COLUMNS = "latin_name TEXT, image_url TEXT, preparation TEXT, part_used TEXT, " \
+                 "part_image_url TEXT, source_label TEXT, source TEXT"
+
+SEED = [
+    "INSERT INTO herbal_diagnoses VALUES "
+    "(0, 'Demam', 'Sambiloto\nAndrographis (daun)', 'Andrographis paniculata', 'i', 'p', 'd', 'pi', 'sl', 's'),"
+    "(1, 'Obesitas', 'Jahe\nZingiber', 'Zingiber officinale', '', '', '', '', '', ''),"
+    "(2, 'Demam', 'Jahe\nZingiber', 'Zingiber officinale', '', '', '', '', '', '')",
+    "INSERT INTO herbal_symptoms VALUES "
+    "(0, 'Batuk', 'Kencur', 'Kaempferia galanga', '', '', '', '', '', ''),"
+    "(1, 'Demam', 'Kunyit', 'Curcuma longa', '', '', '', '', '', ''),"
+    "(2, 'Sakit Kepala', 'Kunyit', 'Curcuma longa', '', '', '', '', '', '')",
+    "INSERT INTO herbal_special_conditions VALUES "
+    "(0, 'Sambiloto', '', 'Hamil', 'Abortif.', 'Ref A'),"
+    "(1, 'Nama Lain', 'Zingiber officinale', 'Menyusui', 'Hati-hati.', 'Ref B'),"
+    "(2, 'Jahe', '', 'Hamil', 'Panas.', 'Ref C')",
+    "INSERT INTO kamus_medis VALUES "
+    "(0, 'Obesitas', 'berat badan berlebihan'), (1, 'Demam', 'meriang'), (2, 'Sakit Kepala', 'pusing')",
+]
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE TABLE herbal_diagnoses ("index" INTEGER, diagnosis TEXT, herbal_name TEXT, {DETAIL_COLUMNS})'))
+        conn.execute(text(f'CREATE TABLE herbal_symptoms ("index" INTEGER, symptom TEXT, herbal_name TEXT, {DETAIL_COLUMNS})'))
+        conn.execute(text('CREATE TABLE herbal_special_conditions ("index" INTEGER, herbal_name TEXT, latin_name TEXT, '
+                          'special_condition TEXT, description TEXT, reference TEXT)'))
+        conn.execute(text('CREATE TABLE kamus_medis ("index" INTEGER, istilah_baku TEXT, sinonim_awam TEXT)'))
+        for statement in SEED:
+            conn.execute(text(statement))
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture
+def kb(db):
+    return KnowledgeBase.build(db, "test")
@@ -0,0 +1,29 @@
+from csv_ingest import iter_csv, read_with_fallback, sniff_csv
+
+
+def test_sniff_detects_semicolon_and_bom(tmp_path):
+    path = tmp_path / "kamus.csv"
+    path.write_bytes("Nama Diagnosis/Gejala;Sinonim\nDemam;meriang\n".encode("utf-8-sig"))
+    assert sniff_csv(str(path)) == {"encoding": "utf-8-sig", "sep": ";"}
+    (chunk,) = list(iter_csv(str(path)))
+    assert list(chunk.columns) == ["Nama Diagnosis/Gejala", "Sinonim"]
+
+
+def test_invalid_bytes_after_sample_retry_whole_file(tmp_path):
+    # Sampel awal valid utf-8, byte cp1252 baru muncul setelah batas sampel
+    path = tmp_path / "gejala.csv"
+    rows = "".join(f"Gejala {i},Herbal {i}\n" for i in range(200))
+    path.write_bytes(b"symptom,herbal\n" + rows.encode("ascii") + "Demam,Jahe – merah\n".encode("cp1252"))
+    fmt = sniff_csv(str(path), sample_bytes=64)
+    assert fmt["encoding"] == "utf-8"
+
+    attempts, retries = [], []
+
+    def consume(chunks, fmt):
+        attempts.append(fmt["encoding"])
+        return [row for chunk in chunks for row in chunk["herbal"]]
+
+    herbs = read_with_fallback(str(path), consume, fmt=fmt, on_retry=lambda f, e: retries.append(f["encoding"]))
+    assert attempts == ["utf-8", "cp1252"]
+    assert retries == ["cp1252"]
+    assert len(herbs) == 201 and herbs[-1] == "Jahe – merah"
@@ -0,0 +1,60 @@
+from embedding_cache import LabelResolutionCache
+
+
+def make_cache(tmp_path, max_size=3):
+    return LabelResolutionCache(max_size=max_size, path=str(tmp_path / "label_cache.pkl"), snapshot_interval=0)
+
+
+def test_lru_evicts_least_recently_used(tmp_path):
+    cache = make_cache(tmp_path, max_size=2)
+    cache.put("demam", "v1", [0.1], "Demam", 95.0)
+    cache.put("batuk", "v1", [0.2], "Batuk", 91.0)
+    assert cache.get("demam", "v1")["baku"] == "Demam"   # demam jadi paling baru
+    cache.put("pusing", "v1", [0.3], "Sakit Kepala", 89.0)
+
+    assert cache.get("batuk", "v1") is None
+    assert cache.get("demam", "v1") is not None
+    assert cache.get("pusing", "v1") is not None
+    stats = cache.stats()
+    assert (stats["size"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+
+
+def test_key_is_normalized_chunk_and_version(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("Badan  Panas", "model-a|v1", [0.1], "Demam", 92.0)
+    assert cache.get(" badan panas ", "model-a|v1")["similarity"] == 92.0
+    assert cache.get("badan panas", "model-a|v2") is None
+
+
+def test_snapshot_roundtrip_drops_other_versions(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("demam", "v1", [0.1], "Demam", 95.0)
+    cache.put("batuk", "v2", [0.2], "Batuk", 91.0)
+    assert cache.save()
+
+    warm = make_cache(tmp_path)
+    assert warm.load("v2") == 1
+    assert warm.get("batuk", "v2")["baku"] == "Batuk"
+    assert warm.get("demam", "v1") is None
+
+
+def test_snapshots_from_two_workers_are_merged(tmp_path):
+    worker_a, worker_b = make_cache(tmp_path), make_cache(tmp_path)
+    worker_a.put("demam", "v1", [0.1], "Demam", 95.0)
+    worker_b.put("batuk", "v1", [0.2], "Batuk", 91.0)
+    worker_b.put("demam", "v1", [0.9], "Demam Tinggi", 90.0)
+    assert worker_a.save() and worker_b.save()
+
+    warm = make_cache(tmp_path)
+    assert warm.load("v1") == 2
+    assert warm.get("demam", "v1")["baku"] == "Demam Tinggi"   # snapshot terakhir menang per key
+    assert warm.get("batuk", "v1")["baku"] == "Batuk"
+
+
+def test_unreadable_snapshot_is_ignored_and_replaced(tmp_path):
+    (tmp_path / "label_cache.pkl").write_bytes(b"bukan pickle")
+    cache = make_cache(tmp_path)
+    assert cache.load("v1") == 0
+    cache.put("demam", "v1", [0.1], "Demam", 95.0)
+    assert cache.save()
+    assert make_cache(tmp_path).load("v1") == 1
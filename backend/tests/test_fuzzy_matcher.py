@@ -0,0 +1,46 @@
+import pytest
+
+from fuzzy_matcher import FuzzyMatcher, bounded_levenshtein
+
+
+@pytest.mark.parametrize("a, b, limit, expected", [
+    ("demam", "demam", 2, 0),
+    ("kitten", "sitting", 3, 3),
+    ("kitten", "sitting", 2, 3),        # lewat batas → limit + 1
+    ("batuk", "batuk berdahak", 2, 3),  # selisih panjang > batas
+    ("", "ab", 2, 2),
+    ("berlebohan", "berlebihan", 1, 1),
+])
+def test_bounded_levenshtein(a, b, limit, expected):
+    assert bounded_levenshtein(a, b, limit) == expected
+    assert bounded_levenshtein(b, a, limit) == expected
+
+
+def test_typo_resolves_to_synonym_label():
+    matcher = FuzzyMatcher.build(["Obesitas"], [("berat badan berlebihan", "Obesitas")])
+    hit = matcher.match("berat badan berlebohan")
+    assert (hit.term, hit.label, hit.source, hit.distance) == ("berat badan berlebihan", "Obesitas", "sinonim", 1)
+
+
+def test_exact_key_returns_distance_zero():
+    matcher = FuzzyMatcher.build(["Sakit Kepala"], [])
+    hit = matcher.match("sakit-kepala")
+    assert (hit.label, hit.distance) == ("Sakit Kepala", 0)
+
+
+def test_ambiguous_best_distance_is_rejected():
+    matcher = FuzzyMatcher.build([], [("batuk kerax", "Batuk Kering"), ("batuk kerat", "Batuk Berdahak")])
+    assert matcher.match("batuk keras") is None
+
+
+def test_same_label_at_same_distance_is_not_ambiguous():
+    matcher = FuzzyMatcher.build([], [("batuk kerax", "Batuk"), ("batuk kerat", "batuk")])
+    hit = matcher.match("batuk keras")
+    assert hit is not None and hit.distance == 1
+
+
+def test_short_keys_and_distant_terms_are_not_matched():
+    matcher = FuzzyMatcher.build(["Flu", "Demam Berdarah"], [])
+    assert matcher.size == 1   # "flu" di bawah FUZZY_MIN_LENGTH
+    assert matcher.match("flu") is None
+    assert matcher.match("diare berdarah") is None
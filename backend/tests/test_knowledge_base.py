@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from knowledge_base import CHROMA_PATH, DEFAULT_MODE, read_manifest
+
+
+@pytest.fixture
+def config(tmp_path):
+    config_dir = tmp_path / "config"
+    config_dir.mkdir()
+
+    def write(manifest=None, active=None):
+        if manifest is not None:
+            (config_dir / "dataset_version.json").write_text(json.dumps(manifest), encoding="utf-8")
+        if active is not None:
+            (config_dir / "active_mode.json").write_text(json.dumps(active), encoding="utf-8")
+        return read_manifest(str(config_dir / "dataset_version.json"), str(config_dir / "active_mode.json"))
+    return write
+
+
+def test_missing_manifest_uses_defaults(config):
+    manifest = config()
+    assert manifest["version"] == "unversioned"
+    assert (manifest["mode"], manifest["index_mode"]) == (DEFAULT_MODE, None)
+    assert not manifest["versioned"]
+    assert manifest["chroma_path"] == CHROMA_PATH
+
+
+def test_versioned_paths_resolve_against_backend_dir(config, tmp_path):
+    manifest = config({"version": "v2", "mode": "rag",
+                       "chroma_path": "knowledge/v2/chroma_db", "label_index_path": "knowledge/v2/label_index"})
+    assert manifest["versioned"]
+    assert manifest["chroma_path"] == str(tmp_path / "knowledge" / "v2" / "chroma_db")
+    assert manifest["label_index_path"] == str(tmp_path / "knowledge" / "v2" / "label_index")
+
+
+@pytest.mark.parametrize("index_mode, active, expected", [
+    ("rag", "hybrid_rag", "hybrid_rag"),          # isi med_labels sama → boleh pindah
+    ("hybrid_rag", "rag", "rag"),
+    ("rag", "pure_sbert", "rag"),                 # butuh rebuild med_labels → tetap index_mode
+    ("pure_sbert", "hybrid_rag", "pure_sbert"),
+    ("rag", "tidak_dikenal", "rag"),
+    (None, "pure_sbert", "pure_sbert"),           # manifest lama tanpa mode
+])
+def test_active_mode_vs_index_mode(config, index_mode, active, expected):
+    manifest = config({"version": "v1", "mode": index_mode}, {"mode": active})
+    assert manifest["mode"] == expected
+    assert manifest["index_mode"] == index_mode
+
+
+def test_unknown_manifest_mode_is_ignored(config):
+    manifest = config({"version": "v1", "mode": "bm25"})
+    assert (manifest["mode"], manifest["index_mode"]) == (DEFAULT_MODE, None)
+
+
+def test_label_index_merges_diagnosis_and_symptom(kb):
+    assert kb.match_exact("DEMAM") == ("Diagnosis", {"Sambiloto\nAndrographis (daun)", "Jahe\nZingiber"})
+    assert kb.match_exact("batuk") == ("Gejala", {"Kencur"})
+    group_type, herbs = kb.match_label("Demam")
+    assert group_type == "Diagnosis" and "Kunyit" in herbs
+
+
+def test_safety_index_matches_by_main_and_latin_name(kb):
+    candidates = ["Sambiloto\nAndrographis (daun)", "Jahe\nZingiber", "Kunyit"]
+    safe, unsafe = kb.classify_safety(candidates, ["hamil", "Menyusui"])
+    assert safe == ["Kunyit"]
+    assert unsafe["Sambiloto\nAndrographis (daun)"]["references"] == ["Ref A"]
+    jahe = unsafe["Jahe\nZingiber"]
+    assert jahe["conditions"] == {"Hamil", "Menyusui"}
+    assert sorted(jahe["references"]) == ["Ref B", "Ref C"]
+
+
+def test_unknown_condition_keeps_all_candidates(kb):
+    assert kb.classify_safety(["Kencur", "Kunyit"], ["tidak ada"]) == (["Kencur", "Kunyit"], {})
+
+
+def test_term_and_fuzzy_tiers_use_kamus_synonyms(kb):
+    found, residue = kb.match_terms("sering pusing dan meriang".split())
+    assert [(term.label, group_type) for term, group_type, _ in found] == [("Sakit Kepala", "Gejala"), ("Demam", "Diagnosis")]
+    assert residue == [["sering"], ["dan"]]
+    hit, group_type, herbs = kb.match_fuzzy("berat badan berlebohan")
+    assert (hit.label, group_type, herbs) == ("Obesitas", "Diagnosis", {"Jahe\nZingiber"})
@@ -0,0 +1,30 @@
+from metrics_service import Counter, Histogram, similarity_bucket
+
+
+def test_histogram_exposition_is_cumulative():
+    hist = Histogram("t_stage_seconds", "Latensi uji.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 2.0):
+        hist.observe(value, stage="lapis1")
+    assert hist.render() == [
+        "# HELP t_stage_seconds Latensi uji.",
+        "# TYPE t_stage_seconds histogram",
+        't_stage_seconds_bucket{stage="lapis1",le="0.1"} 1',
+        't_stage_seconds_bucket{stage="lapis1",le="1.0"} 2',
+        't_stage_seconds_bucket{stage="lapis1",le="+Inf"} 3',
+        't_stage_seconds_sum{stage="lapis1"} 2.55',
+        't_stage_seconds_count{stage="lapis1"} 3',
+    ]
+
+
+def test_counter_escapes_label_values():
+    counter = Counter("t_calls_total", "Panggilan uji.", ("service",))
+    counter.inc(service='ipfs "pinata"\n')
+    counter.inc(2, service='ipfs "pinata"\n')
+    assert counter.render()[-1] == 't_calls_total{service="ipfs \\"pinata\\"\\n"} 3.0'
+
+
+def test_similarity_bucket_edges():
+    assert similarity_bucket(12.0) == "0-50"
+    assert similarity_bucket(87.9) == "85-88"
+    assert similarity_bucket(88.0) == "88-90"
+    assert similarity_bucket(99.5) == "95-100"
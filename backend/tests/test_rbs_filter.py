@@ -0,0 +1,51 @@
+import pytest
+
+from rbs_filter import apply_filters_batch, find_allergic_herbs
+
+SAMBILOTO = "Sambiloto\nAndrographis (daun)"
+JAHE      = "Jahe\nZingiber"
+
+GROUPS = [
+    ("Demam",        {SAMBILOTO, JAHE, "Kunyit"}),
+    ("Obesitas",     {JAHE}),
+    ("Batuk",        {"Kencur"}),
+    ("Sakit Kepala", {"Kunyit"}),
+    ("Kosong",       set()),
+]
+
+
+@pytest.mark.parametrize("conditions, allergies", [
+    ([], set()),
+    (["Hamil"], set()),
+    (["hamil", "Menyusui"], {"kunyit"}),
+    ([], {"zingiber", "kencur"}),
+    (["Menyusui"], {"jahe"}),   # herbal tidak aman karena kondisi tidak dihitung dua kali sebagai alergi
+])
+def test_batch_matches_per_group_filter(kb, conditions, allergies):
+    batched = apply_filters_batch(GROUPS, conditions, allergies, kb)
+    per_group = [apply_filters_batch([group], conditions, allergies, kb)[0] for group in GROUPS]
+    assert batched == per_group
+
+
+def test_conditions_then_allergies(kb):
+    (details, unsafe), = apply_filters_batch([("Demam", {SAMBILOTO, JAHE, "Kunyit"})], ["Hamil"], {"kunyit"}, kb)
+    assert details == []
+    assert [(u["name"], u["reason"]) for u in unsafe] == [
+        ("Jahe", "Berbahaya bagi: Hamil"),
+        ("Sambiloto", "Berbahaya bagi: Hamil"),
+        ("Kunyit", "Terdeteksi riwayat alergi pada profil Anda"),
+    ]
+    assert unsafe[0]["description"] == "Panas."
+
+
+def test_no_filters_returns_sorted_details(kb):
+    (details, unsafe), = apply_filters_batch([("Demam", {"Kunyit", JAHE})], [], set(), kb)
+    assert [d["name"] for d in details] == [JAHE, "Kunyit"]
+    assert unsafe == []
+    assert apply_filters_batch([], ["Hamil"], set(), kb) == []
+
+
+def test_allergy_matches_any_name_variant(kb):
+    assert find_allergic_herbs({JAHE, SAMBILOTO}, {"Zingiber (rimpang)", "andrographis"}, kb) == {
+        JAHE: "zingiber", SAMBILOTO: "andrographis"}
+    assert find_allergic_herbs({JAHE}, set(), kb) == {}
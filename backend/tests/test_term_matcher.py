@@ -0,0 +1,45 @@
+from term_matcher import TermMatcher
+
+
+def build(*patterns):
+    matcher = TermMatcher()
+    for text, label in patterns:
+        matcher.add(text, label, "label")
+    return matcher.compile()
+
+
+def test_leftmost_longest_without_overlap():
+    matcher = build(("sakit", "Sakit"), ("sakit kepala", "Sakit Kepala"), ("kepala pusing", "Vertigo"))
+    matches = matcher.find("saya sakit kepala pusing".split())
+    assert [(m.start, m.end, m.label) for m in matches] == [(1, 3, "Sakit Kepala")]
+
+
+def test_match_via_output_link_inside_longer_prefix():
+    # "badan panas" berakhir di tengah cabang "berat badan berlebihan"
+    matcher = build(("berat badan berlebihan", "Obesitas"), ("badan panas", "Demam"))
+    matches = matcher.find("berat badan panas".split())
+    assert [(m.text, m.label) for m in matches] == [("badan panas", "Demam")]
+
+
+def test_scan_returns_ordered_residue():
+    matcher = build(("batuk", "Batuk"), ("demam", "Demam"))
+    matches, residue = matcher.scan("kemarin batuk lalu demam tinggi sekali".split())
+    assert [m.label for m in matches] == ["Batuk", "Demam"]
+    assert residue == [["kemarin"], ["lalu"], ["tinggi", "sekali"]]
+
+
+def test_tokens_are_normalized_and_first_pattern_wins():
+    matcher = TermMatcher()
+    assert matcher.add("Buang-Air Besar", "Diare", "label")
+    assert not matcher.add("buangair besar", "Lain", "sinonim")
+    matcher.compile()
+    matches = matcher.find(["BUANG-AIR", "besar,"])
+    assert [(m.label, m.source, m.text) for m in matches] == [("Diare", "label", "BUANG-AIR besar,")]
+    assert matcher.patterns == 1
+
+
+def test_build_prefers_label_over_identical_synonym():
+    matcher = TermMatcher.build(["Demam"], [("demam", "Panas"), ("meriang", "Demam")])
+    matches, residue = matcher.scan(["demam", "meriang"])
+    assert [(m.label, m.source) for m in matches] == [("Demam", "label"), ("Demam", "sinonim")]
+    assert residue == []
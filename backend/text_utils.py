@@ -0,0 +1,35 @@
+"""
+text_utils.py
+Fungsi normalisasi teks yang dipakai bersama oleh API (main.py), index
+in-memory, dan pipeline dataset (scripts/update_dataset.py).
+"""
+
+import re
+
+
+def normalize_text_key(value: str) -> str:
+    """
+    Normalisasi string untuk matching robust antar tabel:
+    - lowercase, samakan apostrof melengkung, buang karakter non-alfanumerik
+    """
+    if value is None:
+        return ""
+    v = str(value).strip().lower().replace("\u2019", "'")
+    return re.sub(r"[^a-z0-9]+", "", v)
+
+
+def herb_main_name(herbal_name: str) -> str:
+    """Nama utama herbal = baris pertama dari kolom herbal_name (multiline)."""
+    return str(herbal_name or "").strip().split("\n")[0].strip()
+
+
+def herb_name_variants(herbal_name: str) -> list:
+    """
+    Semua varian nama herbal (tiap baris, tanpa keterangan dalam kurung),
+    lowercase. Dipakai untuk mencocokkan daftar alergi user.
+    """
+    return [
+        line.split("(")[0].strip().lower()
+        for line in str(herbal_name or "").replace("\r", "").split("\n")
+        if line.strip()
+    ]